@@ -17,16 +17,43 @@ db = SQLAlchemy()
 migrate = Migrate()
 
 face_recognition_service = None 
+camera_hub = None
+thermal_sensor = None
+attendance_writer = None
+latest_status_cache = None
+attendance_rollup = None
+warmup = None
+enrollment_service = None
+event_bus = None
+profiler = None
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
 
 def create_app(config_class=Config):
-    global face_recognition_service
+    global face_recognition_service, camera_hub, thermal_sensor, attendance_writer, latest_status_cache, attendance_rollup
+    global warmup, enrollment_service, event_bus, profiler
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # The services log under 'app.services.*'; per-frame and per-event messages are DEBUG, so off by default
+    app.logger.setLevel(app.config['LOG_LEVEL'].upper())
+
+    from app.services.metrics import REGISTRY
+    REGISTRY.enabled = app.config['METRICS_ENABLED']
+
     db.init_app(app)
     migrate.init_app(app, db)
     login.init_app(app)
 
+    if app.config['SQLITE_WAL'] and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        from sqlalchemy import event
+        with app.app_context():
+            event.listen(db.engine, 'connect', _enable_sqlite_wal)
+
     # Import blueprints
     from app.routes.main import main_bp
     from app.routes.auth import auth_bp
@@ -37,11 +64,111 @@ def create_app(config_class=Config):
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
 
-    # Initialize FaceRecognitionService and load known faces within the application context
-    with app.app_context():
-        from app.services.face_recognition_service import FaceRecognitionService
-        face_recognition_service = FaceRecognitionService()
-        face_recognition_service.load_known_faces()
+    from app.cli import register_commands
+    register_commands(app)
+
+    # Initialize FaceRecognitionService; known faces and dlib's models are loaded by the warm-up below
+    from app.services.face_recognition_service import FaceRecognitionService
+    from app.services.detection_strategy import DetectionStrategy
+    snapshot_path = app.config['GALLERY_SNAPSHOT'] or os.path.join(app.instance_path, 'gallery.snapshot')
+    face_recognition_service = FaceRecognitionService(
+        tolerance=app.config['FACE_MATCH_TOLERANCE'],
+        aggregate=app.config['FACE_MATCH_AGGREGATE'],
+        backend=app.config['FACE_MATCH_BACKEND'],
+        ivf_nlist=app.config['FACE_IVF_NLIST'],
+        ivf_nprobe=app.config['FACE_IVF_NPROBE'],
+        snapshot_path=None if snapshot_path == 'off' else snapshot_path,
+        snapshot_check_interval=app.config['GALLERY_SNAPSHOT_CHECK_INTERVAL'],
+        strategy=DetectionStrategy.from_config(app.config))
+    if app.config['RECOGNITION_PROCESSES'] > 0:
+        # Worker processes are spawned by the warm-up (or the first recognized frame)
+        from app.services.recognition_executor import RecognitionExecutor
+        face_recognition_service.executor = RecognitionExecutor(workers=app.config['RECOGNITION_PROCESSES'])
+
+    # 'background' starts on the first request, so CLI commands (flask db, create_admin.py) skip it;
+    # 'sync' loads everything here; 'lazy' leaves it to the first recognition
+    from app.services.warmup import Warmup
+    executor = face_recognition_service.executor
+    warmup = Warmup(app, [
+        ('gallery', face_recognition_service.ensure_loaded),
+        ('models', executor.start if executor is not None else face_recognition_service.warm_up),
+    ])
+    if app.config['WARMUP_MODE'] == 'sync':
+        warmup.start(background=False)
+    elif app.config['WARMUP_MODE'] == 'background':
+        @app.before_request
+        def start_warmup():
+            warmup.start()
+
+    # Live updates for the dashboards, streamed by /events
+    from app.services.event_bus import EventBus
+    event_bus = EventBus(history=app.config['EVENTS_HISTORY'])
+
+    # The sensor's sampler thread starts on first use, so CLI commands never open the port
+    from app.services.thermal_scanning_service import ThermalSensor
+    thermal_sensor = ThermalSensor(
+        port=app.config['THERMAL_PORT'],
+        baudrate=app.config['THERMAL_BAUDRATE'],
+        interval=app.config['THERMAL_SAMPLE_INTERVAL'],
+        buffer_size=app.config['THERMAL_BUFFER_SIZE'],
+        max_age=app.config['THERMAL_MAX_AGE'],
+        event_bus=event_bus,
+        publish_interval=app.config['EVENTS_TEMPERATURE_INTERVAL'])
+
+    # Latest status per user for the dashboard, kept current by the attendance writers
+    from app.services.attendance_cache import LatestStatusCache
+    latest_status_cache = LatestStatusCache()
+
+    # Per-user and per-strand daily aggregates, updated as attendance is written
+    from app.services.rollup_service import AttendanceRollup
+    attendance_rollup = AttendanceRollup()
+
+    # Attendance from the camera pipelines is written behind, in batches; started on first use
+    from app.services.attendance_writer import AttendanceWriter
+    attendance_writer = AttendanceWriter(
+        app,
+        app.config['ATTENDANCE_JOURNAL'] or os.path.join(app.instance_path, 'attendance.journal'),
+        batch_size=app.config['ATTENDANCE_BATCH_SIZE'],
+        flush_interval=app.config['ATTENDANCE_FLUSH_INTERVAL'],
+        status_cache=latest_status_cache,
+        rollup=attendance_rollup,
+        event_bus=event_bus)
+
+    # One shared pipeline per camera, however many clients watch the feed; all cameras share
+    # the recognition workers, scheduled fairly by camera weight
+    from functools import partial
+    from app.services.camera_hub import CameraHub
+    from app.services.camera_registry import CameraRegistry
+    from app.services.recognition_scheduler import RecognitionScheduler
+    from app.services.scanner_service import build_scanner_pipeline
+    from app.services.stream_output import parse_profiles
+    recognition_workers = app.config['PIPELINE_RECOGNITION_WORKERS']
+    if executor is not None:
+        # One scheduler thread per worker process keeps every process busy
+        recognition_workers = max(recognition_workers, executor.workers)
+    scheduler = RecognitionScheduler(app, workers=recognition_workers)
+    camera_hub = CameraHub(
+        partial(build_scanner_pipeline, app, face_recognition_service, thermal_sensor, attendance_writer, scheduler),
+        CameraRegistry.from_config(app.config),
+        idle_timeout=app.config['CAMERA_IDLE_TIMEOUT'],
+        profiles=[profile.name for profile in parse_profiles(app.config['STREAM_PROFILES'])])
+
+    # Face enrollment runs as background jobs on frames from the camera pipelines
+    from app.services.enrollment_service import EnrollmentService
+    enrollment_service = EnrollmentService(
+        app, face_recognition_service, camera_hub,
+        samples=app.config['ENROLL_SAMPLES'],
+        jitters=app.config['ENROLL_JITTERS'],
+        detection_scale=app.config['ENROLL_DETECTION_SCALE'],
+        min_face=app.config['ENROLL_MIN_FACE'],
+        max_seconds=app.config['ENROLL_MAX_SECONDS'])
+
+    # Gauges for /metrics are read from the services at scrape time; the profiler is started by admins
+    from app.services.metrics import service_collector
+    from app.services.profiler import SamplingProfiler
+    REGISTRY.clear_collectors()
+    REGISTRY.add_collector(service_collector(camera_hub, attendance_writer, thermal_sensor, event_bus))
+    profiler = SamplingProfiler(interval=app.config['PROFILER_INTERVAL'])
 
     # Email and file logging configuration (for production)
     if not app.debug and not app.testing:
@@ -72,7 +199,6 @@ def create_app(config_class=Config):
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
 
-        app.logger.setLevel(logging.INFO)
         app.logger.info('FusionScan startup')
 
     return app
@@ -0,0 +1,75 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+@click.command('recognize-recording')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--start', help='When the recording began (ISO time; UTC unless it has an offset). '
+                              'Defaults to the file time minus the video length.')
+@click.option('--stride', type=int, default=None, help='Process every Nth frame [OFFLINE_STRIDE].')
+@click.option('--workers', type=int, default=None,
+              help='Recognition worker processes; 0 recognizes in this process [RECOGNITION_PROCESSES].')
+@click.option('--camera', 'camera_id', help="Camera whose detection region (DETECTION_ROI) applies.")
+@click.option('--thermal-log', type=click.Path(exists=True, dir_okay=False),
+              help='CSV of timestamp,temperature readings taken during the recording. Without one, '
+                   'attendance is recorded as Present with no temperature.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='Progress file for resuming (default: instance/offline/<source hash>.json).')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first frame.')
+@with_appcontext
+def recognize_recording(source, start, stride, workers, camera_id, thermal_log, checkpoint, restart):
+    """Recognize faces in a video file or image folder and record their attendance."""
+    import app as application
+    from app.services.detection_strategy import DetectionStrategy
+    from app.services.offline_recognition import OfflineRecognition, load_thermal_log, open_source, parse_time
+
+    config = current_app.config
+    recognizer = application.face_recognition_service
+    stride = stride if stride is not None else config['OFFLINE_STRIDE']
+    workers = workers if workers is not None else config['RECOGNITION_PROCESSES']
+    try:
+        recording = open_source(source, stride, parse_time(start) if start else None)
+        thermal_sensor = load_thermal_log(thermal_log) if thermal_log else None
+    except (ValueError, OSError) as e:
+        raise click.ClickException(str(e))
+
+    recognizer.ensure_loaded()
+    executor = recognizer.executor
+    if workers > 0 and (executor is None or executor.workers != workers):
+        from app.services.recognition_executor import RecognitionExecutor
+        recognizer.executor = RecognitionExecutor(workers=workers)
+    elif workers == 0:
+        recognizer.executor = None
+    if recognizer.executor is not None:
+        recognizer.executor.start()
+    else:
+        recognizer.warm_up()
+
+    offline = OfflineRecognition(
+        recognizer, application.attendance_writer,
+        thermal_sensor=thermal_sensor,
+        fusion_options=dict(
+            window=config['FUSION_WINDOW'],
+            pass_gap=config['FUSION_PASS_GAP'],
+            max_pass=config['FUSION_MAX_PASS'],
+            top_n=config['FUSION_TOP_N'],
+            anomaly_threshold=config['ANOMALY_THRESHOLD']),
+        strategy=DetectionStrategy.from_config(config, camera_id),
+        checkpoint_path=checkpoint or OfflineRecognition.default_checkpoint(current_app.instance_path, recording),
+        batch_size=config['OFFLINE_BATCH_SIZE'],
+        progress=click.echo)
+    click.echo(f"Processing {source}: {recording.total} frames, every {recording.stride}, "
+               f"{recognizer.executor.workers if recognizer.executor else 0} worker processes")
+    try:
+        stats = offline.run(recording, resume=not restart)
+    finally:
+        if recognizer.executor is not None and recognizer.executor is not executor:
+            recognizer.executor.shutdown()
+        recognizer.executor = executor
+    click.echo(f"{stats['frames']} frames in {stats['seconds']:.1f}s "
+               f"({stats['frames'] / max(stats['seconds'], 1e-6):.1f} frames/s), "
+               f"{stats['faces']} faces, {stats['recognized']} recognized, "
+               f"{stats['events']} attendance events, {stats['inserted']} rows inserted")
+
+def register_commands(app):
+    app.cli.add_command(recognize_recording)
@@ -3,6 +3,8 @@ from wtforms import StringField, PasswordField, BooleanField, SubmitField, Selec
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError
 from app.models import User
 
+STRANDS = ['STEM', 'ABM', 'HUMSS', 'GAS', 'TVL']
+
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
     password = PasswordField('Password', validators=[DataRequired()])
@@ -16,7 +18,7 @@ class RegistrationForm(FlaskForm):
     password2 = PasswordField(
         'Repeat Password', validators=[DataRequired(), EqualTo('password')])
     student_lrn = StringField('Student LRN', validators=[DataRequired()])
-    strand = SelectField('Strand', choices=[('STEM', 'STEM'), ('ABM', 'ABM'), ('HUMSS', 'HUMSS'), ('GAS', 'GAS'), ('TVL', 'TVL')], validators=[DataRequired()])
+    strand = SelectField('Strand', choices=[(strand, strand) for strand in STRANDS], validators=[DataRequired()])
     submit = SubmitField('Register')
 
     def validate_username(self, username):
@@ -24,6 +24,10 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 class Attendance(db.Model):
+    __table_args__ = (
+        db.Index('ix_attendance_user_id_timestamp', 'user_id', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
@@ -33,6 +37,95 @@ class Attendance(db.Model):
     def __repr__(self):
         return f'<Attendance {self.user_id} - {self.timestamp} - {self.status}>'
 
+class _DailyRollup:
+    """Columns and merge logic shared by the per-day attendance rollups."""
+    first_seen = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+    count = db.Column(db.Integer, default=0)
+    temperature_min = db.Column(db.Float)
+    temperature_max = db.Column(db.Float)
+    temperature_sum = db.Column(db.Float, default=0.0)
+    temperature_count = db.Column(db.Integer, default=0)
+    anomaly_count = db.Column(db.Integer, default=0)
+
+    def merge(self, other):
+        """Folds another rollup (or an unsaved aggregate with the same fields) into this one."""
+        self.first_seen = min(filter(None, (self.first_seen, other.first_seen)), default=None)
+        self.last_seen = max(filter(None, (self.last_seen, other.last_seen)), default=None)
+        self.count = (self.count or 0) + other.count
+        self.temperature_min = min((t for t in (self.temperature_min, other.temperature_min) if t is not None), default=None)
+        self.temperature_max = max((t for t in (self.temperature_max, other.temperature_max) if t is not None), default=None)
+        self.temperature_sum = (self.temperature_sum or 0.0) + other.temperature_sum
+        self.temperature_count = (self.temperature_count or 0) + other.temperature_count
+        self.anomaly_count = (self.anomaly_count or 0) + other.anomaly_count
+
+    @property
+    def temperature_mean(self):
+        return self.temperature_sum / self.temperature_count if self.temperature_count else None
+
+    def to_dict(self):
+        return {
+            'first_seen': self.first_seen.isoformat() if self.first_seen else None,
+            'last_seen': self.last_seen.isoformat() if self.last_seen else None,
+            'count': self.count,
+            'temperature_min': self.temperature_min,
+            'temperature_max': self.temperature_max,
+            'temperature_mean': self.temperature_mean,
+            'anomaly_count': self.anomaly_count,
+        }
+
+class UserDailyAttendance(_DailyRollup, db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, index=True)
+
+    def __repr__(self):
+        return f'<UserDailyAttendance {self.user_id} - {self.day}>'
+
+class StrandDailyAttendance(_DailyRollup, db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    strand = db.Column(db.String(64), primary_key=True)
+    users = db.Column(db.Integer, default=0)  # distinct users seen that day
+
+    def to_dict(self):
+        return dict(super().to_dict(), users=self.users)
+
+    def __repr__(self):
+        return f'<StrandDailyAttendance {self.strand} - {self.day}>'
+
+class AttendanceDay(db.Model):
+    """One row per finalized day; the primary key makes finalization happen once."""
+    day = db.Column(db.Date, primary_key=True)
+    finalized_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AttendanceDay {self.day}>'
+
+class GalleryVersion(db.Model):
+    """
+    Single-row counter of changes to the enrolled faces, bumped by
+    FaceRecognitionService.update_user, so a gallery snapshot can be checked
+    against the database with one lookup instead of reading every encoding.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls):
+        return db.session.query(cls.version).filter_by(id=1).scalar() or 0
+
+    @classmethod
+    def bump(cls):
+        """Increments the version in the current transaction and returns the new value."""
+        updated = cls.query.filter_by(id=1).update({cls.version: cls.version + 1, cls.updated_at: datetime.utcnow()})
+        if not updated:
+            db.session.add(cls(id=1, version=1))
+            db.session.flush()
+        return cls.current()
+
+    def __repr__(self):
+        return f'<GalleryVersion {self.version}>'
+
 @login.user_loader
 def load_user(id):
     return User.query.get(int(id))
\ No newline at end of file
@@ -1,10 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import logging
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, session, Response, current_app
 from flask_login import current_user, login_required
 from app import db
 from app.forms import RegistrationForm
 from app.models import User
 from app.utils.decorators import admin_required
-from app.services.face_recognition_service import FaceRecognitionService
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -43,6 +43,9 @@ def edit_user(user_id):
         if form.password.data:  # Update password only if a new one is provided
             user.set_password(form.password.data)
         db.session.commit()
+        # Recognized faces are labelled with the gallery's copy of the name and LRN
+        from app import face_recognition_service
+        face_recognition_service.update_user(user.id)
         flash('User details updated successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
     return render_template('admin/edit_user.html', title='Edit User', form=form, user=user)
@@ -56,15 +59,86 @@ def capture_face(user_id):
         flash('Cannot capture face encodings for admin users.', 'danger')
         return redirect(url_for('admin.dashboard'))
     
-    face_recognition_service = FaceRecognitionService()
-
+    # Capture runs in the background on the camera this session is watching; the page polls the job
+    from app import enrollment_service
+    registry = enrollment_service.camera_hub.registry
+    camera_id = session.get('camera_id')
+    if camera_id not in registry:
+        camera_id = registry.default_id
     if request.method == 'POST':
-        try:
-            # Call capture_and_store_face_encodings and handle potential errors
-            face_recognition_service.capture_and_store_face_encodings(user_id)
-            flash('Face encodings captured and stored successfully.', 'success')
-        except Exception as e:
-            flash(f'An error occurred: {e}', 'danger')
-        return redirect(url_for('admin.dashboard'))
+        job = enrollment_service.start(user.id, camera_id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(job.to_dict()), 202
+        return redirect(url_for('admin.capture_face', user_id=user.id, job=job.id))
+
+    job = enrollment_service.get(request.args.get('job', '')) or enrollment_service.active_job(user.id)
+    if job is not None and job.user_id != user.id:
+        job = None
+    return render_template('admin/capture_face.html', user=user, job=job,
+                           camera_id=job.camera_id if job is not None else camera_id)
+
+@admin_bp.route('/enrollment/<job_id>')
+@login_required
+@admin_required
+def enrollment_status(job_id):
+    from app import enrollment_service
+    job = enrollment_service.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown enrollment job'}), 404
+    return jsonify(job.to_dict())
 
-    return render_template('admin/capture_face.html', user=user)
\ No newline at end of file
+@admin_bp.route('/enrollment/<job_id>/cancel', methods=['POST'])
+@login_required
+@admin_required
+def cancel_enrollment(job_id):
+    from app import enrollment_service
+    job = enrollment_service.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown enrollment job'}), 404
+    return jsonify(job.to_dict())
+
+@admin_bp.route('/profiler')
+@login_required
+@admin_required
+def profiler_status():
+    """Profiler state as JSON; ``?format=collapsed`` returns the sampled stacks for a flame graph instead."""
+    from app import profiler
+    if request.args.get('format') == 'collapsed':
+        return Response(profiler.report(request.args.get('limit', type=int)), mimetype='text/plain')
+    return jsonify(profiler.stats())
+
+@admin_bp.route('/profiler/start', methods=['POST'])
+@login_required
+@admin_required
+def start_profiler():
+    """Starts sampling every thread's stack; JSON ``{"interval": 0.01}`` overrides PROFILER_INTERVAL."""
+    from app import profiler
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data['interval']) if data.get('interval') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'interval must be a number of seconds'}), 400
+    if interval is not None and not 0.0005 <= interval <= 1.0:
+        return jsonify({'error': 'interval must be between 0.0005 and 1 second'}), 400
+    profiler.start(interval, reset=data.get('reset', True))
+    return jsonify(profiler.stats())
+
+@admin_bp.route('/profiler/stop', methods=['POST'])
+@login_required
+@admin_required
+def stop_profiler():
+    from app import profiler
+    profiler.stop()
+    return jsonify(profiler.stats())
+
+@admin_bp.route('/log_level', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def log_level():
+    """Reads or changes (JSON ``{"level": "DEBUG"}``) the application's log level until the next restart."""
+    if request.method == 'POST':
+        level = str((request.get_json(silent=True) or {}).get('level', '')).upper()
+        if level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'):
+            return jsonify({'error': 'level must be DEBUG, INFO, WARNING, ERROR or CRITICAL'}), 400
+        current_app.logger.setLevel(level)
+    return jsonify({'level': logging.getLevelName(current_app.logger.getEffectiveLevel())})
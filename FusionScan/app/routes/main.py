@@ -1,14 +1,13 @@
-import os
-import cv2
-from flask import Blueprint, render_template, Response, current_app, send_from_directory, flash, redirect, url_for, request, jsonify
-from flask_login import login_required
+from flask import Blueprint, render_template, Response, current_app, send_from_directory, flash, redirect, url_for, request, jsonify, stream_with_context, session, abort
+from flask_login import login_required, current_user
 from app.services.data_service import DataService
+from app.services.event_bus import temperature_event
+from app.services.export_service import AttendanceExporter
 from app.services.thermal_scanning_service import get_temperature_from_arduino
 from app.utils.decorators import admin_required
-from app import db
-from app.models import User, Attendance
-import pandas as pd
-from datetime import datetime
+from app.forms import STRANDS
+from datetime import date, datetime
+import hmac
 
 main_bp = Blueprint('main', __name__)
 
@@ -17,61 +16,106 @@ data_service = DataService()
 @main_bp.route('/')
 @login_required
 def index():
-    users = User.query.all()
-    attendance_data = []
-    for user in users:
-        attendance_record = Attendance.query.filter_by(user_id=user.id).order_by(Attendance.timestamp.desc()).first()
-        attendance_data.append({
-            'user': user,
-            'attendance': attendance_record
-        })
-    return render_template('index.html', attendance_data=attendance_data)
-
-def generate_frames():
-    from app import face_recognition_service
-    camera = cv2.VideoCapture(0)
-
-    while True:
-        success, frame = camera.read()
-        if not success:
-            print("Error reading from camera.")
-            break
-        else:
-            frame, name, lrn = face_recognition_service.facial_recognition_process(frame)
-            temperature = get_temperature_from_arduino()
-            print(f"Temperature from Arduino: {temperature}")
-
-            if temperature is not None:
-                if name != "Unknown":
-                    user = User.query.filter_by(username=name).first()
-                    if user:
-                        status = "Present" if temperature < 37.5 else "Anomaly"
-                        data_service.record_attendance(user.id, status, temperature)
-
-                        # Display temperature on the frame
-                        temp_text = f"Temp: {temperature:.1f}°C"
-                        cv2.putText(frame, temp_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-
-            # Display a message if no faces are detected or no known faces are loaded
-            if name == "Unknown":
-                if not face_recognition_service.known_face_encodings:
-                    cv2.putText(frame, "No known faces loaded!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                else:
-                    cv2.putText(frame, "No face detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                print("Error encoding frame to JPEG.")
-                continue
-
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+    from app import event_bus
+    # Taken before reading the table, so the page's live stream replays anything written meanwhile
+    event_cursor = event_bus.cursor
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', current_app.config['USERS_PER_PAGE'], type=int), 500))
+    strand = request.args.get('strand') or None
+    users = data_service.users_page(page=page, per_page=per_page, strand=strand)
+    latest = data_service.latest_statuses([user.id for user in users.items])
+    attendance_data = [{'user': user, 'attendance': latest.get(user.id)} for user in users.items]
+    return render_template('index.html', attendance_data=attendance_data, pagination=users,
+                           strand=strand, strands=STRANDS, per_page=per_page, camera_id=_selected_camera(),
+                           event_cursor=event_cursor)
+
+def _selected_camera():
+    """The camera this browser session last picked, if it still exists."""
+    from app import camera_hub
+    camera_id = session.get('camera_id')
+    return camera_id if camera_id in camera_hub.registry else camera_hub.registry.default_id
 
 @main_bp.route('/video_feed')
+@main_bp.route('/video_feed/<camera_id>')
 @login_required
-def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+def video_feed(camera_id=None):
+    """MJPEG stream of a camera; ``?profile=low`` picks one of the STREAM_PROFILES."""
+    from app import camera_hub
+    profile = request.args.get('profile') or None
+    if profile is not None and profile not in camera_hub.profiles:
+        return jsonify({'error': f'Unknown stream profile: {profile}', 'profiles': camera_hub.profiles}), 400
+    try:
+        subscriber = camera_hub.subscribe(camera_id, profile)
+    except KeyError:
+        abort(404)
+    return Response(subscriber.stream(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-cache'})
+
+@main_bp.route('/cameras')
+@login_required
+def cameras():
+    from app import camera_hub
+    registry = camera_hub.registry
+    return jsonify({'cameras': [registry.to_dict(camera) for camera in registry.all()],
+                    'selected': _selected_camera(),
+                    'profiles': camera_hub.profiles})
+
+@main_bp.route('/update_camera', methods=['POST'])
+@login_required
+def update_camera():
+    """
+    Selects the camera shown to this session: JSON ``{"cameraId": "gate2"}``.
+
+    Admins may also pass ``source`` (device index, URL or file) and/or
+    ``weight`` to reconfigure that camera; its pipeline is restarted and
+    current viewers stay connected.
+    """
+    from app import camera_hub
+    data = request.get_json(silent=True) or {}
+    camera_id = data.get('cameraId')
+    if camera_id not in camera_hub.registry:
+        return jsonify({'error': f'Unknown camera: {camera_id}'}), 404
+    if data.get('source') is not None or data.get('weight') is not None:
+        if not current_user.is_admin:
+            abort(403)
+        try:
+            camera_hub.registry.update(camera_id, source=data.get('source'), weight=data.get('weight'))
+        except ValueError:
+            return jsonify({'error': 'weight must be a number'}), 400
+        camera_hub.restart(camera_id)
+    session['camera_id'] = camera_id
+    return jsonify({'camera': camera_hub.registry.to_dict(camera_hub.registry.get(camera_id)),
+                    'video_feed': url_for('main.video_feed', camera_id=camera_id)})
+
+@main_bp.route('/ready')
+def ready():
+    """Readiness probe: 200 once the gallery and models are loaded, 503 while warming up."""
+    from app import warmup
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@main_bp.route('/metrics')
+def metrics():
+    """
+    Hot-path timings, recognition counters and service gauges in Prometheus text format.
+
+    Requires a logged-in session or, for scrapers, METRICS_TOKEN sent as
+    ``Authorization: Bearer <token>``.
+    """
+    from app.services.metrics import CONTENT_TYPE, REGISTRY
+    if not current_app.config['METRICS_ENABLED']:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or current_user.is_authenticated):
+        abort(401)
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE, headers={'Cache-Control': 'no-cache'})
+
+@main_bp.route('/pipeline_stats')
+@login_required
+def pipeline_stats():
+    from app import camera_hub
+    return jsonify(camera_hub.stats())
 
 @main_bp.route('/uploads/<filename>')
 @login_required
@@ -95,35 +139,69 @@ def restart_attendance():
 @main_bp.route('/export_attendance')
 @admin_required
 def export_attendance():
-    attendance_records = Attendance.query.all()
-    data = []
-    for record in attendance_records:
-        user = User.query.get(record.user_id)
-        data.append({
-            'Timestamp': record.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'Username': user.username if user else 'Unknown',
-            'LRN': user.student_lrn if user else 'N/A',
-            'Status': record.status,
-            'Temperature': record.temperature
-        })
-
-    df = pd.DataFrame(data)
-
-    # Sort by 'Timestamp' in descending order (most recent first)
-    df.sort_values(by='Timestamp', ascending=False, inplace=True)
-
-    # Format the 'Timestamp' column for better readability
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-    df['Timestamp'] = df['Timestamp'].dt.strftime('%Y-%m-%d %I:%M:%S %p')
-
-    # Reorder columns to have 'Timestamp' as the first column
-    df = df[['Timestamp', 'Username', 'LRN', 'Status', 'Temperature']]
-
-    filename = f"Attendance_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-
-    df.to_excel(filepath, index=False, engine='xlsxwriter')
-    return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, as_attachment=True)
+    """
+    Streams attendance as xlsx (default) or ``?format=csv``.
+
+    Optional filters: ``start`` and ``end`` (YYYY-MM-DD, inclusive), ``strand``
+    and ``status``.
+    """
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'csv'):
+        return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+    filters = {
+        'start': request.args.get('start', type=date.fromisoformat),
+        'end': request.args.get('end', type=date.fromisoformat),
+        'strand': request.args.get('strand') or None,
+        'status': request.args.get('status') or None,
+    }
+    exporter = AttendanceExporter(chunk_size=current_app.config['EXPORT_CHUNK_SIZE'])
+    filename = f"Attendance_Export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    if export_format == 'csv':
+        body = stream_with_context(exporter.iter_csv(**filters))
+        mimetype = 'text/csv'
+    else:
+        body = exporter.iter_xlsx(**filters)
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return Response(body, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@main_bp.route('/attendance_summary')
+@login_required
+def attendance_summary():
+    """
+    Daily attendance aggregates as JSON, read from the rollup tables.
+
+    Query parameters: ``start`` (YYYY-MM-DD, default today, UTC), ``end``
+    (inclusive, default ``start``), and either ``strand`` or ``user_id``.
+    """
+    start = request.args.get('start', datetime.utcnow().date(), type=date.fromisoformat)
+    end = request.args.get('end', start, type=date.fromisoformat)
+    if end < start:
+        return jsonify({'error': 'end is before start'}), 400
+    return jsonify(data_service.attendance_summary(
+        start, end,
+        strand=request.args.get('strand') or None,
+        user_id=request.args.get('user_id', type=int)))
+
+@main_bp.route('/events')
+@login_required
+def events():
+    """
+    Server-Sent Events stream of live updates for the dashboard.
+
+    Events: ``attendance`` (newly committed rows), ``user_deleted``,
+    ``temperature`` and ``reset`` (the page is stale and should reload). The
+    stream starts after the ``cursor`` query parameter (the index page embeds
+    one) or, on a browser reconnect, after its Last-Event-ID; without either it
+    starts from now. A fresh connection first gets the current temperature.
+    """
+    from app import event_bus, thermal_sensor
+    thermal_sensor.start()
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor') or event_bus.cursor
+    initial = [('temperature', temperature_event(thermal_sensor.latest(max_age=thermal_sensor.max_age)))]
+    return Response(event_bus.stream(cursor, keepalive=current_app.config['EVENTS_KEEPALIVE'], initial=initial),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @main_bp.route('/get_temperature')
 @login_required
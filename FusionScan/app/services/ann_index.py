@@ -0,0 +1,124 @@
+import numpy as np
+
+class IVFIndex:
+    """
+    Inverted-file index over face encodings (pure NumPy).
+
+    Encodings are clustered with k-means into ``nlist`` cells. A query only
+    looks at the rows of its ``nprobe`` closest cells, which gives a
+    shortlist for exact re-ranking. Raising ``nprobe`` trades speed for
+    recall; ``nprobe == nlist`` is an exhaustive scan.
+    """
+
+    def __init__(self, nlist=None, nprobe=8, train_iters=10, train_sample=64, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iters = train_iters
+        self.train_sample = train_sample
+        self.seed = seed
+        self.centroids = None
+        self.list_rows = np.empty(0, dtype=np.intp)
+        self.list_offsets = np.zeros(1, dtype=np.intp)
+        self.trained_rows = 0
+
+    @staticmethod
+    def default_nlist(n_rows):
+        """Rule of thumb: about 4 * sqrt(n) cells, at least 1."""
+        return max(1, int(4 * np.sqrt(n_rows)))
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=16384):
+        centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+        labels = np.empty(len(vectors), dtype=np.intp)
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk]
+            scores = centroid_sq[None, :] - 2.0 * (block @ centroids.T)
+            labels[start:start + chunk] = np.argmin(scores, axis=1)
+        return labels
+
+    def train(self, vectors):
+        """Runs k-means on a sample of ``vectors`` to place the cell centroids."""
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist or self.default_nlist(len(vectors)), len(vectors))
+        sample_size = min(len(vectors), nlist * self.train_sample)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            labels = self._assign(sample, centroids)
+            order = np.argsort(labels, kind='stable')
+            counts = np.bincount(labels, minlength=nlist)
+            filled = counts > 0
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums = np.add.reduceat(sample[order], starts[filled], axis=0)
+            centroids[filled] = sums / counts[filled, None]
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        self.centroids = centroids.astype(np.float32)
+
+    def build(self, vectors):
+        """Trains the centroids and files every row into its cell."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            self.centroids = None
+            self.list_rows = np.empty(0, dtype=np.intp)
+            self.list_offsets = np.zeros(1, dtype=np.intp)
+            return
+        self.train(vectors)
+        self.trained_rows = len(vectors)
+        self._fill(self._assign(vectors, self.centroids))
+
+    def _fill(self, labels):
+        self.list_rows = np.argsort(labels, kind='stable').astype(np.intp)
+        counts = np.bincount(labels, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+
+    def labels(self, n_rows):
+        """Cell of every indexed row, recovered from the inverted lists."""
+        labels = np.empty(n_rows, dtype=np.intp)
+        labels[self.list_rows] = np.repeat(np.arange(len(self.centroids)), np.diff(self.list_offsets))
+        return labels
+
+    def needs_retrain(self, n_rows, growth=2.0):
+        """True once the rows have grown (or shrunk) by more than ``growth`` x since training."""
+        return (self.centroids is None or n_rows > self.trained_rows * growth
+                or n_rows * growth < self.trained_rows)
+
+    def updated(self, keep, vectors):
+        """
+        New index with the same centroids: rows where ``keep`` is False are
+        dropped, the remaining rows are renumbered in order, and ``vectors``
+        are filed into their nearest cells as the rows after them. No k-means.
+
+        Args:
+            keep: Boolean mask over the currently indexed rows.
+            vectors: (m, dim) rows to append.
+        """
+        index = IVFIndex(self.nlist, self.nprobe, self.train_iters, self.train_sample, self.seed)
+        index.centroids = self.centroids
+        index.trained_rows = self.trained_rows
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        index._fill(np.concatenate((self.labels(len(keep))[keep], self._assign(vectors, self.centroids))))
+        return index
+
+    def shortlist(self, probes, nprobe=None):
+        """
+        Candidate gallery rows for each probe.
+
+        Returns:
+            list: One array of row indices per probe.
+        """
+        if self.centroids is None:
+            return [np.empty(0, dtype=np.intp) for _ in range(len(probes))]
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        scores = centroid_sq[None, :] - 2.0 * (probes @ self.centroids.T)
+        if nprobe < len(self.centroids):
+            cells = np.argpartition(scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            cells = np.broadcast_to(np.arange(nprobe), (len(probes), nprobe))
+        return [
+            np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe_cells])
+            for probe_cells in cells
+        ]
@@ -0,0 +1,60 @@
+from collections import namedtuple
+import threading
+
+LatestStatus = namedtuple('LatestStatus', ['user_id', 'status', 'temperature', 'timestamp'])
+
+class LatestStatusCache:
+    """
+    In-process map of every user's latest attendance row.
+
+    Loaded once from the database with a single query, then kept current by
+    whoever writes attendance (the AttendanceWriter after each commit and
+    DataService.record_attendance). Entries only move forward in time, so a
+    late or replayed update can never overwrite a newer status.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+        self.warm = False
+        self.hits = 0
+        self.loads = 0
+
+    def _put(self, status):
+        current = self._latest.get(status.user_id)
+        if current is None or status.timestamp >= current.timestamp:
+            self._latest[status.user_id] = status
+
+    def update(self, user_id, status, temperature, timestamp):
+        with self._lock:
+            self._put(LatestStatus(user_id, status, temperature, timestamp))
+
+    def update_many(self, rows):
+        """Applies attendance rows given as dicts with user_id/status/temperature/timestamp."""
+        with self._lock:
+            for row in rows:
+                self._put(LatestStatus(row['user_id'], row['status'], row['temperature'], row['timestamp']))
+
+    def load(self, statuses):
+        """Fills the cache from a full latest-per-user snapshot and marks it warm."""
+        with self._lock:
+            for status in statuses:
+                self._put(status)
+            self.warm = True
+            self.loads += 1
+
+    def get_many(self, user_ids):
+        """Returns {user_id: LatestStatus} for users that have any attendance."""
+        with self._lock:
+            self.hits += 1
+            return {user_id: self._latest[user_id] for user_id in user_ids if user_id in self._latest}
+
+    def discard(self, user_id):
+        with self._lock:
+            self._latest.pop(user_id, None)
+
+    def invalidate(self):
+        """Drops everything; the next reader reloads from the database."""
+        with self._lock:
+            self._latest.clear()
+            self.warm = False
@@ -0,0 +1,116 @@
+from collections import namedtuple
+import logging
+import statistics
+import time
+from app.services.metrics import ATTENDANCE_EVENTS
+
+log = logging.getLogger(__name__)
+
+AttendanceEvent = namedtuple('AttendanceEvent', ['user_id', 'first_seen', 'last_seen', 'temperature', 'samples', 'status'])
+
+class _Pass:
+    __slots__ = ('user_id', 'first_seen', 'last_seen')
+
+    def __init__(self, user_id, timestamp):
+        self.user_id = user_id
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+
+class AttendanceFusion:
+    """
+    Turns recognized-face sightings and thermal samples into attendance events.
+
+    Every recognized user has an open "pass" that lasts while they keep being
+    seen. A pass closes once the user has not been seen for ``pass_gap``
+    seconds (or has lasted ``max_pass`` seconds). The thermal samples taken
+    from ``window`` seconds before the first sighting to ``window`` seconds
+    after the last one are then reduced to one temperature: the median of the
+    ``top_n`` highest plausible readings, so a single stray sample can neither
+    raise nor lower the result. One AttendanceEvent per pass is handed to
+    ``sink(event)``. Passes without a reading are dropped, unless
+    ``require_temperature`` is off (recordings without a thermal log), in
+    which case they are "Present" with no temperature.
+    """
+
+    def __init__(self, thermal_sensor, sink, window=1.0, pass_gap=3.0, max_pass=10.0, top_n=3,
+                 anomaly_threshold=37.5, plausible_range=(30.0, 45.0), require_temperature=True):
+        self.thermal_sensor = thermal_sensor
+        self.sink = sink
+        self.window = window
+        self.pass_gap = pass_gap
+        self.max_pass = max_pass
+        self.top_n = top_n
+        self.anomaly_threshold = anomaly_threshold
+        self.plausible_range = plausible_range
+        self.require_temperature = require_temperature
+        self.events = 0
+        self._passes = {}
+
+    def observe(self, user_ids, timestamp):
+        """Records that ``user_ids`` were recognized in a frame captured at ``timestamp``."""
+        for user_id in user_ids:
+            current = self._passes.get(user_id)
+            if current is None:
+                self._passes[user_id] = _Pass(user_id, timestamp)
+            else:
+                current.last_seen = max(current.last_seen, timestamp)
+
+    def temperature_for(self, start, end):
+        """
+        Robust temperature over a time span.
+
+        Returns:
+            tuple: (temperature or None, number of samples used)
+        """
+        if self.thermal_sensor is None:
+            return None, 0
+        low, high = self.plausible_range
+        values = [
+            reading.temperature
+            for reading in self.thermal_sensor.readings(start - self.window, end + self.window)
+            if low <= reading.temperature <= high
+        ]
+        if not values:
+            return None, 0
+        top = sorted(values, reverse=True)[:self.top_n]
+        return statistics.median(top), len(values)
+
+    def flush(self, now=None, force=False):
+        """
+        Closes finished passes and emits their events.
+
+        Args:
+            now: Current time (defaults to time.time()).
+            force: Close every open pass, e.g. when the camera stops.
+
+        Returns:
+            list: The AttendanceEvents emitted.
+        """
+        now = time.time() if now is None else now
+        closed = [
+            p for p in self._passes.values()
+            if force or now - p.last_seen >= self.pass_gap or p.last_seen - p.first_seen >= self.max_pass
+        ]
+        emitted = []
+        for finished in closed:
+            del self._passes[finished.user_id]
+            temperature, samples = self.temperature_for(finished.first_seen, finished.last_seen)
+            if temperature is None and self.require_temperature:
+                log.debug("No thermal reading for user %s's pass, skipping attendance.", finished.user_id)
+                continue
+            status = "Present" if temperature is None or temperature < self.anomaly_threshold else "Anomaly"
+            event = AttendanceEvent(finished.user_id, finished.first_seen, finished.last_seen,
+                                    temperature, samples, status)
+            self.sink(event)
+            self.events += 1
+            ATTENDANCE_EVENTS.labels(status).inc()
+            emitted.append(event)
+        return emitted
+
+    @property
+    def open_passes(self):
+        return len(self._passes)
+
+    def pass_state(self):
+        """The open passes as [(user_id, first_seen, last_seen)]; observe() both times to restore one."""
+        return [(p.user_id, p.first_seen, p.last_seen) for p in self._passes.values()]
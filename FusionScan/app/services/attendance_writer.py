@@ -0,0 +1,322 @@
+import atexit
+from datetime import datetime, timedelta
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from app.models import db, Attendance
+from app.services.event_bus import attendance_event
+from app.services.metrics import DB_WRITE_SECONDS
+from app.utils.file_lock import try_lock, unlock
+
+log = logging.getLogger(__name__)
+
+class AttendanceWriter:
+    """
+    Write-behind sink for attendance rows.
+
+    record_attendance() has the same signature as DataService's but never
+    touches the database: the 5-second duplicate check uses an in-memory
+    last-seen map, and the row is appended to an on-disk journal and queued.
+    A background thread inserts queued rows in one transaction whenever
+    ``batch_size`` rows are waiting or ``flush_interval`` seconds have passed.
+
+    The journal (one JSON line per row, fsynced) holds every row that is not
+    yet committed. Every process writes its own, ``<journal_path>.<pid>``,
+    and holds a lock on ``<journal>.lock`` while running, since compaction
+    rewrites the file with only this process's pending rows. On start, the
+    journals whose lock can be taken (their process is gone, or it is the
+    legacy shared ``journal_path``) are replayed, skipping rows that already
+    reached the database, and removed.
+
+    After every commit the rows are applied to ``status_cache`` (a
+    LatestStatusCache), so dashboards can read current statuses without
+    querying. If ``rollup`` (an AttendanceRollup) is given, each batch updates
+    the daily rollups in the same transaction, and the flush thread finalizes
+    past days once the date changes. Committed rows are also published to
+    ``event_bus`` as one 'attendance' event per batch.
+    """
+
+    def __init__(self, app, journal_path, batch_size=200, flush_interval=1.0, dedup_seconds=5, fsync=True,
+                 status_cache=None, rollup=None, event_bus=None):
+        self.app = app
+        self.journal_base = journal_path
+        self.journal_path = None
+        self.event_bus = event_bus
+        self.status_cache = status_cache
+        self.rollup = rollup
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dedup = timedelta(seconds=dedup_seconds)
+        self.fsync = fsync
+        self.written = 0
+        self.batches = 0
+        self.duplicates = 0
+        self._pending = []
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._journal_lock = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Replays leftover journals, loads recent last-seen times and starts the flush thread."""
+        with self._lock:
+            if self.running:
+                return self
+            self._stop.clear()
+            # Named at start, not construction: a forked server worker must not share its parent's journal
+            self.journal_path = f'{self.journal_base}.{os.getpid()}'
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._journal_lock = self._journal_lock or try_lock(self.journal_path + '.lock')
+        with self.app.app_context():
+            self._replay_journals()
+            self._load_last_seen()
+        with self._lock:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._thread = threading.Thread(target=self._run, name='attendance-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """Flushes everything still queued and stops the flush thread."""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                if not self._pending:
+                    os.remove(self.journal_path)
+            if self._journal_lock is not None:
+                unlock(self._journal_lock)
+                self._journal_lock = None
+                os.remove(self.journal_path + '.lock')
+
+    def _load_last_seen(self):
+        since = datetime.utcnow() - self.dedup
+        rows = (db.session.query(Attendance.user_id, db.func.max(Attendance.timestamp))
+                .filter(Attendance.timestamp >= since)
+                .group_by(Attendance.user_id))
+        with self._lock:
+            for user_id, timestamp in rows:
+                self._last_seen[user_id] = max(timestamp, self._last_seen.get(user_id, timestamp))
+
+    def _replay_journals(self):
+        """Replays and removes this process's leftover journal (a reused pid) and those of dead processes."""
+        paths = [self.journal_base] + sorted(
+            path for path in glob.glob(glob.escape(self.journal_base) + '.*')
+            if path.rsplit('.', 1)[-1].isdigit())
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            lock = None
+            if path != self.journal_path:
+                lock = try_lock(path + '.lock')
+                if lock is None:
+                    continue  # a live process's journal
+            try:
+                if os.path.exists(path):
+                    self._replay_journal(path)
+                    os.remove(path)
+            finally:
+                if lock is not None:
+                    unlock(lock)
+                    os.remove(path + '.lock')
+
+    def _replay_journal(self, path):
+        rows = []
+        with open(path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    rows.append(self._decode(json.loads(line)))
+                except (ValueError, KeyError):
+                    continue  # Torn last line from a crash mid-write
+        if rows:
+            user_ids = {row['user_id'] for row in rows}
+            first = min(row['timestamp'] for row in rows)
+            existing = set(
+                db.session.query(Attendance.user_id, Attendance.timestamp)
+                .filter(Attendance.user_id.in_(user_ids), Attendance.timestamp >= first)
+            )
+            missing = [row for row in rows if (row['user_id'], row['timestamp']) not in existing]
+            if missing:
+                db.session.execute(db.insert(Attendance), missing)
+                if self.rollup is not None:
+                    self.rollup.apply(missing)
+                db.session.commit()
+                if self.status_cache is not None:
+                    self.status_cache.update_many(missing)
+                self._publish(missing)
+            log.info("Replayed %d of %d journaled attendance rows from %s.", len(missing), len(rows), path)
+
+    def _publish(self, rows):
+        if self.event_bus is not None:
+            self.event_bus.publish('attendance', attendance_event(rows))
+
+    @staticmethod
+    def _encode(row):
+        return json.dumps(dict(row, timestamp=row['timestamp'].isoformat()))
+
+    @staticmethod
+    def _decode(data):
+        return {
+            'user_id': data['user_id'],
+            'status': data['status'],
+            'temperature': data['temperature'],
+            'timestamp': datetime.fromisoformat(data['timestamp']),
+        }
+
+    def record_attendance(self, user_id, status, temperature, timestamp=None):
+        """
+        Queues an attendance row unless the user was recorded in the last few seconds.
+
+        Returns:
+            bool: True if the row was queued.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        row = {'user_id': user_id, 'status': status, 'temperature': temperature, 'timestamp': timestamp}
+        with self._lock:
+            last_seen = self._last_seen.get(user_id)
+            if last_seen is not None and timestamp - last_seen <= self.dedup:
+                self.duplicates += 1
+                return False
+            self._last_seen[user_id] = timestamp
+            if self._journal is not None:
+                self._journal.write(self._encode(row) + '\n')
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+        return True
+
+    def forget(self, user_id=None):
+        """Clears the last-seen time of one user (or everyone) so they are recorded again."""
+        with self._lock:
+            if user_id is None:
+                self._last_seen.clear()
+            else:
+                self._last_seen.pop(user_id, None)
+
+    def _write(self, batch):
+        """Inserts ``batch`` and updates the rollups in one transaction; raises (after a rollback) on failure."""
+        with self.app.app_context():
+            start = time.perf_counter()
+            try:
+                db.session.execute(db.insert(Attendance), batch)
+                if self.rollup is not None:
+                    self.rollup.apply(batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+        if self.status_cache is not None:
+            self.status_cache.update_many(batch)
+        self._publish(batch)
+
+    def flush(self):
+        """
+        Writes every queued row in one transaction.
+
+        Returns:
+            int: Number of rows written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception as e:
+                log.error("Error writing %d attendance rows, will retry: %s", len(batch), e)
+                with self._lock:
+                    self._pending[:0] = batch
+                return 0
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+                self._compact_journal()
+            return len(batch)
+
+    def insert(self, rows):
+        """
+        Writes already-deduplicated rows, such as a recording's, in one transaction right away.
+
+        Unlike record_attendance() the rows skip the live duplicate window,
+        which assumes timestamps only move forward, and the journal: a
+        failure raises instead of being retried, so the caller knows the rows
+        are not stored.
+
+        Returns:
+            int: Number of rows written.
+        """
+        if not rows:
+            return 0
+        with self._flush_lock:
+            self._write(rows)
+            with self._lock:
+                self.written += len(rows)
+                self.batches += 1
+        return len(rows)
+
+    def _compact_journal(self):
+        """Rewrites the journal with only the rows still pending. Caller holds the lock."""
+        if self._journal is None:
+            return
+        self._journal.close()
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as journal:
+            for row in self._pending:
+                journal.write(self._encode(row) + '\n')
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._wakeup:
+                self._wakeup.wait_for(
+                    lambda: len(self._pending) >= self.batch_size or self._stop.is_set(),
+                    self.flush_interval)
+            self.flush()
+            if self.rollup is not None:
+                self._finalize_rollups()
+
+    def _finalize_rollups(self):
+        with self.app.app_context():
+            try:
+                self.rollup.finalize_pending()
+            except Exception as e:
+                db.session.rollback()
+                log.error("Error finalizing attendance rollups: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'written': self.written,
+                'batches': self.batches,
+                'duplicates': self.duplicates,
+            }
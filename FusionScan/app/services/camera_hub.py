@@ -0,0 +1,192 @@
+import threading
+import time
+
+class Subscriber:
+    """
+    One viewer of a camera's frame stream in one output profile.
+
+    Holds at most one pending frame: if the viewer is still sending the
+    previous frame when a new one is published, the pending frame is replaced
+    and counted as skipped, so a slow client never holds up the camera or
+    the other viewers. Frames are complete multipart chunks shared as the
+    same bytes object by every viewer of the profile, never copied.
+    """
+
+    def __init__(self, hub, camera_id, profile):
+        self.hub = hub
+        self.camera_id = camera_id
+        self.profile = profile
+        self.skipped = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.started = time.monotonic()
+        self.closed = False
+        self._pending = None
+        self._cond = threading.Condition()
+
+    def offer(self, seq, part):
+        with self._cond:
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = (seq, part)
+            self._cond.notify()
+
+    def next_frame(self, timeout=None):
+        """Returns the newest (seq, multipart_part) not yet taken, or None on timeout/close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending is not None or self.closed, timeout)
+            frame, self._pending = self._pending, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify_all()
+        self.hub.unsubscribe(self)
+
+    def stream(self):
+        """Multipart MJPEG generator; unsubscribes when the client goes away."""
+        try:
+            while not self.closed:
+                frame = self.next_frame(timeout=1.0)
+                if frame is None:
+                    if not self.hub.is_running(self.camera_id):
+                        break
+                    continue
+                self.sent += 1
+                self.bytes_sent += len(frame[1])
+                yield frame[1]
+        finally:
+            self.close()
+
+class CameraHub:
+    """
+    Process-wide owner of the capture devices.
+
+    Each camera in the registry gets exactly one FramePipeline, created by
+    ``pipeline_factory(camera)`` for the first viewer and shared by every
+    later one, so recognition and attendance writes run once per frame no
+    matter how many browser tabs are open. The pipeline is stopped
+    ``idle_timeout`` seconds after its last viewer leaves. Viewers pick one
+    of ``profiles`` (output profile names, the first is the default).
+    """
+
+    def __init__(self, pipeline_factory, registry, idle_timeout=10.0, profiles=('default',)):
+        self.pipeline_factory = pipeline_factory
+        self.registry = registry
+        self.profiles = list(profiles)
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._pipelines = {}
+        self._subscribers = {}
+        self._idle_timers = {}
+
+    def subscribe(self, camera_id=None, profile=None):
+        """
+        Adds a viewer of ``camera_id`` in ``profile`` (defaults for None).
+
+        Raises:
+            KeyError: Unknown camera or profile.
+        """
+        camera = self.registry.get(camera_id)
+        profile = profile or self.profiles[0]
+        if profile not in self.profiles:
+            raise KeyError(profile)
+        with self._lock:
+            timer = self._idle_timers.pop(camera.id, None)
+            if timer is not None:
+                timer.cancel()
+            pipeline = self._pipelines.get(camera.id)
+            if pipeline is None or not pipeline.running:
+                if pipeline is not None:
+                    # A stage failed: stop it properly (flushing its open fusion passes and leaving the
+                    # recognition scheduler) before the replacement opens the camera again
+                    pipeline.stop()
+                pipeline = self.pipeline_factory(camera).start()
+                self._pipelines[camera.id] = pipeline
+                for viewer in self._subscribers.get(camera.id, ()):
+                    pipeline.add_listener(viewer.offer, viewer.profile)
+            subscriber = Subscriber(self, camera.id, profile)
+            self._subscribers.setdefault(camera.id, set()).add(subscriber)
+            pipeline.add_listener(subscriber.offer, profile)
+            # Start the viewer on the current picture; it may not change for a while
+            latest = pipeline.latest(profile)
+            if latest is not None:
+                subscriber.offer(latest.seq, latest.part)
+        return subscriber
+
+    def restart(self, camera_id):
+        """Swaps in a new pipeline built from the camera's current registry entry, keeping its viewers."""
+        camera = self.registry.get(camera_id)
+        with self._lock:
+            old = self._pipelines.pop(camera.id, None)
+            subscribers = self._subscribers.get(camera.id, set())
+            if old is not None:
+                for subscriber in subscribers:
+                    old.remove_listener(subscriber.offer, subscriber.profile)
+                # Release the camera, leave the scheduler and flush the open fusion passes before the
+                # replacement opens the same device and starts reporting sightings
+                old.stop()
+            if subscribers:
+                pipeline = self.pipeline_factory(camera).start()
+                self._pipelines[camera.id] = pipeline
+                for subscriber in subscribers:
+                    pipeline.add_listener(subscriber.offer, subscriber.profile)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.camera_id, set())
+            subscribers.discard(subscriber)
+            pipeline = self._pipelines.get(subscriber.camera_id)
+            if pipeline is not None:
+                pipeline.remove_listener(subscriber.offer, subscriber.profile)
+            if not subscribers and pipeline is not None and subscriber.camera_id not in self._idle_timers:
+                timer = threading.Timer(self.idle_timeout, self._stop_if_idle, args=(subscriber.camera_id,))
+                timer.daemon = True
+                self._idle_timers[subscriber.camera_id] = timer
+                timer.start()
+
+    def _stop_if_idle(self, camera_id):
+        with self._lock:
+            self._idle_timers.pop(camera_id, None)
+            if self._subscribers.get(camera_id):
+                return
+            pipeline = self._pipelines.pop(camera_id, None)
+        if pipeline is not None:
+            pipeline.stop()
+
+    def pipeline(self, camera_id):
+        """Returns the pipeline for ``camera_id`` if one exists."""
+        return self._pipelines.get(camera_id)
+
+    def is_running(self, camera_id):
+        pipeline = self._pipelines.get(camera_id)
+        return pipeline is not None and pipeline.running
+
+    def stop_all(self):
+        with self._lock:
+            pipelines = list(self._pipelines.values())
+            self._pipelines.clear()
+            for timer in self._idle_timers.values():
+                timer.cancel()
+            self._idle_timers.clear()
+        for pipeline in pipelines:
+            pipeline.stop()
+
+    def stats(self):
+        """Pipeline stats plus viewer count and per-viewer skips for every running camera."""
+        with self._lock:
+            items = [(camera_id, pipeline, list(self._subscribers.get(camera_id, ())))
+                     for camera_id, pipeline in self._pipelines.items()]
+        return {
+            camera_id: dict(
+                pipeline.stats(),
+                viewers=len(subscribers),
+                viewer_frames=[{'profile': s.profile, 'sent': s.sent, 'skipped': s.skipped,
+                                'bytes_per_second': s.bytes_sent / max(time.monotonic() - s.started, 1e-6)}
+                               for s in subscribers],
+            )
+            for camera_id, pipeline, subscribers in items
+        }
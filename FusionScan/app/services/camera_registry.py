@@ -0,0 +1,76 @@
+from collections import namedtuple
+import threading
+
+# source is a device index (int), an RTSP/HTTP URL or a video file path
+Camera = namedtuple('Camera', ['id', 'source', 'weight'])
+
+def parse_source(value):
+    """Device indexes are given as digits; anything else is a URL or file path for cv2.VideoCapture."""
+    value = str(value).strip()
+    return int(value) if value.isdigit() else value
+
+def _parse_pairs(spec):
+    """'a=x,b=y' -> [('a', 'x'), ('b', 'y')]; only the first '=' splits, so URLs keep theirs."""
+    pairs = []
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        if '=' not in item:
+            raise ValueError(f"Expected camera_id=value, got '{item}'")
+        key, value = item.split('=', 1)
+        pairs.append((key.strip(), value.strip()))
+    return pairs
+
+class CameraRegistry:
+    """
+    The cameras this server runs, by id.
+
+    Configured with CAMERAS (``gate1=0,gate2=rtsp://10.0.0.5/stream,test=gate.mp4``)
+    and CAMERA_WEIGHTS (``gate1=2``); without CAMERAS there is one camera,
+    'default', on CAMERA_SOURCE. The first camera is the default.
+    """
+
+    def __init__(self, cameras):
+        self._lock = threading.Lock()
+        self._cameras = {camera.id: camera for camera in cameras}
+        if not self._cameras:
+            raise ValueError('At least one camera must be configured')
+        self.default_id = next(iter(self._cameras))
+
+    @classmethod
+    def from_config(cls, config):
+        weights = {key: float(value) for key, value in _parse_pairs(config['CAMERA_WEIGHTS'])}
+        pairs = _parse_pairs(config['CAMERAS']) or [('default', config['CAMERA_SOURCE'])]
+        return cls(Camera(camera_id, parse_source(source), weights.get(camera_id, 1.0)) for camera_id, source in pairs)
+
+    def get(self, camera_id=None):
+        """Returns the camera (the default one for None); raises KeyError for unknown ids."""
+        with self._lock:
+            return self._cameras[camera_id if camera_id is not None else self.default_id]
+
+    def __contains__(self, camera_id):
+        return camera_id in self._cameras
+
+    def all(self):
+        with self._lock:
+            return list(self._cameras.values())
+
+    def update(self, camera_id, source=None, weight=None):
+        """
+        Points a registered camera at a new source and/or weight.
+
+        Returns:
+            Camera: The updated entry.
+        """
+        with self._lock:
+            camera = self._cameras[camera_id]
+            if source is not None:
+                camera = camera._replace(source=parse_source(source))
+            if weight is not None:
+                camera = camera._replace(weight=float(weight))
+            self._cameras[camera_id] = camera
+            return camera
+
+    def to_dict(self, camera):
+        return {'id': camera.id, 'source': str(camera.source), 'weight': camera.weight,
+                'default': camera.id == self.default_id}
@@ -1,14 +1,95 @@
 from datetime import datetime, timedelta
 from app.models import db, Attendance, User
+from app.services.attendance_cache import LatestStatus
+from app.services.event_bus import attendance_event
+
+def _flush_attendance_writer(user_id=None):
+    """Commits rows still queued in the write-behind writer and resets its dedup state."""
+    from app import attendance_writer
+    if attendance_writer is not None and attendance_writer.running:
+        attendance_writer.flush()
+        attendance_writer.forget(user_id)
+
+def _status_cache():
+    from app import latest_status_cache
+    return latest_status_cache
+
+def _rollup():
+    from app import attendance_rollup
+    return attendance_rollup
+
+def _publish(event_type, data):
+    from app import event_bus
+    if event_bus is not None:
+        event_bus.publish(event_type, data)
 
 class DataService:
-    def record_attendance(self, user_id, status, temperature):
+    def record_attendance(self, user_id, status, temperature, timestamp=None):
         """Records attendance for a user if not recorded recently."""
         last_attendance = Attendance.query.filter_by(user_id=user_id).order_by(Attendance.timestamp.desc()).first()
-        if not last_attendance or (datetime.utcnow() - last_attendance.timestamp) > timedelta(seconds=5):
-            attendance = Attendance(user_id=user_id, status=status, temperature=temperature)
+        now = timestamp or datetime.utcnow()
+        if not last_attendance or (now - last_attendance.timestamp) > timedelta(seconds=5):
+            attendance = Attendance(user_id=user_id, status=status, temperature=temperature, timestamp=now)
             db.session.add(attendance)
+            rollup = _rollup()
+            if rollup is not None:
+                rollup.apply([{'user_id': user_id, 'status': status, 'temperature': temperature, 'timestamp': now}])
             db.session.commit()
+            cache = _status_cache()
+            if cache is not None:
+                cache.update(user_id, status, temperature, attendance.timestamp)
+            _publish('attendance', attendance_event([
+                {'user_id': user_id, 'status': status, 'temperature': temperature, 'timestamp': attendance.timestamp}]))
+
+    def latest_attendance_by_user(self, user_ids=None):
+        """
+        Each user's most recent attendance in a single query.
+
+        Args:
+            user_ids: Restrict to these users; None means every user.
+
+        Returns:
+            dict: {user_id: LatestStatus}
+        """
+        rank = db.func.row_number().over(
+            partition_by=Attendance.user_id,
+            order_by=(Attendance.timestamp.desc(), Attendance.id.desc()),
+        ).label('rank')
+        ranked = db.session.query(Attendance.id, rank)
+        if user_ids is not None:
+            ranked = ranked.filter(Attendance.user_id.in_(user_ids))
+        ranked = ranked.subquery()
+        rows = (db.session.query(Attendance.user_id, Attendance.status, Attendance.temperature, Attendance.timestamp)
+                .join(ranked, Attendance.id == ranked.c.id)
+                .filter(ranked.c.rank == 1))
+        return {row.user_id: LatestStatus(*row) for row in rows}
+
+    def latest_statuses(self, user_ids):
+        """
+        Latest attendance for the given users, served from the in-process cache.
+
+        The cache is filled with one query the first time (or after an
+        invalidation); afterwards the attendance writers keep it current.
+        """
+        cache = _status_cache()
+        if cache is None:
+            return self.latest_attendance_by_user(user_ids)
+        if not cache.warm:
+            cache.load(self.latest_attendance_by_user().values())
+        return cache.get_many(user_ids)
+
+    def users_page(self, page=1, per_page=50, strand=None):
+        """A page of users ordered by name, optionally limited to one strand."""
+        query = User.query
+        if strand:
+            query = query.filter_by(strand=strand)
+        return query.order_by(User.username).paginate(page=page, per_page=per_page, error_out=False)
+
+    def attendance_summary(self, start, end, strand=None, user_id=None):
+        """Daily attendance summary from the rollup tables; see AttendanceRollup.summary."""
+        rollup = _rollup()
+        rollup.finalize_pending()
+        return rollup.summary(start, end, strand=strand, user_id=user_id)
 
     def get_user_by_id(self, user_id):
         """Retrieves a user by their ID."""
@@ -18,12 +99,32 @@ class DataService:
         """Deletes a user and their associated attendance records by ID."""
         user = User.query.get(user_id)
         if user:
+            _flush_attendance_writer(user_id)
             Attendance.query.filter_by(user_id=user_id).delete()
             db.session.delete(user)
+            rollup = _rollup()
+            if rollup is not None:
+                rollup.remove_user(user_id)
             db.session.commit()
+            cache = _status_cache()
+            if cache is not None:
+                cache.discard(user_id)
+            _publish('user_deleted', {'user_id': user_id})
+            from app import face_recognition_service
+            if face_recognition_service is not None:
+                face_recognition_service.update_user(user_id)
 
     def restart_all_attendance(self):
         """Resets all attendance records for the current day."""
+        _flush_attendance_writer()
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
         Attendance.query.filter(Attendance.timestamp >= today_start).delete()
-        db.session.commit()
\ No newline at end of file
+        rollup = _rollup()
+        if rollup is not None:
+            rollup.rebuild_day(today_start.date())
+        db.session.commit()
+        cache = _status_cache()
+        if cache is not None:
+            cache.invalidate()
+        # Every dashboard's table is stale now
+        _publish('reset', {'reason': 'attendance restarted'})
\ No newline at end of file
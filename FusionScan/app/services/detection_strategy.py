@@ -0,0 +1,170 @@
+from collections import deque, namedtuple
+import statistics
+import threading
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+# image is the RGB detection image; scale is detection pixels per frame pixel;
+# offset is the (x, y) of the region of interest in the frame; frame is the
+# full-resolution BGR camera frame
+PreparedFrame = namedtuple('PreparedFrame', ['image', 'scale', 'offset', 'frame'])
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+def parse_roi(value):
+    """'x0:y0:x1:y1' in fractions of the frame (e.g. '0.25:0:0.75:1') -> tuple, or None."""
+    if not value:
+        return None
+    roi = tuple(float(part) for part in value.split(':'))
+    if len(roi) != 4 or not (0 <= roi[0] < roi[2] <= 1 and 0 <= roi[1] < roi[3] <= 1):
+        raise ValueError(f"Invalid detection region '{value}', expected x0:y0:x1:y1 fractions")
+    return roi
+
+class DetectionStrategy:
+    """
+    Where, and at what resolution, faces are detected and encoded.
+
+    - ``roi`` crops the frame to the scanner's region of interest before
+      anything else, so pixels outside the kiosk area are never scanned.
+    - ``refine`` (coarse-to-fine): faces found on the downscaled image are
+      re-detected on a full-resolution crop around them, and encoded from
+      that crop, so boxes and encodings keep full-frame detail while the
+      expensive whole-image HOG pass stays coarse.
+    - ``auto_scale`` picks the detection scale from the faces actually seen:
+      the smallest face per frame, over the last ``history`` frames, is
+      brought to about ``target_face`` detection pixels. After ``probe_after``
+      frames without a face, every ``probe_every``-th frame is scanned at
+      ``max_scale`` so people further away are still picked up.
+
+    One instance per camera; the auto scale is that camera's state.
+    """
+
+    STEP = 0.125  # auto scales are multiples of this
+
+    def __init__(self, scale=0.25, roi=None, refine=False, auto_scale=False, min_scale=0.125, max_scale=0.5,
+                 target_face=50, history=30, probe_after=30, probe_every=10, refine_margin=0.4, refine_face=100):
+        """
+        Args:
+            scale: Detection scale (the starting one with auto_scale).
+            roi: (x0, y0, x1, y1) fractions of the frame, or None for all of it.
+            target_face: Detection-image height (px) auto_scale aims for. face_locations
+                upsamples once, so dlib's 80 px HOG window finds faces from ~40 px.
+            refine_margin: Context around a face in refinement crops, as a fraction of its size.
+            refine_face: Face height (px) refinement crops are re-detected at.
+        """
+        self.scale = scale
+        self.roi = roi
+        self.refine = refine
+        self.auto_scale = auto_scale
+        self.min_scale = min_scale
+        self.max_scale = max(max_scale, min_scale)
+        self.target_face = target_face
+        self.probe_after = probe_after
+        self.probe_every = max(1, probe_every)
+        self.refine_margin = refine_margin
+        self.refine_face = refine_face
+        self._sizes = deque(maxlen=history)
+        self._empty = 0
+        self._frames = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, camera_id=None):
+        """Builds a camera's strategy from the DETECTION_* settings; DETECTION_ROI may be per camera."""
+        roi = config['DETECTION_ROI']
+        if roi and '=' in roi:
+            rois = dict(item.split('=', 1) for item in roi.split(',') if item.strip())
+            roi = rois.get(camera_id)
+        return cls(
+            scale=config['DETECTION_SCALE'],
+            roi=parse_roi(roi),
+            refine=config['DETECTION_REFINE'],
+            auto_scale=config['DETECTION_AUTO_SCALE'],
+            min_scale=config['DETECTION_MIN_SCALE'],
+            max_scale=config['DETECTION_MAX_SCALE'])
+
+    def fixed(self, scale=None):
+        """
+        Keyword arguments for a strategy with this one's settings at a fixed
+        scale; picklable, for detection in worker processes.
+        """
+        return dict(scale=scale or self.scale, roi=self.roi, refine=self.refine,
+                    refine_margin=self.refine_margin, refine_face=self.refine_face)
+
+    def next_scale(self):
+        """The scale for the next frame: the current one, or ``max_scale`` on a probe frame."""
+        if not self.auto_scale:
+            return self.scale
+        with self._lock:
+            self._frames += 1
+            if self._empty >= self.probe_after and self._frames % self.probe_every == 0:
+                return self.max_scale
+            return self.scale
+
+    def roi_pixels(self, width, height):
+        if self.roi is None:
+            return 0, 0, width, height
+        x0, y0, x1, y1 = self.roi
+        return int(x0 * width), int(y0 * height), int(x1 * width), int(y1 * height)
+
+    def prepare(self, frame, scale=None):
+        """Crops a BGR frame to the region of interest, downscales it and converts it to RGB."""
+        scale = scale or self.next_scale()
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi_pixels(width, height)
+        region = frame[y0:y1, x0:x1]
+        if scale != 1.0:
+            region = cv2.resize(region, (0, 0), fx=scale, fy=scale)
+        return PreparedFrame(cv2.cvtColor(region, cv2.COLOR_BGR2RGB), scale, (x0, y0), frame)
+
+    @staticmethod
+    def to_frame_box(prepared, location):
+        """Maps a (top, right, bottom, left) box on the detection image to the full frame."""
+        top, right, bottom, left = location
+        x0, y0 = prepared.offset
+        scale = prepared.scale
+        return (int(round(top / scale)) + y0, int(round(right / scale)) + x0,
+                int(round(bottom / scale)) + y0, int(round(left / scale)) + x0)
+
+    def refine_region(self, frame, box):
+        """Full-frame (x0, y0, x1, y1) crop around ``box`` with ``refine_margin`` of context."""
+        top, right, bottom, left = box
+        pad = int(max(bottom - top, right - left) * self.refine_margin)
+        height, width = frame.shape[:2]
+        return max(0, left - pad), max(0, top - pad), min(width, right + pad), min(height, bottom + pad)
+
+    def observe(self, boxes):
+        """Feeds the full-frame boxes found in one frame to the auto scale."""
+        if not self.auto_scale:
+            return
+        with self._lock:
+            if not boxes:
+                self._empty += 1
+                return
+            self._empty = 0
+            self._sizes.append(min(bottom - top for top, _, bottom, _ in boxes))
+            desired = self.target_face / max(statistics.median(self._sizes), 1)
+            desired = min(self.max_scale, max(self.min_scale, desired))
+            # Hysteresis: only move once the target is most of a step away
+            if abs(desired - self.scale) > 0.75 * self.STEP:
+                self.scale = min(self.max_scale, max(self.min_scale, round(desired / self.STEP) * self.STEP))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'scale': self.scale,
+                'roi': self.roi,
+                'refine': self.refine,
+                'auto_scale': self.auto_scale,
+                'typical_face_px': statistics.median(self._sizes) if self._sizes else None,
+                'frames_without_faces': self._empty,
+            }
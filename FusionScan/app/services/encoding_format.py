@@ -0,0 +1,76 @@
+"""
+Binary storage format for User.face_encodings.
+
+A 16-byte header followed by the raw little-endian float32 matrix:
+
+    offset  size  field
+    0       4     magic b'FSEN'
+    4       2     format version (uint16)
+    6       2     encoding dimension (uint16)
+    8       4     number of encodings (uint32)
+    12      4     reserved, zero
+
+The header keeps the payload 16-byte aligned, so decode_encodings() is a
+zero-copy np.frombuffer view, and decode_many() turns any number of rows into
+one matrix with a single join and a single frombuffer.
+"""
+import struct
+import numpy as np
+
+MAGIC = b'FSEN'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHI4x')
+DTYPE = np.dtype('<f4')
+
+class EncodingFormatError(ValueError):
+    pass
+
+def encode_encodings(encodings, dim=128):
+    """
+    Serializes encodings (a sequence of vectors or an (n, dim) array) to bytes.
+    """
+    matrix = np.ascontiguousarray(np.asarray(encodings, dtype=DTYPE).reshape(-1, dim))
+    return HEADER.pack(MAGIC, FORMAT_VERSION, dim, len(matrix)) + matrix.tobytes()
+
+def is_encoded(blob):
+    """True if ``blob`` is in this format (as opposed to a legacy pickle)."""
+    return blob is not None and bytes(blob[:len(MAGIC)]) == MAGIC
+
+def read_header(blob):
+    """
+    Validates a blob's header.
+
+    Returns:
+        tuple: (version, dim, count)
+    """
+    if len(blob) < HEADER.size:
+        raise EncodingFormatError('Face encoding blob is shorter than its header')
+    magic, version, dim, count = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise EncodingFormatError('Face encoding blob has an unknown format')
+    if version != FORMAT_VERSION:
+        raise EncodingFormatError(f'Unsupported face encoding format version {version}')
+    if len(blob) != HEADER.size + count * dim * DTYPE.itemsize:
+        raise EncodingFormatError(f'Face encoding blob should hold {count} x {dim} floats')
+    return version, dim, count
+
+def decode_encodings(blob):
+    """Returns a read-only (n, dim) float32 view of the blob."""
+    _, dim, count = read_header(blob)
+    return np.frombuffer(blob, dtype=DTYPE, count=count * dim, offset=HEADER.size).reshape(count, dim)
+
+def decode_many(blobs, dim=128):
+    """
+    Decodes many blobs into one matrix.
+
+    Returns:
+        tuple: ((total, dim) float32 array with the rows of every blob in
+        order, array of per-blob row counts)
+    """
+    counts = np.empty(len(blobs), dtype=np.intp)
+    for i, blob in enumerate(blobs):
+        _, blob_dim, counts[i] = read_header(blob)
+        if blob_dim != dim:
+            raise EncodingFormatError(f'Expected {dim}-d face encodings, found {blob_dim}-d')
+    payload = b''.join(memoryview(blob)[HEADER.size:] for blob in blobs)
+    return np.frombuffer(payload, dtype=DTYPE).reshape(-1, dim), counts
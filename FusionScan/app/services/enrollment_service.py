@@ -0,0 +1,323 @@
+from collections import namedtuple
+import logging
+import math
+import threading
+import time
+import uuid
+import numpy as np
+from app.models import User, db
+from app.services.detection_strategy import DetectionStrategy
+from app.services.encoding_format import encode_encodings
+from app.services.frame_pipeline import DropOldestQueue
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+face_recognition = lazy_import('face_recognition')
+
+log = logging.getLogger(__name__)
+
+FaceQuality = namedtuple('FaceQuality', ['score', 'sharpness', 'size', 'pose', 'centering'])
+
+# A sample must clear every gate whatever its overall score; checked in this order
+QUALITY_GATES = (
+    ('pose', 0.4, 'Look straight at the camera.'),
+    ('centering', 0.5, 'Center your face in the frame.'),
+    ('sharpness', 0.3, 'Hold still.'),
+)
+
+# A sample is a full-resolution RGB crop around one accepted face and the face's location in it
+Sample = namedtuple('Sample', ['quality', 'seq', 'crop', 'location'])
+
+def _mean_point(points):
+    return sum(x for x, _ in points) / len(points), sum(y for _, y in points) / len(points)
+
+def score_face(frame_shape, gray_face, box, landmarks, min_face=80, sharpness_ref=150.0):
+    """
+    Rates one detected face for enrollment.
+
+    Args:
+        frame_shape: Shape of the camera frame the box is in.
+        gray_face: Grayscale crop of the face box.
+        box: (top, right, bottom, left) in frame coordinates.
+        landmarks: face_recognition's 5-point ('small') landmarks of the face.
+        min_face: Smallest face height (px) accepted.
+        sharpness_ref: Laplacian variance counted as fully sharp.
+
+    Returns:
+        FaceQuality: Every component in 0..1, or None when the face is too small.
+    """
+    top, right, bottom, left = box
+    height, width = frame_shape[:2]
+    face_height = bottom - top
+    if face_height < min_face:
+        return None
+    size = min(1.0, face_height / (0.35 * height))
+
+    # Variance of the Laplacian at a fixed crop size, so near and far faces are judged alike
+    normalized = cv2.resize(gray_face, (128, 128), interpolation=cv2.INTER_AREA)
+    sharpness = min(1.0, float(cv2.Laplacian(normalized, cv2.CV_64F).var()) / sharpness_ref)
+
+    offset_x = ((left + right) / 2 - width / 2) / (width / 2)
+    offset_y = ((top + bottom) / 2 - height / 2) / (height / 2)
+    centering = 1.0 - min(1.0, math.hypot(offset_x, offset_y) / math.sqrt(2))
+
+    # Yaw from how far the nose sits off the eyes' midpoint, roll from the eye line's angle
+    left_eye, right_eye = _mean_point(landmarks['left_eye']), _mean_point(landmarks['right_eye'])
+    nose = landmarks['nose_tip'][0]
+    eye_distance = max(math.hypot(right_eye[0] - left_eye[0], right_eye[1] - left_eye[1]), 1.0)
+    yaw = abs(nose[0] - (left_eye[0] + right_eye[0]) / 2) / eye_distance
+    roll = abs(math.degrees(math.atan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0])))
+    roll = min(roll, 180.0 - roll)
+    pose = max(0.0, 1.0 - 2.0 * yaw - roll / 45.0)
+
+    score = 0.35 * sharpness + 0.3 * pose + 0.2 * size + 0.15 * centering
+    return FaceQuality(score, sharpness, size, pose, centering)
+
+class EnrollmentJob:
+    """One user's face capture; its state is polled by the admin page."""
+
+    ACTIVE = ('capturing', 'encoding', 'saving')
+
+    def __init__(self, user_id, camera_id):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.camera_id = camera_id
+        self.state = 'capturing'
+        self.message = 'Look at the camera.'
+        self.started = time.time()
+        self.finished = None
+        self.frames_seen = 0
+        self.faces_scored = 0
+        self.samples = 0
+        self.best_scores = []
+        self.progress = 0.0
+        self.stored = 0
+        self.cancelled = threading.Event()
+
+    @property
+    def active(self):
+        return self.state in self.ACTIVE
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'camera_id': self.camera_id,
+            'state': self.state,
+            'message': self.message,
+            'progress': round(self.progress, 3),
+            'frames_seen': self.frames_seen,
+            'faces_scored': self.faces_scored,
+            'samples': self.samples,
+            'best_scores': [round(score, 3) for score in self.best_scores],
+            'stored': self.stored,
+            'elapsed': round((self.finished or time.time()) - self.started, 2),
+        }
+
+class EnrollmentService:
+    """
+    Captures a user's face encodings in the background.
+
+    Frames are taken raw from the camera's shared FramePipeline (the same
+    device the gate uses, opened through the CameraHub), sampled a few times
+    per second, and run through HOG detection at ``detection_scale``. Frames
+    with exactly one face are scored on sharpness, size, pose and centering
+    (see score_face); the best ``samples`` full-resolution crops are kept.
+    Capture ends once every kept sample scores at least ``good_score`` (and
+    ``min_seconds`` have passed) or after ``max_seconds``. The kept crops are
+    then encoded in a single jittered face_encodings call and stored.
+    """
+
+    def __init__(self, app, recognizer, camera_hub, samples=5, jitters=3, detection_scale=0.5,
+                 sample_interval=0.2, min_seconds=2.0, max_seconds=20.0, good_score=0.75,
+                 min_score=0.45, min_face=80, keep_finished=50):
+        """
+        Args:
+            app: The Flask app; jobs run in its app context.
+            recognizer: FaceRecognitionService whose gallery is updated after each enrollment.
+            camera_hub: CameraHub the frames are taken from.
+            samples: Encodings stored per user.
+            jitters: num_jitters of the final encode.
+            sample_interval: Seconds between scored frames, so samples are spread over time.
+            min_score: Faces scoring below this are never kept, even if they clear QUALITY_GATES.
+            keep_finished: Finished jobs kept for polling.
+        """
+        self.app = app
+        self.recognizer = recognizer
+        self.camera_hub = camera_hub
+        self.samples = samples
+        self.jitters = jitters
+        self.strategy = DetectionStrategy(scale=detection_scale)
+        self.sample_interval = sample_interval
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.good_score = good_score
+        self.min_score = min_score
+        self.min_face = min_face
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def start(self, user_id, camera_id=None):
+        """
+        Starts capturing for ``user_id``, or returns the user's job already in progress.
+
+        Raises:
+            KeyError: Unknown camera.
+        """
+        camera = self.camera_hub.registry.get(camera_id)
+        with self._lock:
+            for job in self._jobs.values():
+                if job.user_id == user_id and job.active:
+                    return job
+            job = EnrollmentJob(user_id, camera.id)
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job,), name=f'enroll-{user_id}', daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_job(self, user_id):
+        with self._lock:
+            return next((job for job in self._jobs.values() if job.user_id == user_id and job.active), None)
+
+    def cancel(self, job_id):
+        """Stops a job that is still capturing; returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is not None:
+            job.cancelled.set()
+        return job
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in sorted(finished, key=lambda j: j.started)[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def _run(self, job):
+        with self.app.app_context():
+            try:
+                kept = self._capture(job)
+                if job.cancelled.is_set():
+                    job.state, job.message = 'cancelled', 'Capture cancelled.'
+                elif not kept:
+                    job.state = 'failed'
+                    job.message = 'No usable face was seen. Face the camera alone, in good light, and try again.'
+                else:
+                    self._store(job, kept)
+            except Exception as e:
+                db.session.rollback()
+                job.state, job.message = 'failed', f'Enrollment failed: {e}'
+                log.error("Enrollment of user %s failed: %s", job.user_id, e)
+            finally:
+                job.finished = time.time()
+                db.session.remove()
+
+    def _capture(self, job):
+        """Scores camera frames until enough good samples are kept; returns them, best first."""
+        frames = DropOldestQueue(1)
+        subscriber = self.camera_hub.subscribe(job.camera_id)  # keeps the camera open while capturing
+        pipeline = None
+        kept = []
+        last_scored = 0.0
+        try:
+            while not job.cancelled.is_set():
+                # A camera restart replaces the pipeline; follow it
+                current = self.camera_hub.pipeline(job.camera_id)
+                if current is not pipeline:
+                    if pipeline is not None:
+                        pipeline.remove_frame_listener(frames.put)
+                    pipeline = current
+                    if pipeline is not None:
+                        pipeline.add_frame_listener(frames.put)
+
+                elapsed = time.time() - job.started
+                job.progress = min(1.0, max(elapsed / self.max_seconds,
+                                            sum(min(1.0, s.quality.score / self.good_score) for s in kept) / self.samples))
+                done = len(kept) == self.samples and kept[-1].quality.score >= self.good_score
+                if (done and elapsed >= self.min_seconds) or elapsed >= self.max_seconds:
+                    break
+
+                frame = frames.get(timeout=0.5)
+                if frame is None or frame.timestamp - last_scored < self.sample_interval:
+                    continue
+                last_scored = frame.timestamp
+                job.frames_seen += 1
+                sample = self.score_frame(job, frame)
+                if sample is None:
+                    continue
+                kept.append(sample)
+                kept.sort(key=lambda s: s.quality.score, reverse=True)
+                del kept[self.samples:]
+                job.samples = len(kept)
+                job.best_scores = [s.quality.score for s in kept]
+        finally:
+            if pipeline is not None:
+                pipeline.remove_frame_listener(frames.put)
+            subscriber.close()
+        return kept
+
+    def score_frame(self, job, frame):
+        """Detects and scores the face in one frame; returns a Sample, or None (with job.message set)."""
+        prepared = self.strategy.prepare(frame.image)
+        locations = face_recognition.face_locations(prepared.image)
+        if len(locations) != 1:
+            job.message = 'No face detected.' if not locations else 'More than one face in view.'
+            return None
+        box = self.strategy.to_frame_box(prepared, locations[0])
+        top, right, bottom, left = box
+        x0, y0, x1, y1 = self.strategy.refine_region(frame.image, box)
+        crop = cv2.cvtColor(frame.image[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+        location = (top - y0, right - x0, bottom - y0, left - x0)
+        landmarks = face_recognition.face_landmarks(crop, [location], model='small')
+        if not landmarks:
+            return None
+        gray_face = cv2.cvtColor(frame.image[max(top, 0):bottom, max(left, 0):right], cv2.COLOR_BGR2GRAY)
+        quality = score_face(frame.image.shape, gray_face, box, landmarks[0], self.min_face)
+        job.faces_scored += 1
+        if quality is None:
+            job.message = 'Move closer to the camera.'
+            return None
+        for component, threshold, advice in QUALITY_GATES:
+            if getattr(quality, component) < threshold:
+                job.message = advice
+                return None
+        if quality.score < self.min_score:
+            job.message = 'Move closer and face the camera.'
+            return None
+        job.message = 'Capturing...'
+        return Sample(quality, frame.seq, crop, location)
+
+    def encode_samples(self, samples):
+        """Encodes samples' crops in one jittered face_encodings call; returns one encoding per sample."""
+        # Side by side on one canvas, so dlib computes every encoding in a single call
+        canvas = np.zeros((max(s.crop.shape[0] for s in samples), sum(s.crop.shape[1] for s in samples), 3), np.uint8)
+        locations, x = [], 0
+        for sample in samples:
+            height, width = sample.crop.shape[:2]
+            canvas[:height, x:x + width] = sample.crop
+            top, right, bottom, left = sample.location
+            locations.append((top, right + x, bottom, left + x))
+            x += width
+        return face_recognition.face_encodings(canvas, locations, num_jitters=self.jitters)
+
+    def _store(self, job, kept):
+        """Encodes the kept samples and saves them on the user."""
+        job.state, job.message = 'encoding', f'Encoding {len(kept)} samples...'
+        face_encodings = self.encode_samples(kept)
+
+        job.state, job.message = 'saving', 'Saving encodings...'
+        user = User.query.get(job.user_id)
+        if user is None:
+            raise ValueError('User no longer exists')
+        user.face_encodings = encode_encodings(face_encodings)
+        db.session.commit()
+        self.recognizer.update_user(user.id)
+        job.stored = len(face_encodings)
+        job.progress = 1.0
+        job.state = 'done'
+        job.message = f'Stored {len(face_encodings)} face encodings for {user.username}.'
+        log.info("Enrolled %s: %d encodings, scores %s.",
+                 user.username, len(face_encodings), [round(s, 2) for s in job.best_scores])
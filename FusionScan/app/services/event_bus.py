@@ -0,0 +1,129 @@
+from collections import deque, namedtuple
+from itertools import islice
+import json
+import threading
+import time
+
+# id is '<epoch>-<seq>'; data is JSON-serializable
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # as rendered in the attendance table
+
+def attendance_event(rows):
+    """'attendance' payload for committed rows (dicts with user_id/status/temperature/timestamp)."""
+    return {'rows': [{
+        'user_id': row['user_id'],
+        'status': row['status'],
+        'temperature': row['temperature'],
+        'timestamp': row['timestamp'].strftime(TIMESTAMP_FORMAT),
+    } for row in rows]}
+
+def temperature_event(reading):
+    """'temperature' payload for a ThermalReading, or for None when there is no fresh reading."""
+    if reading is None:
+        return {'temperature': None, 'timestamp': None}
+    return {'temperature': reading.temperature, 'timestamp': reading.timestamp}
+
+def format_sse(event_type, data, event_id=None):
+    """One Server-Sent Events message."""
+    message = f'event: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+    return f'id: {event_id}\n{message}' if event_id is not None else message
+
+class EventBus:
+    """
+    In-process publish/subscribe for live dashboard updates.
+
+    Publishers (the attendance writers, the thermal sampler) append events to
+    a bounded history; every /events stream reads the events after its
+    cursor, the id of the last event it delivered. A browser that reconnects
+    sends that id back as Last-Event-ID and gets only what it missed. Ids carry
+    the bus's start time, so a cursor from before a restart, or one that has
+    fallen out of the ``history`` window, is reported as a gap and the client
+    reloads instead of silently missing updates.
+    """
+
+    def __init__(self, history=1000):
+        self.epoch = f'{int(time.time() * 1000):x}'
+        self.published = 0
+        self.streams = 0
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def _id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    @property
+    def cursor(self):
+        """Id of the newest event; a stream started from it receives only later events."""
+        with self._cond:
+            return self._id(self._seq)
+
+    def publish(self, event_type, data):
+        with self._cond:
+            self._seq += 1
+            event = Event(self._id(self._seq), event_type, data)
+            self._events.append(event)
+            self.published += 1
+            self._cond.notify_all()
+        return event
+
+    def _parse(self, cursor):
+        """Sequence number of a cursor from this bus, or None."""
+        epoch, _, seq = (cursor or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def read(self, cursor, timeout=None):
+        """
+        Events published after ``cursor``, waiting up to ``timeout`` seconds for the first one.
+
+        Returns:
+            list: Events, oldest first (empty on timeout), or None if the
+            cursor is unknown or older than the history (the reader must resync).
+        """
+        seq = self._parse(cursor)
+        with self._cond:
+            if seq is None or seq > self._seq:
+                return None
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+            first = self._seq - len(self._events) + 1
+            if seq < first - 1:
+                return None
+            return list(islice(self._events, seq - first + 1, None))
+
+    def stream(self, cursor, keepalive=15.0, initial=()):
+        """
+        Server-Sent Events generator from ``cursor`` on; never returns on its own.
+
+        Args:
+            initial: (event_type, data) messages sent first, without ids.
+        """
+        with self._cond:
+            self.streams += 1
+        try:
+            yield 'retry: 3000\n\n'
+            for event_type, data in initial:
+                yield format_sse(event_type, data)
+            while True:
+                events = self.read(cursor, timeout=keepalive)
+                if events is None:
+                    # Unknown or expired cursor: restart from now and tell the client to reload
+                    cursor = self.cursor
+                    yield format_sse('reset', {'reason': 'cursor expired'}, cursor)
+                    continue
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                for event in events:
+                    yield format_sse(event.type, event.data, event.id)
+                cursor = events[-1].id
+        finally:
+            with self._cond:
+                self.streams -= 1
+
+    def stats(self):
+        with self._cond:
+            return {'published': self.published, 'history': len(self._events), 'streams': self.streams,
+                    'cursor': self._id(self._seq)}
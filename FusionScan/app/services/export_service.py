@@ -0,0 +1,220 @@
+from datetime import timedelta
+import csv
+import io
+import logging
+import queue
+import threading
+from flask import current_app
+from app.models import db, Attendance, User
+from app.utils.lazy_import import lazy_import
+
+xlsxwriter = lazy_import('xlsxwriter')
+
+log = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ['Timestamp', 'Username', 'LRN', 'Status', 'Temperature']
+TIMESTAMP_FORMAT = '%Y-%m-%d %I:%M:%S %p'
+
+class ExportCancelled(Exception):
+    pass
+
+class _ChunkStream(io.RawIOBase):
+    """
+    Write-only file object that hands what is written to a reader thread.
+
+    Writes are gathered into ``chunk_bytes`` pieces and passed through a small
+    bounded queue, so the writer blocks (instead of buffering the whole file)
+    when the client reads slower than the export is produced. It is not
+    seekable, which makes zipfile write the archive in streaming mode.
+    """
+
+    _DONE = object()
+
+    def __init__(self, chunk_bytes=64 * 1024, max_chunks=8):
+        super().__init__()
+        self.chunk_bytes = chunk_bytes
+        self._buffer = bytearray()
+        self._chunks = queue.Queue(max_chunks)
+        self._cancelled = threading.Event()
+        self._raised = False
+        self._error = None
+
+    def writable(self):
+        return True
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def write(self, data):
+        if self._cancelled.is_set():
+            if self._raised:
+                return len(data)  # zipfile retries close() from __del__; just drop it
+            self._raised = True
+            raise ExportCancelled()
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_bytes:
+            self._put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                self._raised = True
+                raise ExportCancelled()
+            try:
+                self._chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, error=None):
+        """Called by the writer when it is done (or failed)."""
+        self._error = error
+        try:
+            if self._buffer and error is None:
+                self._put(bytes(self._buffer))
+            self._put(self._DONE)
+        except ExportCancelled:
+            pass
+
+    def cancel(self):
+        """Called by the reader when it stops early; the writer raises ExportCancelled on its next write."""
+        self._cancelled.set()
+
+    def chunks(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is self._DONE:
+                break
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+class AttendanceExporter:
+    """
+    Streams attendance history out as CSV or xlsx with flat memory use.
+
+    One joined query does the filtering and ordering in the database, and rows
+    are fetched ``chunk_size`` at a time with yield_per, so no more than one
+    chunk is ever held in Python.
+    """
+
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+
+    def query(self, start=None, end=None, strand=None, status=None):
+        """
+        Attendance rows joined with their user, newest first.
+
+        Args:
+            start, end: Optional dates; ``end`` is inclusive.
+            strand: Only users in this strand.
+            status: Only rows with this status ("Present", "Anomaly", ...).
+        """
+        query = (db.session.query(Attendance.timestamp, User.username, User.student_lrn,
+                                  Attendance.status, Attendance.temperature)
+                 .outerjoin(User, User.id == Attendance.user_id))
+        if start is not None:
+            query = query.filter(Attendance.timestamp >= start)
+        if end is not None:
+            query = query.filter(Attendance.timestamp < end + timedelta(days=1))
+        if strand:
+            query = query.filter(User.strand == strand)
+        if status:
+            query = query.filter(Attendance.status == status)
+        return query.order_by(Attendance.timestamp.desc(), Attendance.id.desc()).yield_per(self.chunk_size)
+
+    def rows(self, **filters):
+        """Export rows as tuples in EXPORT_COLUMNS order, with the timestamp still a datetime."""
+        for timestamp, username, lrn, status, temperature in self.query(**filters):
+            yield (timestamp, username or 'Unknown', lrn or 'N/A', status, temperature)
+
+    def iter_csv(self, **filters):
+        """Yields the CSV export in chunks of text, header first."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for count, (timestamp, username, lrn, status, temperature) in enumerate(self.rows(**filters), 1):
+            writer.writerow((timestamp.strftime(TIMESTAMP_FORMAT) if timestamp else '',
+                             username, lrn, status, temperature))
+            if count % self.chunk_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def write_xlsx(self, output, cancelled=None, **filters):
+        """
+        Writes the xlsx export to ``output`` (a path or a binary file object).
+
+        Uses xlsxwriter's constant_memory mode, which flushes each row to its
+        own scratch file as it is written instead of keeping the worksheet in
+        memory; ``output`` itself is only written when the workbook is closed.
+
+        Args:
+            cancelled: Optional callable; the export stops with ExportCancelled
+                once it returns True (checked once per chunk).
+
+        Returns:
+            int: Number of data rows written.
+        """
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        try:
+            worksheet = workbook.add_worksheet('Attendance')
+            header = workbook.add_format({'bold': True})
+            date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss AM/PM'})
+            worksheet.set_column(0, 0, 24)
+            worksheet.set_column(1, 2, 18)
+            worksheet.set_column(3, 4, 12)
+            worksheet.write_row(0, 0, EXPORT_COLUMNS, header)
+            count = 0
+            for count, (timestamp, username, lrn, status, temperature) in enumerate(self.rows(**filters), 1):
+                if cancelled is not None and count % self.chunk_size == 0 and cancelled():
+                    raise ExportCancelled()
+                if timestamp is not None:
+                    worksheet.write_datetime(count, 0, timestamp, date_format)
+                worksheet.write_string(count, 1, username)
+                worksheet.write_string(count, 2, lrn)
+                if status is not None:
+                    worksheet.write_string(count, 3, status)
+                if temperature is not None:
+                    worksheet.write_number(count, 4, temperature)
+        finally:
+            workbook.close()
+        return count
+
+    def iter_xlsx(self, **filters):
+        """
+        Yields the xlsx export as it is produced.
+
+        The workbook is written by a background thread into a _ChunkStream and
+        the chunks are yielded as the zip container is assembled, so the file
+        never has to fit in memory and nothing is written to UPLOAD_FOLDER.
+        Closing the generator early stops the thread. Must be called inside an
+        app context (the generator itself may run outside one, as in a
+        streamed response).
+        """
+        return self._stream_xlsx(current_app._get_current_object(), filters)
+
+    def _stream_xlsx(self, app, filters):
+        stream = _ChunkStream()
+
+        def produce():
+            error = None
+            try:
+                with app.app_context():
+                    self.write_xlsx(stream, cancelled=lambda: stream.cancelled, **filters)
+            except ExportCancelled:
+                return
+            except Exception as e:
+                log.error("Error exporting attendance: %s", e)
+                error = e
+            stream.finish(error)
+
+        threading.Thread(target=produce, name='attendance-export', daemon=True).start()
+        try:
+            yield from stream.chunks()
+        finally:
+            stream.cancel()
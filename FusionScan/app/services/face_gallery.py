@@ -0,0 +1,257 @@
+from collections import namedtuple
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.encoding_format import decode_many
+
+GalleryUser = namedtuple('GalleryUser', ['id', 'username', 'student_lrn'])
+GalleryMatch = namedtuple('GalleryMatch', ['user', 'distance'])
+
+class FaceGallery:
+    """
+    In-memory index of every enrolled face encoding.
+
+    All encodings live in one contiguous float32 matrix with a parallel array
+    of user ids. Rows are grouped by user so that the per-user aggregate
+    (best-of or mean over that user's captures) is a single reduceat.
+
+    With ``backend='ivf'`` the gallery first shortlists candidate users with
+    an IVFIndex and then re-ranks them exactly over all of their captures,
+    so the tolerance is always applied to exact distances. Galleries smaller
+    than ``ivf_min_size`` are scanned exhaustively either way.
+    """
+
+    AGGREGATES = ('min', 'mean')
+    BACKENDS = ('exact', 'ivf')
+
+    def __init__(self, dim=128, aggregate='min', backend='exact', ivf_nlist=None, ivf_nprobe=8, ivf_min_size=2000):
+        if aggregate not in self.AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {self.AGGREGATES}")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {self.BACKENDS}")
+        self._options = dict(dim=dim, aggregate=aggregate, backend=backend, ivf_nlist=ivf_nlist,
+                             ivf_nprobe=ivf_nprobe, ivf_min_size=ivf_min_size)
+        self.dim = dim
+        self.aggregate = aggregate
+        self.backend = backend
+        self.ivf_min_size = ivf_min_size
+        self.ivf = IVFIndex(nlist=ivf_nlist, nprobe=ivf_nprobe) if backend == 'ivf' else None
+        self.encodings = np.empty((0, dim), dtype=np.float32)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._segment_starts = np.empty(0, dtype=np.intp)
+        self._segment_counts = np.empty(0, dtype=np.float32)
+        self._segment_sizes = np.empty(0, dtype=np.intp)
+        self._row_segments = np.empty(0, dtype=np.intp)
+        self._segment_users = []
+        self._users = {}
+
+    def build(self, entries):
+        """
+        Rebuilds the index.
+
+        Args:
+            entries: Iterable of (GalleryUser, encodings) pairs, where encodings
+                is a sequence of 128-d vectors or an (n, 128) array.
+        """
+        blocks = []
+        users = []
+        counts = []
+        for user, encodings in entries:
+            block = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+            if not len(block):
+                continue
+            blocks.append(block)
+            users.append(user)
+            counts.append(len(block))
+        encodings = np.concatenate(blocks) if blocks else np.empty((0, self.dim), dtype=np.float32)
+        self.build_arrays(users, encodings, counts)
+
+    def build_from_blobs(self, rows):
+        """
+        Rebuilds the index from stored encodings in one bulk decode.
+
+        Args:
+            rows: Sequence of (GalleryUser, blob) pairs, blobs in the
+                encoding_format layout.
+        """
+        rows = [(user, blob) for user, blob in rows if blob]
+        encodings, counts = decode_many([blob for _, blob in rows], self.dim)
+        keep = counts > 0
+        self.build_arrays([user for (user, _), k in zip(rows, keep) if k], encodings, counts[keep])
+
+    def build_arrays(self, users, encodings, counts, sq_norms=None, ivf=None):
+        """
+        Rebuilds the index from a ready-made matrix.
+
+        Args:
+            users: GalleryUser per segment.
+            encodings: (n, dim) float32 matrix, each user's rows contiguous and
+                in the order of ``users``. Used as is when already contiguous.
+            counts: Number of rows of each user (all > 0).
+            sq_norms: Precomputed squared row norms, e.g. from a snapshot.
+            ivf: An IVFIndex already covering ``encodings`` (skips training).
+        """
+        self.encodings = np.ascontiguousarray(encodings, dtype=np.float32)
+        counts = np.asarray(counts, dtype=np.intp)
+        segment_users = list(users)
+        self.user_ids = np.repeat(np.asarray([u.id for u in segment_users], dtype=np.int64), counts)
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+        self._sq_norms = np.asarray(sq_norms, dtype=np.float32)
+        self._segment_starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.intp) if len(counts) else counts
+        self._segment_counts = counts.astype(np.float32)
+        self._segment_sizes = counts
+        self._row_segments = np.repeat(np.arange(len(counts), dtype=np.intp), counts)
+        self._segment_users = segment_users
+        self._users = {user.id: user for user in segment_users}
+        if ivf is not None:
+            self.ivf = ivf
+        elif self.ivf is not None:
+            self.ivf.build(self.encodings if self.use_ivf else self.encodings[:0])
+
+    def with_user(self, user, encodings):
+        """
+        Copy of the gallery with ``user``'s encodings added, or replaced if
+        the user is already enrolled (their name and LRN are updated too).
+
+        The gallery itself is not modified, so threads still matching against
+        it are unaffected; callers swap in the returned copy.
+        """
+        return self._updated(user.id, (user, np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)))
+
+    def without_user(self, user_id):
+        """Copy of the gallery without ``user_id``'s encodings (see with_user)."""
+        return self._updated(user_id, None)
+
+    def _updated(self, user_id, entry):
+        keep = self.user_ids != user_id
+        keep_segments = [i for i, user in enumerate(self._segment_users) if user.id != user_id]
+        users = [self._segment_users[i] for i in keep_segments]
+        blocks = [self.encodings[keep]]
+        counts = [self._segment_sizes[keep_segments]]
+        sq_norms = [self._sq_norms[keep]]
+        added = np.empty((0, self.dim), dtype=np.float32)
+        if entry is not None and len(entry[1]):
+            user, added = entry
+            users.append(user)
+            blocks.append(added)
+            counts.append([len(added)])
+            sq_norms.append(np.einsum('ij,ij->i', added, added))
+
+        gallery = FaceGallery(**self._options)
+        encodings = np.concatenate(blocks)
+        ivf = None
+        if (gallery.ivf is not None and len(encodings) >= self.ivf_min_size
+                and not self.ivf.needs_retrain(len(encodings))):
+            ivf = self.ivf.updated(keep, added)
+        gallery.build_arrays(users, encodings, np.concatenate(counts).astype(np.intp),
+                             sq_norms=np.concatenate(sq_norms), ivf=ivf)
+        return gallery
+
+    @property
+    def use_ivf(self):
+        return self.ivf is not None and len(self.encodings) >= self.ivf_min_size
+
+    def __len__(self):
+        return len(self.encodings)
+
+    @property
+    def user_count(self):
+        return len(self._segment_users)
+
+    def user(self, user_id):
+        """Returns the GalleryUser for a user id, or None."""
+        return self._users.get(user_id)
+
+    def distances(self, probes):
+        """
+        Euclidean distances between each probe and every gallery row.
+
+        Returns:
+            ndarray of shape (n_probes, n_encodings).
+        """
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        probe_sq = np.einsum('ij,ij->i', probes, probes)
+        sq = probe_sq[:, None] + self._sq_norms[None, :] - 2.0 * (probes @ self.encodings.T)
+        np.maximum(sq, 0.0, out=sq)
+        return np.sqrt(sq, out=sq)
+
+    def user_distances(self, probes):
+        """
+        Per-user aggregated distances.
+
+        Returns:
+            ndarray of shape (n_probes, user_count), columns ordered like the
+            gallery's user segments.
+        """
+        distances = self.distances(probes)
+        if self.aggregate == 'min':
+            return np.minimum.reduceat(distances, self._segment_starts, axis=1)
+        return np.add.reduceat(distances, self._segment_starts, axis=1) / self._segment_counts
+
+    def _segment_rows(self, segments):
+        """Gallery row indices of every capture belonging to ``segments``."""
+        sizes = self._segment_sizes[segments]
+        local_starts = np.cumsum(sizes) - sizes
+        return np.repeat(self._segment_starts[segments] - local_starts, sizes) + np.arange(sizes.sum()), local_starts
+
+    def _rerank(self, probe, segments):
+        """Exact aggregated distances from one probe to the given user segments."""
+        rows, local_starts = self._segment_rows(segments)
+        block = self.encodings[rows]
+        sq = float(probe @ probe) + self._sq_norms[rows] - 2.0 * (block @ probe)
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        if self.aggregate == 'min':
+            return np.minimum.reduceat(distances, local_starts)
+        return np.add.reduceat(distances, local_starts) / self._segment_counts[segments]
+
+    def _format(self, segments, distances, tolerance):
+        return [
+            GalleryMatch(self._segment_users[s], float(d))
+            for s, d in zip(segments, distances)
+            if tolerance is None or d <= tolerance
+        ]
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Column indices of the k smallest scores per row, closest first."""
+        k = min(k, scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), (len(scores), k))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def match(self, probes, k=1, tolerance=None, nprobe=None):
+        """
+        Matches a batch of probe encodings against the gallery.
+
+        Args:
+            probes: (n, 128) array or sequence of encodings.
+            k: Number of candidate users to return per probe.
+            tolerance: If given, candidates farther than this are dropped.
+            nprobe: Overrides the IVF cells searched per probe (ivf backend only).
+
+        Returns:
+            list: One list of GalleryMatch (closest first) per probe.
+        """
+        probes = np.asarray(probes, dtype=np.float32).reshape(-1, self.dim)
+        if not self.user_count or not len(probes):
+            return [[] for _ in range(len(probes))]
+
+        if self.use_ivf:
+            results = []
+            for probe, rows in zip(probes, self.ivf.shortlist(probes, nprobe)):
+                segments = np.unique(self._row_segments[rows])
+                if not len(segments):
+                    results.append([])
+                    continue
+                scores = self._rerank(probe, segments)
+                top, top_scores = self._top_k(scores[None, :], k)
+                results.append(self._format(segments[top[0]], top_scores[0], tolerance))
+            return results
+
+        top, top_scores = self._top_k(self.user_distances(probes), k)
+        return [self._format(segments, dists, tolerance) for segments, dists in zip(top, top_scores)]
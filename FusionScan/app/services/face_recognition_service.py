@@ -1,207 +1,417 @@
-import face_recognition
-import cv2
+import logging
 import numpy as np
-import pickle
-from app.models import User, db
-from flask import flash
+import threading
+import time
+from collections import namedtuple
+from app.models import GalleryVersion, User, db
+from app.services.face_gallery import FaceGallery, GalleryUser
+from app.services.encoding_format import decode_encodings, is_encoded, read_header, EncodingFormatError
+from app.services.gallery_snapshot import open_snapshot, write_snapshot, file_identity, SnapshotError
+from app.services.detection_strategy import DetectionStrategy, box_iou
+from app.services.metrics import FACE_DETECTION_SECONDS, FACE_ENCODING_SECONDS, FACE_MATCHING_SECONDS, FACES
+from app.utils.lazy_import import lazy_import
+
+# Imported on first use: face_recognition loads dlib's models at import time
+face_recognition = lazy_import('face_recognition')
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+# box is (top, right, bottom, left) in full-frame coordinates
+FaceResult = namedtuple('FaceResult', ['box', 'user', 'distance'])
 
 class FaceRecognitionService:
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_lrns = []
+    DETECTION_SCALE = 0.25
+
+    def __init__(self, tolerance=0.5, aggregate='min', backend='exact', ivf_nlist=None, ivf_nprobe=8,
+                 snapshot_path=None, snapshot_check_interval=1.0, executor=None, strategy=None):
+        """
+        Args:
+            snapshot_path: If set, the gallery is served from this memory-mapped
+                snapshot file (see gallery_snapshot), shared by every worker
+                process, and rebuilt whenever enrolments change.
+            snapshot_check_interval: Seconds between checks for a snapshot
+                published by another process.
+            executor: Optional RecognitionExecutor; detection and encoding of
+                whole frames then run in its worker processes.
+            strategy: Default DetectionStrategy, for callers that don't pass
+                their camera's (a fixed DETECTION_SCALE downscale if omitted).
+        """
+        self.tolerance = tolerance
+        self._gallery_options = dict(aggregate=aggregate, backend=backend, ivf_nlist=ivf_nlist, ivf_nprobe=ivf_nprobe)
+        self.gallery = FaceGallery(**self._gallery_options)
+        self.snapshot_path = snapshot_path
+        self.snapshot_check_interval = snapshot_check_interval
+        self.snapshot_version = None
+        self._snapshot_identity = None
+        self._next_snapshot_check = 0.0
+        self._snapshot_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loaded = False
+        self.executor = executor
+        self.strategy = strategy or DetectionStrategy(scale=self.DETECTION_SCALE)
+
+    def ensure_loaded(self):
+        """Loads known faces unless that already happened (safe to call from any thread)."""
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load_known_faces()
+
+    def warm_up(self):
+        """
+        Imports face_recognition and cv2 and runs one detection and encoding on
+        a blank image, so the first camera frame doesn't pay for loading
+        dlib's models.
+        """
+        blank = np.zeros((64, 64, 3), dtype=np.uint8)
+        cv2.cvtColor(blank, cv2.COLOR_BGR2RGB)
+        face_recognition.face_locations(blank)
+        face_recognition.face_encodings(blank, [(8, 56, 56, 8)])
 
     def load_known_faces(self):
-        """Loads known faces from the database."""
-        print("Loading known faces from the database...")
-        users = User.query.all()
-        print(f"Found {len(users)} users in the database.")
-        for user in users:
-            if user.face_encodings:
-                try:
-                    encodings = pickle.loads(user.face_encodings)
-                    print(f"Loaded {len(encodings)} encodings for user {user.username}")
-                    self.known_face_encodings.extend(encodings)
-                    self.known_face_names.extend([user.username] * len(encodings))
-                    self.known_face_lrns.extend([user.student_lrn] * len(encodings))
-                except Exception as e:
-                    print(f"Error loading encodings for user {user.username}: {e}")
-            else:
-                print(f"No face encodings found for user {user.username}")
-        print("Known faces loaded.")
+        """
+        Loads known faces, from the gallery snapshot when it is current.
 
-    def preprocess_image(self, image):
+        Without a usable snapshot the gallery is loaded from the database
+        (and, if snapshots are enabled, a new snapshot is published).
         """
-        Preprocesses the image for better recognition accuracy.
+        if self.snapshot_path:
+            fingerprint = self._database_fingerprint()
+            try:
+                snapshot = open_snapshot(self.snapshot_path)
+                if snapshot.fingerprint == fingerprint:
+                    self._use_snapshot(snapshot)
+                    self.loaded = True
+                    log.info("Known faces mapped from snapshot: %d encodings for %d users.",
+                             len(self.gallery), self.gallery.user_count)
+                    return
+                log.info("Gallery snapshot is out of date, rebuilding it from the database.")
+            except FileNotFoundError:
+                pass
+            except SnapshotError as e:
+                log.warning("Ignoring gallery snapshot: %s", e)
+        self.reload_known_faces()
+
+    def reload_known_faces(self):
+        """Rebuilds the gallery from the database and publishes a new snapshot if enabled."""
+        # Read before the rows, so a change made while loading leaves the snapshot out of date
+        fingerprint = self._database_fingerprint()
+        gallery = self._load_from_database()
+        if self.snapshot_path:
+            self.publish_snapshot(gallery, fingerprint)
+        else:
+            self.gallery = gallery
+        self.loaded = True
+
+    def _load_from_database(self):
         """
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        return gray
+        Builds a new gallery from the database.
 
-    def capture_and_store_face_encodings(self, user_id, num_encodings=5):
+        Reads only the columns the gallery needs and decodes every user's
+        encodings in one bulk operation.
         """
-        Captures multiple face encodings from a live video feed and stores them in the database.
-        Guides the user to center their face.
+        log.info("Loading known faces from the database...")
+        rows = (db.session.query(User.id, User.username, User.student_lrn, User.face_encodings)
+                .filter(User.face_encodings.isnot(None))
+                .order_by(User.id)
+                .all())
+        entries = []
+        for user_id, username, student_lrn, blob in rows:
+            if not is_encoded(blob):
+                log.warning("Skipping face encodings of user %s: stored in the old pickle format, "
+                            "run 'flask db upgrade' to convert them.", username)
+                continue
+            try:
+                read_header(blob)
+            except EncodingFormatError as e:
+                log.error("Error loading encodings for user %s: %s", username, e)
+                continue
+            entries.append((GalleryUser(user_id, username, student_lrn), blob))
+        gallery = FaceGallery(**self._gallery_options)
+        gallery.build_from_blobs(entries)
+        log.info("Known faces loaded: %d encodings for %d users.", len(gallery), gallery.user_count)
+        return gallery
+
+    def update_user(self, user_id):
         """
-        user = User.query.get(user_id)
-        if not user:
-            print("User not found.")
-            return
-
-        video_capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)  # Use DirectShow backend
+        Brings one user's gallery entry in line with the database.
 
-        # Check if the camera opened successfully
-        if not video_capture.isOpened():
-            print("Error: Could not open camera.")
-            return
+        Adds the user if they now have encodings, replaces their encodings
+        (and name/LRN) if they were already enrolled, and removes them if they
+        were deleted or have no encodings. The new gallery is swapped in as a
+        copy, so matching never sees a half-applied update, and is published
+        as a snapshot under a new GalleryVersion so other worker processes
+        pick it up. Code that changes a user's name, LRN or encodings (or
+        deletes them) must call this after committing.
 
-        captured_encodings = []
-
-        while len(captured_encodings) < num_encodings:
-            ret, frame = video_capture.read()
-            if not ret:
-                print("Error capturing frame.")
-                break
-
-            print("Original frame shape:", frame.shape)
-
-            # Detect faces using a pre-trained CNN model
-            face_locations = face_recognition.face_locations(frame, model="cnn")
-            print(f"Face Locations (original): {face_locations}")
-
-            if len(face_locations) == 1:
-                top, right, bottom, left = face_locations[0]
-                frame_height, frame_width, _ = frame.shape
-                center_x = frame_width // 2
-                center_y = frame_height // 2
-                margin_x = frame_width // 8
-                margin_y = frame_height // 8
-
-                print(f"Center X,Y: ({center_x},{center_y}), Left: {left}, Top: {top}, Right: {right}, Bottom: {bottom}")
-                print(f"Margins: X={margin_x}, Y={margin_y}")
-
-                # Check if the face is within the center region
-                if (center_x - margin_x < left < center_x + margin_x and
-                        center_x - margin_x < right < center_x + margin_x and
-                        center_y - margin_y < top < center_y + margin_y and
-                        center_y - margin_y < bottom < center_y + margin_y):
-
-                    # Preprocess the face region
-                    face_image = frame[top:bottom, left:right]
-                    preprocessed_face = self.preprocess_image(face_image)
-
-                    # Encode the face directly from the preprocessed image
-                    face_encoding = face_recognition.face_encodings(preprocessed_face)
-
-                    if len(face_encoding) > 0:
-                        # Increase num_jitters for more robust encoding
-                        face_encoding = face_recognition.face_encodings(preprocessed_face, num_jitters=3)
-                        captured_encodings.append(face_encoding[0])
-                        print(f"Captured encoding {len(captured_encodings)}/{num_encodings}")
-
-                        # Indicate successful capture
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                        cv2.putText(frame, "Face Centered!", (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                        cv2.putText(frame, f"Capturing {len(captured_encodings)}/{num_encodings}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 0), 2)
-                    else:
-                        print("Could not capture encoding from preprocessed image")
-                        cv2.putText(frame, "Face Not Detected After Preprocessing!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-                else:
-                    # Indicate face not centered
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                    cv2.putText(frame, "Center your face", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-
-            elif len(face_locations) > 1:
-                cv2.putText(frame, "Multiple faces detected!", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        Returns:
+            bool: True if the gallery changed.
+        """
+        # Never publish a partial gallery built on top of one that was never loaded
+        self.ensure_loaded()
+        row = (db.session.query(User.id, User.username, User.student_lrn, User.face_encodings)
+               .filter(User.id == user_id)
+               .first())
+        encodings = None
+        if row is not None and row.face_encodings:
+            try:
+                encodings = decode_encodings(row.face_encodings)
+            except EncodingFormatError as e:
+                log.error("Error loading encodings for user %s: %s", row.username, e)
+
+        with self._update_lock:
+            # Start from the newest published gallery, not a stale local one
+            self.refresh_snapshot(force=True)
+            gallery = self.gallery
+            if encodings is not None and len(encodings):
+                updated = gallery.with_user(GalleryUser(row.id, row.username, row.student_lrn), encodings)
+            elif gallery.user(user_id) is not None:
+                updated = gallery.without_user(user_id)
             else:
-                cv2.putText(frame, "No face detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
-
-            if cv2.waitKey(1) & 0xFF == ord("q"):
-                break
+                return False
+            if self.snapshot_path:
+                fingerprint = self._fingerprint(GalleryVersion.bump())
+                db.session.commit()
+                self.publish_snapshot(updated, fingerprint)
+            else:
+                self.gallery = updated
+        log.info("Gallery updated for user %s: %d encodings for %d users.",
+                 user_id, len(self.gallery), self.gallery.user_count)
+        return True
+
+    @staticmethod
+    def _fingerprint(version):
+        return f'gallery-v{version}'
+
+    def _database_fingerprint(self):
+        """The gallery version the snapshot must have been built from (see GalleryVersion)."""
+        return self._fingerprint(GalleryVersion.current())
+
+    def publish_snapshot(self, gallery, fingerprint=None):
+        """Writes ``gallery`` to the snapshot file (atomically) and switches to the mapped copy."""
+        with self._snapshot_lock:
+            write_snapshot(self.snapshot_path, gallery._segment_users, gallery.encodings,
+                           gallery._segment_sizes, sq_norms=gallery._sq_norms,
+                           fingerprint=fingerprint or self._database_fingerprint())
+            self._use_snapshot(open_snapshot(self.snapshot_path))
+
+    def _use_snapshot(self, snapshot):
+        gallery = FaceGallery(**self._gallery_options)
+        gallery.build_arrays(snapshot.users, snapshot.encodings, snapshot.counts, sq_norms=snapshot.sq_norms)
+        # Matching threads keep using the gallery they already hold; new calls see this one
+        self.gallery = gallery
+        self.snapshot_version = snapshot.version
+        self._snapshot_identity = snapshot.identity
+
+    def refresh_snapshot(self, force=False):
+        """
+        Remaps the snapshot if another process has published a new one.
 
-        video_capture.release()
-        cv2.destroyAllWindows()
+        Costs one os.stat per ``snapshot_check_interval``.
 
-        if captured_encodings:
+        Returns:
+            bool: True if a new snapshot was mapped.
+        """
+        if not self.snapshot_path:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_snapshot_check:
+            return False
+        self._next_snapshot_check = now + self.snapshot_check_interval
+        identity = file_identity(self.snapshot_path)
+        if identity is None or identity == self._snapshot_identity:
+            return False
+        with self._snapshot_lock:
             try:
-                user.face_encodings = pickle.dumps(captured_encodings)
-                db.session.commit()
-                print(f"Successfully captured and stored {len(captured_encodings)} face encodings for {user.username}.")
-                flash(f"Successfully captured and stored {len(captured_encodings)} face encodings for {user.username}.", "success")
-            except Exception as e:
-                db.session.rollback()
-                print(f"Error storing face encodings for {user.username}: {e}")
-                flash(f"Error storing face encodings for {user.username}: {e}", "danger")
+                snapshot = open_snapshot(self.snapshot_path)
+            except (FileNotFoundError, SnapshotError) as e:
+                log.warning("Could not map new gallery snapshot: %s", e)
+                return False
+            if snapshot.version == self.snapshot_version:
+                self._snapshot_identity = snapshot.identity
+                return False
+            self._use_snapshot(snapshot)
+        log.info("Mapped gallery snapshot %s: %d encodings.", snapshot.version, len(self.gallery))
+        return True
 
     def facial_recognition_process(self, frame):
         """
-        Performs facial recognition on a single frame.
+        Performs facial recognition on every face in a single frame.
+
+        All detected faces are encoded in one call and matched against the
+        gallery in one batched operation. With an executor, detection and
+        encoding run in one of its worker processes.
 
         Args:
             frame: The video frame (OpenCV image).
 
         Returns:
             frame: The processed frame with bounding boxes and names.
-            name: The name of the recognized person or "Unknown".
-            lrn: The LRN of the recognized person or None
-        """
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-
-        face_locations = face_recognition.face_locations(rgb_small_frame)
-        face_encodings = face_recognition.face_encodings(
-        rgb_small_frame, face_locations
-    )
-
-        name = "Unknown"
-        lrn = None
-
-        if face_encodings:
-            if not self.known_face_encodings:
-                print("No known faces loaded. Please add users and capture their face encodings.")
-
-            # Draw bounding box for each detected face
-            for (top, right, bottom, left) in face_locations:
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)  # Red box for unknown faces
+            results: A list of FaceResult, one per detected face. ``user`` is
+                the matched GalleryUser or None for unknown faces.
+        """
+        results = self.recognize_frame(frame)
+        self.draw_results(frame, results)
+        return frame, results
 
-                return frame, name, lrn  # Return early with bounding box for unknown faces
-
-        matches = face_recognition.compare_faces(
-            self.known_face_encodings, face_encodings[0], tolerance=0.5
-        )
-
-        face_distances = face_recognition.face_distance(
-            self.known_face_encodings, face_encodings[0]
-        )
-
-        if face_distances.size > 0:
-            best_match_index = np.argmin(face_distances)
-
-            if matches[best_match_index]:
-                name = self.known_face_names[best_match_index]
-                lrn = self.known_face_lrns[best_match_index]
-
-                # Draw a rectangle around the face and label for known faces (Green)
-                top, right, bottom, left = face_locations[0]
-                top *= 4
-                right *= 4
-                bottom *= 4
-                left *= 4
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.rectangle(
-                    frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED
-                )
-                font = cv2.FONT_HERSHEY_DUPLEX
-                cv2.putText(
-                    frame, name, (left + 6, bottom - 6), font, 1.0, (255, 255, 255), 1
-                )
-            else:
-                    print("No matching faces found in the database.")
+    def recognize_frame(self, frame, strategy=None):
+        """
+        Like facial_recognition_process, but only returns the FaceResult list.
+
+        Args:
+            strategy: The camera's DetectionStrategy (default: the service's own).
+        """
+        strategy = strategy or self.strategy
+        if self.executor is not None:
+            boxes, face_encodings = self.executor.submit(frame, strategy.fixed(strategy.next_scale())).result()
+            strategy.observe(boxes)
         else:
-                print("No faces detected in the frame.")
+            boxes, face_encodings = self.detect_and_encode(frame, strategy)
+        if not boxes:
+            log.debug("No faces detected in the frame.")
+            return []
+        return self.match_faces(boxes, face_encodings)
+
+    def recognize_frames(self, frames, strategy=None):
+        """
+        Recognizes a sequence of frames, through the executor's workers when there is one.
+
+        Yields:
+            list: The FaceResult list of every frame, in order.
+        """
+        strategy = strategy or self.strategy
+        if self.executor is None:
+            for frame in frames:
+                yield self.recognize_frame(frame, strategy)
+            return
+        # The auto scale can only follow one frame behind here, since frames are in flight together
+        work = ((frame, strategy.fixed(strategy.next_scale())) for frame in frames)
+        for boxes, face_encodings in self.executor.map(work):
+            strategy.observe(boxes)
+            yield self.match_faces(boxes, face_encodings) if boxes else []
+
+    def detect_and_encode(self, frame, strategy=None):
+        """
+        Detects and encodes the faces in a BGR camera frame, without matching.
+
+        Returns:
+            tuple: (boxes, face_encodings), boxes in full-frame coordinates.
+        """
+        strategy = strategy or self.strategy
+        prepared = strategy.prepare(frame)
+        face_locations = self.detect_faces(prepared.image)
+        boxes, face_encodings = self.encode_prepared(prepared, face_locations, strategy) if face_locations else ([], [])
+        strategy.observe(boxes)
+        return boxes, face_encodings
+
+    def prepare_frame(self, frame, strategy=None):
+        """Crops, downscales and converts a BGR camera frame for detection; returns a PreparedFrame."""
+        return (strategy or self.strategy).prepare(frame)
+
+    def detect_faces(self, rgb_image, upsample=1):
+        """Returns face locations (top, right, bottom, left) in the image's coordinates."""
+        with FACE_DETECTION_SECONDS.time():
+            return face_recognition.face_locations(rgb_image, number_of_times_to_upsample=upsample)
+
+    def to_frame_box(self, location, prepared):
+        """Maps a box on the prepared detection image back to the full frame."""
+        return DetectionStrategy.to_frame_box(prepared, location)
+
+    def encode_faces(self, rgb_image, face_locations):
+        """Computes the 128-d encoding of every face location in one call."""
+        with FACE_ENCODING_SECONDS.time():
+            return face_recognition.face_encodings(rgb_image, face_locations)
+
+    def encode_prepared(self, prepared, face_locations, strategy=None):
+        """
+        Encodes faces found on a prepared frame.
+
+        Without refinement all faces are encoded from the detection image in
+        one call. With it, each face is re-detected on a full-resolution crop
+        around it (keeping the coarse box if that fails) and encoded from the
+        crop.
 
-        return frame, name, lrn
\ No newline at end of file
+        Returns:
+            tuple: (boxes in full-frame coordinates, face_encodings)
+        """
+        strategy = strategy or self.strategy
+        boxes = [self.to_frame_box(location, prepared) for location in face_locations]
+        if not strategy.refine:
+            return boxes, self.encode_faces(prepared.image, face_locations)
+        refined, face_encodings = [], []
+        for box in boxes:
+            x0, y0, x1, y1 = strategy.refine_region(prepared.frame, box)
+            crop = cv2.cvtColor(prepared.frame[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+            top, right, bottom, left = box
+            location = (top - y0, right - x0, bottom - y0, left - x0)
+            factor = min(1.0, strategy.refine_face / max(bottom - top, 1))
+            small = cv2.resize(crop, (0, 0), fx=factor, fy=factor) if factor < 1.0 else crop
+            candidates = self.detect_faces(small, upsample=0 if factor < 1.0 else 1)
+            if candidates:
+                fine = max(candidates, key=lambda candidate: box_iou(candidate, tuple(v * factor for v in location)))
+                location = tuple(int(round(v / factor)) for v in fine)
+            refined.append((location[0] + y0, location[1] + x0, location[2] + y0, location[3] + x0))
+            face_encodings.extend(self.encode_faces(crop, [location]))
+        return refined, face_encodings
+
+    def recognize_faces(self, prepared, face_locations, strategy=None):
+        """
+        Encodes the given faces of a prepared frame and matches them against the gallery.
+
+        Returns:
+            list: A FaceResult per location, with boxes in full-frame coordinates.
+        """
+        if not face_locations:
+            return []
+        return self.match_faces(*self.encode_prepared(prepared, face_locations, strategy))
+
+    def match_faces(self, boxes, face_encodings):
+        """
+        Matches already computed encodings against the gallery.
+
+        Args:
+            boxes: Full-frame (top, right, bottom, left) box of every encoding.
+
+        Returns:
+            list: A FaceResult per box.
+        """
+        self.ensure_loaded()
+        self.refresh_snapshot()
+        gallery = self.gallery
+        if not len(gallery):
+            log.debug("No known faces loaded. Please add users and capture their face encodings.")
+
+        with FACE_MATCHING_SECONDS.time():
+            matches = gallery.match(face_encodings, k=1, tolerance=self.tolerance)
+
+        results = []
+        for box, candidates in zip(boxes, matches):
+            if candidates:
+                results.append(FaceResult(box, candidates[0].user, candidates[0].distance))
+            else:
+                results.append(FaceResult(box, None, None))
+        recognized = sum(1 for result in results if result.user is not None)
+        if recognized:
+            FACES.labels('recognized').inc(recognized)
+        if len(results) > recognized:
+            FACES.labels('unknown').inc(len(results) - recognized)
+        return results
+
+    def draw_results(self, frame, results):
+        """Draws a labelled green box for known faces and a red box for unknown ones."""
+        for (top, right, bottom, left), user, _ in results:
+            if user is None:
+                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)  # Red box for unknown faces
+                continue
+
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            cv2.rectangle(
+                frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED
+            )
+            font = cv2.FONT_HERSHEY_DUPLEX
+            cv2.putText(
+                frame, user.username, (left + 6, bottom - 6), font, 1.0, (255, 255, 255), 1
+            )
+        return frame
@@ -0,0 +1,216 @@
+from collections import Counter, deque
+import itertools
+import logging
+from app.services.detection_strategy import box_iou
+from app.services.face_recognition_service import FaceResult
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+OPENCV_TRACKERS = {
+    'kcf': 'TrackerKCF_create',
+    'mil': 'TrackerMIL_create',
+    'csrt': 'TrackerCSRT_create',
+}
+
+def _opencv_tracker_factory(name):
+    """Finds an OpenCV single-object tracker constructor, or None."""
+    constructor = OPENCV_TRACKERS.get(name)
+    if constructor is None:
+        return None
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        if module is not None and hasattr(module, constructor):
+            return getattr(module, constructor)
+    return None
+
+class Track:
+    """A face followed across frames, with its recent identity votes."""
+
+    def __init__(self, track_id, box, vote_window):
+        self.id = track_id
+        self.box = box
+        self.votes = deque(maxlen=vote_window)
+        self.distances = {}
+        self.user = None
+        self.distance = None
+        self.misses = 0
+        self.unverified = 0  # full detections since the confirmed identity was last re-matched
+        self.box_tracker = None
+        self.geometry = None  # (scale, offset) of the image the box tracker follows
+
+    def vote(self, user, distance, min_votes):
+        """Adds one recognition result and re-evaluates the confirmed identity."""
+        self.votes.append(user.id if user is not None else None)
+        if user is not None:
+            self.distances[user.id] = (user, distance)
+
+        counts = Counter(vote for vote in self.votes if vote is not None)
+        if counts:
+            user_id, count = counts.most_common(1)[0]
+            if count >= min_votes:
+                self.user, self.distance = self.distances[user_id]
+                return
+        self.user = None
+        self.distance = None
+
+    def reset(self):
+        """Forgets the identity and its votes, e.g. when someone else may have taken over the box."""
+        self.votes.clear()
+        self.distances = {}
+        self.user = None
+        self.distance = None
+        self.unverified = 0
+
+class FaceTracker:
+    """
+    Detection-skip tracking stage in front of FaceRecognitionService.
+
+    Full detection runs only every ``detect_every`` frames, or as soon as an
+    OpenCV box tracker loses its face. In between, tracks are carried forward
+    (held in place for ``box_tracker='iou'``, or followed by a cheap OpenCV
+    tracker such as 'kcf', 'mil' or 'csrt'). Detections are associated to
+    tracks by IoU, unconfirmed tracks are re-encoded, and an identity is
+    accepted once it wins ``min_votes`` of the last ``vote_window`` matches.
+    A confirmed track is re-matched every ``verify_every`` full detections:
+    since association is by position only, the next person stepping into the
+    spot someone just left would otherwise inherit their box and name. If the
+    new match disagrees, or the track misses a detection, its identity and
+    votes are cleared and it has to be confirmed again.
+    While a new track is still collecting its votes, detection runs on every
+    frame so that confirmation is not delayed by the skip interval. Frames are
+    prepared with the camera's DetectionStrategy (``strategy``); when its
+    scale changes, box trackers are re-initialised by a full detection.
+    """
+
+    def __init__(self, recognizer, detect_every=5, vote_window=5, min_votes=3,
+                 iou_threshold=0.3, max_misses=1, box_tracker='iou', strategy=None, verify_every=1):
+        self.recognizer = recognizer
+        self.strategy = strategy or recognizer.strategy
+        self.detect_every = max(1, detect_every)
+        self.vote_window = vote_window
+        self.min_votes = min(min_votes, vote_window)
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.verify_every = max(1, verify_every)
+        self.tracker_factory = None
+        if box_tracker != 'iou':
+            self.tracker_factory = _opencv_tracker_factory(box_tracker)
+            if self.tracker_factory is None:
+                log.warning("OpenCV tracker '%s' is not available, falling back to IoU tracking.", box_tracker)
+        self.tracks = []
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+        self.stats = {'frames': 0, 'detections': 0, 'encodings': 0}
+
+    def _follow(self, prepared):
+        """Advances every track with its box tracker; returns False if one was lost."""
+        if self.tracker_factory is None:
+            return True
+        all_found = True
+        for track in self.tracks:
+            if track.box_tracker is None or track.geometry != (prepared.scale, prepared.offset):
+                all_found = False
+                continue
+            found, (x, y, w, h) = track.box_tracker.update(prepared.image)
+            if not found:
+                all_found = False
+                continue
+            track.box = self.recognizer.to_frame_box((int(y), int(x + w), int(y + h), int(x)), prepared)
+        return all_found
+
+    def _associate(self, boxes):
+        """Greedy IoU assignment of detected boxes to existing tracks."""
+        pairs = sorted(
+            ((box_iou(track.box, box), t, d) for t, track in enumerate(self.tracks) for d, box in enumerate(boxes)),
+            reverse=True,
+        )
+        assigned = {}
+        used_tracks = set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or d in assigned:
+                continue
+            assigned[d] = self.tracks[t]
+            used_tracks.add(t)
+        return assigned
+
+    def _detect(self, prepared):
+        self.stats['detections'] += 1
+        locations = self.recognizer.detect_faces(prepared.image)
+        boxes = [self.recognizer.to_frame_box(location, prepared) for location in locations]
+        self.strategy.observe(boxes)
+        assigned = self._associate(boxes)
+
+        seen = set()
+        to_encode = []
+        for d, (location, box) in enumerate(zip(locations, boxes)):
+            track = assigned.get(d)
+            if track is None:
+                track = Track(next(self._ids), box, self.vote_window)
+                self.tracks.append(track)
+            track.box = box
+            track.misses = 0
+            seen.add(track.id)
+            if self.tracker_factory is not None:
+                top, right, bottom, left = location
+                track.box_tracker = self.tracker_factory()
+                track.box_tracker.init(prepared.image, (left, top, right - left, bottom - top))
+                track.geometry = (prepared.scale, prepared.offset)
+            if track.user is None:
+                to_encode.append((track, location))
+            else:
+                track.unverified += 1
+                if track.unverified >= self.verify_every:
+                    to_encode.append((track, location))
+
+        for track in self.tracks:
+            if track.id not in seen:
+                track.misses += 1
+                track.reset()  # whoever shows up in this box next is not necessarily the same person
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        if to_encode:
+            self.stats['encodings'] += len(to_encode)
+            results = self.recognizer.recognize_faces(prepared, [location for _, location in to_encode], self.strategy)
+            for (track, _), result in zip(to_encode, results):
+                if track.user is not None:
+                    track.unverified = 0
+                    if result.user is None or result.user.id != track.user.id:
+                        track.reset()
+                track.vote(result.user, result.distance, self.min_votes)
+
+    def track(self, frame):
+        """
+        Tracks and recognizes faces in one camera frame.
+
+        Returns:
+            list: A FaceResult per live track; ``user`` is set only once the
+                track's identity has been confirmed by the vote window.
+        """
+        self.stats['frames'] += 1
+        prepared = self.recognizer.prepare_frame(frame, self.strategy)
+        followed = self._follow(prepared)
+        voting = any(track.user is None and len(track.votes) < self.vote_window for track in self.tracks)
+        if self.frame_index % self.detect_every == 0 or not followed or voting:
+            self._detect(prepared)
+        self.frame_index += 1
+
+        return [
+            FaceResult(track.box, track.user, track.distance)
+            for track in self.tracks if track.misses == 0
+        ]
+
+    def process(self, frame):
+        """
+        Like track, but also draws the results.
+
+        Returns:
+            frame: The frame with bounding boxes and names drawn.
+            results: The FaceResult list from track.
+        """
+        results = self.track(frame)
+        self.recognizer.draw_results(frame, results)
+        return frame, results
@@ -0,0 +1,105 @@
+import itertools
+import random
+import threading
+import time
+import serial
+
+class FakeArduinoSerial:
+    """
+    Stand-in for the MLX90614 Arduino on a serial port, for tests and benchmarks.
+
+    Speaks the same protocol as the sketch: every b'T' written is answered
+    with one temperature line. Readings come from ``script`` (any iterable of
+    floats, or None for a failed read, sent as 'nan') or, when the script is exhausted or
+    not given, from a normal distribution around ``base``.
+
+    Args:
+        script: Optional iterable of readings to emit in order.
+        loop: Start the script over when it runs out, instead of falling
+            back to generated readings.
+        base, jitter: Mean and standard deviation of generated readings.
+        latency: Seconds each readline takes, like the sensor read on the board.
+        fail_after: Raise SerialException after this many readings, to exercise
+            reconnects.
+    """
+
+    def __init__(self, port='fake', baudrate=9600, timeout=2, script=None, base=36.5, jitter=0.2,
+                 latency=0.0, fail_after=None, seed=None, loop=False, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.latency = latency
+        self.fail_after = fail_after
+        self.base = base
+        self.jitter = jitter
+        self.is_open = True
+        self.requests = 0
+        if script is None:
+            self._script = iter(())
+        else:
+            self._script = itertools.cycle(list(script)) if loop else iter(script)
+        self._random = random.Random(seed)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        if not self.is_open:
+            raise serial.SerialException("Port is closed")
+        with self._lock:
+            self._pending += data.count(b'T')
+        return len(data)
+
+    def _next_reading(self):
+        reading = next(self._script, StopIteration)
+        if reading is StopIteration:
+            return round(self._random.gauss(self.base, self.jitter), 2)
+        return reading
+
+    def readline(self):
+        if not self.is_open:
+            raise serial.SerialException("Port is closed")
+        if self.fail_after is not None and self.requests >= self.fail_after:
+            self.is_open = False
+            raise serial.SerialException("Device disconnected")
+        with self._lock:
+            if not self._pending:
+                return b''
+            self._pending -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        self.requests += 1
+        reading = self._next_reading()
+        if reading is None:
+            return b'nan\r\n'
+        return f"{reading:.2f}\r\n".encode('utf-8')
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._pending = 0
+
+    def close(self):
+        self.is_open = False
+
+def load_script(path):
+    """
+    Reads a FakeArduinoSerial script: one reading per line, 'nan' for a
+    failed read; blank lines and lines starting with '#' are skipped.
+    """
+    readings = []
+    with open(path, encoding='utf-8') as script:
+        for line in script:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            readings.append(None if line.lower() == 'nan' else float(line))
+    return readings
+
+def fake_serial_factory(**defaults):
+    """Returns a serial factory that builds FakeArduinoSerial devices with ``defaults``."""
+    counter = itertools.count()
+
+    def factory(port, baudrate=9600, timeout=2, **kwargs):
+        options = dict(defaults, **kwargs)
+        options.setdefault('seed', next(counter))
+        return FakeArduinoSerial(port, baudrate, timeout, **options)
+    return factory
@@ -0,0 +1,351 @@
+from collections import deque, namedtuple
+import logging
+import threading
+import time
+from app.services.metrics import CAMERA_READ_SECONDS
+from app.services.stream_output import OutputProfile, StreamOutput
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+Frame = namedtuple('Frame', ['seq', 'timestamp', 'image'])
+
+class DropOldestQueue:
+    """Bounded queue whose put never blocks: when full, the oldest item is dropped."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Returns the oldest item, or None if nothing arrived within timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items, timeout):
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+class StageStats:
+    """Processing count and latency for one pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self.last_age = 0.0
+
+    def record(self, seconds, age=0.0):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            self.max = max(self.max, seconds)
+            self.last_age = age
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': self.total * 1000.0 / self.count if self.count else 0.0,
+                'last_ms': self.last * 1000.0,
+                'max_ms': self.max * 1000.0,
+                'frame_age_ms': self.last_age * 1000.0,
+            }
+
+class FramePipeline:
+    """
+    Threaded capture -> recognition -> encode pipeline for one camera.
+
+    The capture thread pushes every frame into two bounded drop-oldest queues:
+    one feeding a pool of recognition workers and one feeding the encoder.
+    The encoder draws the most recent recognition results onto each frame and
+    publishes it as JPEG, so the live preview keeps the camera's frame rate
+    even when recognition falls behind. Output goes through a StreamOutput:
+    one encoding per watched profile (quality and size), none while nobody
+    watches, and none for frames that haven't visibly changed. Viewers
+    register a listener for a profile, or iterate stream(); neither drives
+    any work beyond encoding that profile.
+
+    With a RecognitionScheduler, the pipeline starts no recognition workers
+    of its own: its recognition queue is registered with the scheduler,
+    whose threads are shared with the other cameras.
+
+    Callbacks (all run inside an app context on pipeline threads):
+        recognize(image) -> results
+        on_results(frame, results), called after each recognized frame
+        annotate(image, results), draws the overlay before encoding
+        on_stop(), called once after the pipeline threads have stopped
+    """
+
+    def __init__(self, app, source, recognize, on_results=None, annotate=None, on_stop=None,
+                 workers=1, queue_size=2, profiles=None, change_threshold=4.0, scheduler=None, name=None,
+                 weight=1.0, max_in_flight=None, open_capture=None):
+        """
+        Args:
+            open_capture: callable(source) returning a cv2.VideoCapture-like
+                camera (default cv2.VideoCapture); see video_file_source.
+            profiles: OutputProfiles viewers can pick from; the first is the default.
+            change_threshold: See StreamOutput; negative encodes every frame.
+            workers: Recognition threads, when there is no scheduler.
+            scheduler: Optional shared RecognitionScheduler.
+            name: Camera id the pipeline is registered and reported under.
+            weight: The camera's share of the scheduler's workers.
+            max_in_flight: Frames of this camera recognized at once (None = no limit).
+        """
+        self.app = app
+        self.source = source
+        self.name = name if name is not None else str(source)
+        self.recognize = recognize
+        self.on_results = on_results
+        self.annotate = annotate
+        self.on_stop = on_stop
+        self.workers = max(1, workers)
+        self.scheduler = scheduler
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.open_capture = open_capture
+        self._scheduled = None
+        self.output = StreamOutput(profiles or [OutputProfile('default', 80, 1.0)], change_threshold)
+        self.recognition_queue = DropOldestQueue(queue_size)
+        self.encode_queue = DropOldestQueue(queue_size)
+        self._read_seconds = CAMERA_READ_SECONDS.labels(self.name)
+        self.stage_stats = {
+            'capture': StageStats(),
+            'recognition': StageStats(),
+            'encode': StageStats(),
+        }
+        self.error = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._results_lock = threading.Lock()
+        self._results = []
+        self._results_seq = -1
+        self._frame_cond = threading.Condition()
+        self._listeners = {name: [] for name in self.output.profiles}
+        self._frame_listeners = []
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        self._stop.clear()
+        targets = [('capture', self._capture_loop), ('encode', self._encode_loop)]
+        if self.scheduler is not None:
+            self._scheduled = self.scheduler.register(
+                self.name, self.recognition_queue, self._recognize, self.weight, self.max_in_flight)
+        else:
+            targets += [(f'recognition-{i}', self._recognition_loop) for i in range(self.workers)]
+        self._threads = [
+            threading.Thread(target=self._run, args=(target,), name=f'pipeline-{self.name}-{name}', daemon=True)
+            for name, target in targets
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        if self._scheduled is not None:
+            self.scheduler.unregister(self._scheduled, timeout)
+        if self.on_stop is not None:
+            on_stop, self.on_stop = self.on_stop, None
+            with self.app.app_context():
+                on_stop()
+
+    def _run(self, target):
+        with self.app.app_context():
+            try:
+                target()
+            except Exception as e:
+                self._fail(e)
+
+    def _fail(self, error):
+        self.error = error
+        log.error("Pipeline %s stage %s failed: %s", self.name, threading.current_thread().name, error)
+        self._stop.set()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def _capture_loop(self):
+        camera = (self.open_capture or cv2.VideoCapture)(self.source)
+        try:
+            seq = 0
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                success, image = camera.read()
+                self._read_seconds.observe(time.perf_counter() - start)
+                if not success:
+                    log.warning("Error reading from camera %s.", self.source)
+                    self.error = RuntimeError(f"Could not read from camera {self.source}")
+                    self._stop.set()
+                    break
+                frame = Frame(seq, time.time(), image)
+                self.stage_stats['capture'].record(time.perf_counter() - start)
+                if self._scheduled is not None:
+                    self.scheduler.submit(self._scheduled, frame)
+                else:
+                    self.recognition_queue.put(frame)
+                self.encode_queue.put(frame)
+                for listener in list(self._frame_listeners):
+                    listener(frame)
+                seq += 1
+        finally:
+            camera.release()
+            with self._frame_cond:
+                self._frame_cond.notify_all()
+
+    def _recognition_loop(self):
+        while not self._stop.is_set():
+            frame = self.recognition_queue.get(timeout=0.5)
+            if frame is not None:
+                self._recognize_frame(frame)
+
+    def _recognize(self, frame):
+        """Scheduler entry point: a failure stops this camera's pipeline, not the shared worker."""
+        if self._stop.is_set():
+            return
+        try:
+            self._recognize_frame(frame)
+        except Exception as e:
+            self._fail(e)
+
+    def _recognize_frame(self, frame):
+        start = time.perf_counter()
+        results = self.recognize(frame.image)
+        with self._results_lock:
+            if frame.seq > self._results_seq:
+                self._results_seq = frame.seq
+                self._results = results
+        if self.on_results is not None:
+            self.on_results(frame, results)
+        self.stage_stats['recognition'].record(time.perf_counter() - start, time.time() - frame.timestamp)
+
+    def _encode_loop(self):
+        while not self._stop.is_set():
+            frame = self.encode_queue.get(timeout=0.5)
+            if frame is None:
+                continue
+            with self._frame_cond:
+                active = [name for name, listeners in self._listeners.items() if listeners]
+            if not active:
+                continue
+            start = time.perf_counter()
+            image = frame.image.copy()
+            with self._results_lock:
+                results = self._results
+            if self.annotate is not None:
+                self.annotate(image, results)
+            encoded = self.output.encode(frame.seq, image, active)
+            if encoded:
+                with self._frame_cond:
+                    self._frame_cond.notify_all()
+                    listeners = {name: list(self._listeners[name]) for name in encoded}
+                for name, output in encoded.items():
+                    for listener in listeners[name]:
+                        listener(output.seq, output.part)
+            self.stage_stats['encode'].record(time.perf_counter() - start, time.time() - frame.timestamp)
+
+    def add_listener(self, callback, profile=None):
+        """
+        Registers callback(seq, part) for every frame published in ``profile``
+        (default profile for None); ``part`` is the complete multipart chunk.
+        Raises KeyError for unknown profiles.
+        """
+        profile = self.output.resolve(profile)
+        with self._frame_cond:
+            self._listeners[profile].append(callback)
+
+    def remove_listener(self, callback, profile=None):
+        profile = self.output.resolve(profile)
+        with self._frame_cond:
+            if callback in self._listeners[profile]:
+                self._listeners[profile].remove(callback)
+
+    def add_frame_listener(self, callback):
+        """Registers callback(frame) for every raw captured Frame, before any overlay; it must not block."""
+        with self._frame_cond:
+            self._frame_listeners.append(callback)
+
+    def remove_frame_listener(self, callback):
+        with self._frame_cond:
+            if callback in self._frame_listeners:
+                self._frame_listeners.remove(callback)
+
+    def latest(self, profile=None):
+        """Returns the newest EncodedFrame of ``profile``, or None if it hasn't been encoded yet."""
+        with self._frame_cond:
+            return self.output.latest(profile)
+
+    def wait_for_frame(self, after_seq=-1, timeout=None, profile=None):
+        """
+        Blocks until a frame newer than ``after_seq`` is published in ``profile``.
+
+        Only profiles with a listener are encoded; see stream().
+
+        Returns:
+            EncodedFrame: Or None on timeout or stop.
+        """
+        newer = lambda: (self.output.latest(profile) or (-1,))[0] > after_seq
+        with self._frame_cond:
+            self._frame_cond.wait_for(lambda: newer() or self._stop.is_set(), timeout)
+            return self.output.latest(profile) if newer() else None
+
+    def stream(self, profile=None):
+        """Multipart MJPEG generator over the latest annotated frames of ``profile``."""
+        profile = self.output.resolve(profile)
+        keep_encoding = lambda seq, part: None
+        self.add_listener(keep_encoding, profile)
+        try:
+            seq = -1
+            while not self._stop.is_set():
+                output = self.wait_for_frame(seq, timeout=1.0, profile=profile)
+                if output is None:
+                    continue
+                seq = output.seq
+                yield output.part
+        finally:
+            self.remove_listener(keep_encoding, profile)
+
+    def stats(self):
+        """Per-stage queue depth, drops and latency."""
+        stats = {name: stage.snapshot() for name, stage in self.stage_stats.items()}
+        if self._scheduled is not None:
+            stats['recognition'].update(self.scheduler.stats(self.name))
+        stats['recognition']['queue_depth'] = len(self.recognition_queue)
+        stats['recognition']['dropped'] = self.recognition_queue.dropped
+        stats['encode']['queue_depth'] = len(self.encode_queue)
+        stats['encode']['dropped'] = self.encode_queue.dropped
+        with self._frame_cond:
+            listeners = {name: len(callbacks) for name, callbacks in self._listeners.items()}
+        stats['output'] = {name: dict(profile, listeners=listeners[name])
+                           for name, profile in self.output.snapshot().items()}
+        stats['source'] = str(self.source)
+        stats['running'] = self.running
+        stats['error'] = str(self.error) if self.error else None
+        return stats
@@ -0,0 +1,173 @@
+"""
+On-disk snapshot of the face gallery, shared by every worker through mmap.
+
+Layout (little-endian, sections 64-byte aligned):
+
+    header      magic b'FSGALLRY', format version, dim, version stamp,
+                rows, users, metadata length, source fingerprint
+    encodings   float32 (rows, dim), each user's rows contiguous
+    sq_norms    float32 (rows,)
+    counts      int64 (users,), rows per user
+    user_ids    int64 (users,)
+    metadata    JSON [[username, student_lrn], ...] per user
+
+Each snapshot is written to its own data file, ``<path>.<version>``; the
+small file at ``<path>`` names the current one and is replaced atomically
+(write-then-rename) once the data file is complete, so readers see either the
+old snapshot or the new one. The data file itself is never renamed or
+overwritten, which matters on Windows, where a mapped file can't be replaced.
+Readers map the arrays read-only; all processes then share one page-cache
+copy.
+"""
+from collections import namedtuple
+import glob
+import json
+import os
+import struct
+import time
+import numpy as np
+from app.services.face_gallery import GalleryUser
+
+MAGIC = b'FSGALLRY'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQ32s')
+ALIGN = 64
+
+Snapshot = namedtuple('Snapshot', ['version', 'fingerprint', 'users', 'encodings', 'sq_norms', 'counts', 'identity'])
+
+class SnapshotError(ValueError):
+    pass
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _layout(rows, users, dim):
+    """Byte offsets of every section."""
+    encodings = _aligned(HEADER.size)
+    sq_norms = _aligned(encodings + rows * dim * 4)
+    counts = _aligned(sq_norms + rows * 4)
+    user_ids = counts + users * 8
+    metadata = user_ids + users * 8
+    return encodings, sq_norms, counts, user_ids, metadata
+
+def file_identity(path):
+    """Cheap change marker for the pointer file: (inode, mtime_ns, size), or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def write_snapshot(path, users, encodings, counts, sq_norms=None, fingerprint=''):
+    """
+    Atomically replaces the snapshot at ``path``.
+
+    Args:
+        users: GalleryUser per segment.
+        encodings: (rows, dim) float32 matrix grouped by user.
+        counts: Rows per user.
+        sq_norms: Squared row norms (computed if omitted).
+        fingerprint: Short string identifying the database state it was built from.
+
+    Returns:
+        int: The new snapshot's version stamp.
+    """
+    encodings = np.ascontiguousarray(encodings, dtype='<f4')
+    rows, dim = encodings.shape
+    counts = np.asarray(counts, dtype='<i8')
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+    metadata = json.dumps([[user.username, user.student_lrn] for user in users]).encode('utf-8')
+    fingerprint = fingerprint.encode('utf-8')[:32]
+    version = time.time_ns()
+    offsets = _layout(rows, len(users), dim)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    snapshot_file = f'{path}.{version}'
+    with open(snapshot_file, 'wb') as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, FORMAT_VERSION, dim, version, rows, len(users), len(metadata), fingerprint))
+        for offset, data in zip(offsets, (
+                encodings, np.asarray(sq_norms, dtype='<f4'), counts,
+                np.asarray([user.id for user in users], dtype='<i8'), metadata)):
+            snapshot.seek(offset)
+            snapshot.write(data if isinstance(data, bytes) else data.tobytes())
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as pointer:
+        pointer.write(os.path.basename(snapshot_file))
+        pointer.flush()
+        os.fsync(pointer.fileno())
+    os.replace(temp_path, path)
+    _remove_stale(path, version)
+    return version
+
+def _remove_stale(path, version):
+    """Deletes data files older than ``version``; ones still mapped somewhere (Windows) are left for next time."""
+    for old in glob.glob(glob.escape(path) + '.*'):
+        suffix = old.rsplit('.', 1)[1]
+        if suffix.isdigit() and int(suffix) < version:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+def data_path(path):
+    """The data file the pointer at ``path`` currently names."""
+    with open(path, encoding='utf-8') as pointer:
+        name = pointer.read().strip()
+    if not name:
+        raise SnapshotError(f'Gallery snapshot pointer {path} is empty')
+    return os.path.join(os.path.dirname(path), name)
+
+def read_header(path):
+    """
+    Reads just the header of a data file.
+
+    Returns:
+        tuple: (version, fingerprint, dim, rows, users, metadata length)
+    """
+    with open(path, 'rb') as snapshot:
+        data = snapshot.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise SnapshotError(f'Gallery snapshot {path} is truncated')
+    magic, format_version, dim, version, rows, users, meta_len, fingerprint = HEADER.unpack(data)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotError(f'{path} is not a version {FORMAT_VERSION} gallery snapshot')
+    return version, fingerprint.rstrip(b'\0').decode('utf-8'), dim, rows, users, meta_len
+
+def open_snapshot(path):
+    """
+    Maps the current snapshot read-only.
+
+    Args:
+        path: The pointer file.
+
+    Returns:
+        Snapshot: ``encodings`` and ``sq_norms`` are np.memmap views of the
+        data file; ``identity`` is the pointer's file_identity() when it was
+        opened.
+    """
+    identity = file_identity(path)
+    path = data_path(path)
+    version, fingerprint, dim, rows, user_count, meta_len = read_header(path)
+    enc_offset, sq_offset, counts_offset, ids_offset, meta_offset = _layout(rows, user_count, dim)
+    if os.path.getsize(path) < meta_offset + meta_len:
+        raise SnapshotError(f'Gallery snapshot {path} is truncated')
+
+    if rows:
+        encodings = np.memmap(path, dtype='<f4', mode='r', offset=enc_offset, shape=(rows, dim))
+        sq_norms = np.memmap(path, dtype='<f4', mode='r', offset=sq_offset, shape=(rows,))
+    else:
+        encodings = np.empty((0, dim), dtype=np.float32)
+        sq_norms = np.empty(0, dtype=np.float32)
+    with open(path, 'rb') as snapshot:
+        snapshot.seek(counts_offset)
+        counts = np.frombuffer(snapshot.read(user_count * 8), dtype='<i8').astype(np.intp)
+        user_ids = np.frombuffer(snapshot.read(user_count * 8), dtype='<i8')
+        metadata = json.loads(snapshot.read(meta_len) or b'[]')
+    users = [GalleryUser(int(user_id), username, lrn) for user_id, (username, lrn) in zip(user_ids, metadata)]
+    return Snapshot(version, fingerprint, users, encodings, sq_norms, counts, identity)
@@ -0,0 +1,322 @@
+"""
+In-process metrics for the recognition hot path, exported in Prometheus text format by /metrics.
+
+The metrics FusionScan records are declared at the bottom of this module;
+services import the ones they update. Recording is a bisect and a few adds
+under an uncontended lock, well under a microsecond, so it stays on in the
+per-frame stages. Recognition worker processes forward their observations
+to the web process with each result (see MetricsRegistry.forward) instead
+of keeping counts nobody can scrape.
+"""
+from bisect import bisect_left
+import math
+import threading
+import time
+
+# Seconds, from sub-millisecond serial reads to multi-second CNN detections
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class _Timer:
+    __slots__ = ('metric', 'start')
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.start)
+        return False
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=(), labelvalues=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.labelvalues = tuple(labelvalues)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child for one combination of label values; hot paths should keep the child."""
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child(values))
+        return child
+
+    def _child(self, values):
+        return type(self)(self.registry, self.name, self.documentation, labelvalues=values, **self._options())
+
+    def _options(self):
+        return {}
+
+    def children(self):
+        """{label values: child} of a labelled metric."""
+        return dict(self._children)
+
+    def _series(self):
+        """(label pairs, metric) for every child, or just this metric when it has no labels."""
+        if not self.labelnames:
+            return [((), self)]
+        return [(tuple(zip(self.labelnames, values)), child) for values, child in sorted(self._children.items())]
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value = 0
+
+    def inc(self, amount=1):
+        registry = self.registry
+        if not registry.enabled:
+            return
+        if registry.forwarded is not None:
+            registry.forwarded.append((self.name, self.labelvalues, amount))
+            return
+        with self._lock:
+            self.value += amount
+
+    _apply = inc
+
+    def _reset(self):
+        with self._lock:
+            self.value = 0
+
+    def _samples(self, labels):
+        yield self.name, labels, self.value
+
+class Histogram(_Metric):
+    """Observations (normally durations in seconds) counted into fixed buckets."""
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def _options(self):
+        return {'buckets': self.buckets}
+
+    def observe(self, value):
+        registry = self.registry
+        if not registry.enabled:
+            return
+        if registry.forwarded is not None:
+            registry.forwarded.append((self.name, self.labelvalues, value))
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    _apply = observe
+
+    def _reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.sum = 0.0
+            self.count = 0
+
+    def time(self):
+        """Context manager that observes the seconds its block took."""
+        return _Timer(self)
+
+    def totals(self):
+        """(count, sum) over every label combination."""
+        count = total = 0
+        for _, series in self._series():
+            with series._lock:
+                count += series.count
+                total += series.sum
+        return count, total
+
+    def _samples(self, labels):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket
+            yield f'{self.name}_bucket', labels + (('le', _format_value(float(bound))),), cumulative
+        yield f'{self.name}_sum', labels, total
+        yield f'{self.name}_count', labels, count
+
+class MetricsRegistry:
+    """
+    The metrics of one process, plus collectors that report gauges read at scrape time.
+
+    A collector is a callable returning (name, kind, help, samples) families,
+    samples being (labels dict, value) pairs; it is how queue depths and
+    connection states are exported without touching the code that owns them.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.forwarded = None
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def clear_collectors(self):
+        with self._lock:
+            self._collectors.clear()
+
+    def forward(self):
+        """Buffers observations instead of counting them, for drain() to ship to another process."""
+        self.forwarded = []
+
+    def drain(self):
+        """The observations buffered since the last drain(), as (name, label values, value)."""
+        records, self.forwarded = self.forwarded, []
+        return records
+
+    def reset(self):
+        """Zeroes every metric, for benchmarks; a server being scraped must never call it."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            for _, series in metric._series():
+                series._reset()
+
+    def replay(self, records):
+        """Applies observations drained in another process."""
+        for name, labelvalues, value in records:
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            (metric.labels(*labelvalues) if labelvalues else metric)._apply(value)
+
+    def render(self):
+        """Every metric and collector in Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for labels, series in metric._series():
+                for name, sample_labels, value in series._samples(labels):
+                    lines.append(f'{name}{_format_labels(sample_labels)} {_format_value(value)}')
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                lines.append(f'# collector {getattr(collector, "__name__", collector)} failed: {_escape(e)}')
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+CAMERA_READ_SECONDS = REGISTRY.histogram(
+    'fusionscan_camera_read_seconds', 'Time to read one frame from the camera.', ['camera'])
+FACE_DETECTION_SECONDS = REGISTRY.histogram(
+    'fusionscan_face_detection_seconds', 'Time of one face detection pass over an image.')
+FACE_ENCODING_SECONDS = REGISTRY.histogram(
+    'fusionscan_face_encoding_seconds', 'Time to compute the encodings of the faces in one image.')
+FACE_MATCHING_SECONDS = REGISTRY.histogram(
+    'fusionscan_face_matching_seconds', "Time to match one frame's encodings against the gallery.")
+SERIAL_READ_SECONDS = REGISTRY.histogram(
+    'fusionscan_serial_read_seconds', 'Round trip of one temperature request to the Arduino.')
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'fusionscan_db_write_seconds', 'Time to commit one batch of attendance rows.')
+JPEG_ENCODE_SECONDS = REGISTRY.histogram(
+    'fusionscan_jpeg_encode_seconds', 'Time to resize and JPEG-encode one frame for a stream profile.',
+    ['profile'])
+FACES = REGISTRY.counter(
+    'fusionscan_faces_total', 'Faces matched against the gallery, by result (recognized or unknown).', ['result'])
+ATTENDANCE_EVENTS = REGISTRY.counter(
+    'fusionscan_attendance_events_total', 'Attendance events emitted by fusion, by status (Present or Anomaly).',
+    ['status'])
+SERIAL_ERRORS = REGISTRY.counter(
+    'fusionscan_serial_errors_total', 'Failed serial connections or reads of the thermal sensor.')
+
+def service_collector(camera_hub, attendance_writer, thermal_sensor, event_bus):
+    """Collector for the state the services already keep: queues, drops, viewers, sensor and writer."""
+
+    def collect():
+        pipelines = camera_hub.stats()
+        depth, dropped, viewers = [], [], []
+        for camera_id, stats in pipelines.items():
+            for stage in ('recognition', 'encode'):
+                labels = {'camera': camera_id, 'stage': stage}
+                depth.append((labels, stats[stage]['queue_depth']))
+                dropped.append((labels, stats[stage]['dropped']))
+            viewers.append(({'camera': camera_id}, stats['viewers']))
+        yield ('fusionscan_pipeline_queue_depth', 'gauge', 'Frames waiting in a camera pipeline queue.', depth)
+        yield ('fusionscan_pipeline_dropped_frames_total', 'counter',
+               'Frames a camera pipeline dropped because its stage fell behind.', dropped)
+        yield ('fusionscan_stream_viewers', 'gauge', 'Clients watching a camera stream.', viewers)
+
+        writer = attendance_writer.stats()
+        yield ('fusionscan_attendance_pending_rows', 'gauge', 'Attendance rows journaled but not yet committed.',
+               [({}, writer['pending'])])
+        yield ('fusionscan_attendance_rows_written_total', 'counter', 'Attendance rows committed by the writer.',
+               [({}, writer['written'])])
+        yield ('fusionscan_attendance_duplicates_total', 'counter',
+               'Attendance rows dropped as repeats within the duplicate window.', [({}, writer['duplicates'])])
+
+        sensor = thermal_sensor.stats()
+        yield ('fusionscan_thermal_connected', 'gauge', 'Whether the thermal sensor port is open.',
+               [({}, int(sensor['connected']))])
+        yield ('fusionscan_thermal_temperature_celsius', 'gauge', 'Latest thermal sensor reading.',
+               [({}, sensor['latest'])])
+        yield ('fusionscan_event_streams', 'gauge', 'Open /events dashboard streams.',
+               [({}, event_bus.stats()['streams'])])
+
+    return collect
@@ -0,0 +1,292 @@
+from collections import deque
+from datetime import datetime, timezone
+import csv
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from app.models import db, Attendance
+from app.services.attendance_fusion import AttendanceFusion
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class VideoSource:
+    """
+    Every ``stride``-th frame of a video file, with its capture time.
+
+    A frame's time is ``start`` (epoch seconds, when the recording began)
+    plus its position in the stream. Skipped frames are only grabbed, not
+    decoded into images.
+    """
+
+    def __init__(self, path, stride=1, start=None):
+        self.path = path
+        self.stride = max(1, stride)
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video file {path}")
+        self.total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        capture.release()
+        # Without a start time, assume the file was last written when the recording ended
+        self.start = start if start is not None else os.path.getmtime(path) - self.total / self.fps
+
+    @property
+    def identity(self):
+        stat = os.stat(self.path)
+        return {'path': os.path.abspath(self.path), 'size': stat.st_size, 'mtime': stat.st_mtime, 'stride': self.stride}
+
+    def frames(self, first=0):
+        """Yields (index, timestamp, image) for sampled frames from index ``first`` on."""
+        capture = cv2.VideoCapture(self.path)
+        try:
+            index = 0
+            if first:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, first)
+                index = int(capture.get(cv2.CAP_PROP_POS_FRAMES))
+                if index != first:  # the backend can't seek this file; walk there
+                    capture.release()
+                    capture = cv2.VideoCapture(self.path)
+                    index = 0
+                    while index < first and capture.grab():
+                        index += 1
+            while True:
+                if index % self.stride:
+                    if not capture.grab():
+                        return
+                    index += 1
+                    continue
+                position = capture.get(cv2.CAP_PROP_POS_MSEC)
+                success, image = capture.read()
+                if not success:
+                    return
+                yield index, self.start + (position / 1000.0 if position else index / self.fps), image
+                index += 1
+        finally:
+            capture.release()
+
+class ImageFolderSource:
+    """
+    Every ``stride``-th image of a folder, timed by each file's modification
+    time and in that order (name order for ties), since attendance fusion
+    expects sightings to move forward in time.
+    """
+
+    def __init__(self, path, stride=1):
+        self.path = path
+        self.stride = max(1, stride)
+        names = [name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS)]
+        self.files = sorted(names, key=lambda name: (os.path.getmtime(os.path.join(path, name)), name))
+        self.total = len(self.files)
+
+    @property
+    def identity(self):
+        return {'path': os.path.abspath(self.path), 'files': self.total,
+                'first': self.files[0] if self.files else None, 'stride': self.stride}
+
+    def frames(self, first=0):
+        for index in range(first, self.total):
+            if index % self.stride:
+                continue
+            file_path = os.path.join(self.path, self.files[index])
+            image = cv2.imread(file_path)
+            if image is None:
+                log.warning("Skipping unreadable image %s", file_path)
+                continue
+            yield index, os.path.getmtime(file_path), image
+
+def open_source(path, stride=1, start=None):
+    """A VideoSource or ImageFolderSource for ``path``."""
+    if os.path.isdir(path):
+        return ImageFolderSource(path, stride)
+    return VideoSource(path, stride, start)
+
+def load_thermal_log(path):
+    """
+    Reads a CSV of ``timestamp,temperature`` rows (epoch seconds or ISO
+    times, UTC unless an offset is given) into an unstarted ThermalSensor
+    buffer, so AttendanceFusion can use it like the live sensor.
+
+    A header line is allowed; other rows without a valid time and a finite
+    temperature (e.g. a failed 'nan' read) are skipped with a warning.
+
+    Raises:
+        ValueError: The file has no usable readings or is not text.
+    """
+    from app.services.thermal_scanning_service import ThermalSensor
+    readings = []
+    skipped = 0
+    with open(path, newline='', encoding='utf-8') as log_file:
+        try:
+            rows = list(csv.reader(log_file))
+        except UnicodeDecodeError:
+            raise ValueError(f"{path} is not a UTF-8 CSV file")
+        for line, row in enumerate(rows, 1):
+            if not row:
+                continue
+            try:
+                try:
+                    timestamp = float(row[0])
+                except ValueError:
+                    timestamp = parse_time(row[0])
+                temperature = float(row[1])
+            except (ValueError, IndexError):
+                skipped += line > 1  # the first line may be a header
+                continue
+            if not (math.isfinite(timestamp) and math.isfinite(temperature)):
+                skipped += 1
+                continue
+            readings.append((timestamp, temperature))
+    if not readings:
+        raise ValueError(f"{path} has no timestamp,temperature readings")
+    if skipped:
+        log.warning("Skipped %d unusable rows of thermal log %s.", skipped, path)
+    readings.sort()
+    sensor = ThermalSensor(port=path, buffer_size=max(1, len(readings)))
+    for timestamp, temperature in readings:
+        sensor.add_reading(temperature, timestamp)
+    return sensor
+
+def parse_time(value):
+    """ISO date/time -> epoch seconds; naive times are UTC, like the attendance table."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        return (moment - datetime(1970, 1, 1)).total_seconds()
+    return moment.timestamp()
+
+class OfflineRecognition:
+    """
+    Recognizes a recording and writes its attendance as if the camera had been live.
+
+    Sampled frames go through FaceRecognitionService.recognize_frames (the
+    worker processes of its executor, if it has one), and sightings through
+    AttendanceFusion with the frames' capture times. Every ``batch_size``
+    events the attendance rows are inserted in one transaction through the
+    AttendanceWriter (so rollups, the status cache and live dashboards follow)
+    and a checkpoint is saved: the next frame to process plus the passes still
+    open. A run resumed from the checkpoint continues where the last commit
+    left off; rows already in the table are never inserted twice. Progress
+    lines go to ``progress`` (e.g. click.echo), or the log without one.
+    """
+
+    def __init__(self, recognizer, attendance_writer, thermal_sensor=None, fusion_options=None, strategy=None,
+                 checkpoint_path=None, batch_size=200, report_every=5.0, progress=None):
+        self.recognizer = recognizer
+        self.attendance_writer = attendance_writer
+        self.strategy = strategy or recognizer.strategy
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.report_every = report_every
+        self.progress = progress
+        self._events = []
+        self.fusion = AttendanceFusion(thermal_sensor, self._events.append,
+                                       require_temperature=thermal_sensor is not None, **(fusion_options or {}))
+        self.stats = {'frames': 0, 'faces': 0, 'recognized': 0, 'events': 0, 'inserted': 0, 'seconds': 0.0}
+
+    @staticmethod
+    def default_checkpoint(instance_path, source):
+        key = hashlib.sha1(json.dumps(source.identity, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return os.path.join(instance_path, 'offline', f'{key}.json')
+
+    def _load_checkpoint(self, source):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, encoding='utf-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint.get('source') != source.identity:
+            log.warning("Checkpoint %s is for a different source; starting over.", self.checkpoint_path)
+            return 0
+        for user_id, first_seen, last_seen in checkpoint['passes']:
+            self.fusion.observe([user_id], first_seen)
+            self.fusion.observe([user_id], last_seen)
+        log.info("Resuming at frame %d with %d open passes.", checkpoint['next_frame'], len(checkpoint['passes']))
+        return checkpoint['next_frame']
+
+    def _save_checkpoint(self, source, next_frame, done=False):
+        if not self.checkpoint_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint_path)), exist_ok=True)
+        checkpoint = {'source': source.identity, 'next_frame': next_frame, 'passes': self.fusion.pass_state(),
+                      'done': done}
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temporary, self.checkpoint_path)
+
+    def _commit(self):
+        """Inserts the pending events' rows (minus any already in the table) and returns how many."""
+        events, self._events[:] = list(self._events), []
+        if not events:
+            return 0
+        rows = [{'user_id': event.user_id, 'status': event.status, 'temperature': event.temperature,
+                 'timestamp': datetime.fromtimestamp(event.first_seen, timezone.utc).replace(tzinfo=None)}
+                for event in events]
+        existing = set(
+            db.session.query(Attendance.user_id, Attendance.timestamp)
+            .filter(Attendance.user_id.in_({row['user_id'] for row in rows}),
+                    Attendance.timestamp.between(min(row['timestamp'] for row in rows),
+                                                 max(row['timestamp'] for row in rows)))
+        )
+        db.session.rollback()  # end the read transaction before the writer's
+        # Not record_attendance(): its live duplicate window would drop events older than one already
+        # seen, and image folders are not in capture order. Raises if the rows can't be stored, so no
+        # checkpoint is saved past them.
+        return self.attendance_writer.insert(
+            [row for row in rows if (row['user_id'], row['timestamp']) not in existing])
+
+    def run(self, source, resume=True):
+        """
+        Processes ``source`` (see open_source) to the end.
+
+        Returns:
+            dict: Frames processed, faces found and recognized, attendance
+            events and rows inserted, seconds taken.
+        """
+        first = self._load_checkpoint(source) if resume else 0
+        started = last_report = time.perf_counter()
+        sampled = source.frames(first)
+        timing = deque()  # (index, timestamp) of frames in flight, in order
+
+        def images():
+            for index, timestamp, image in sampled:
+                timing.append((index, timestamp))
+                yield image
+
+        next_frame = first
+        for results in self.recognizer.recognize_frames(images(), self.strategy):
+            index, timestamp = timing.popleft()
+            user_ids = [result.user.id for result in results if result.user is not None]
+            self.stats['frames'] += 1
+            self.stats['faces'] += len(results)
+            self.stats['recognized'] += len(user_ids)
+            # Close passes before extending them: sparse frames (an image folder) can be minutes apart
+            self.stats['events'] += len(self.fusion.flush(timestamp))
+            self.fusion.observe(user_ids, timestamp)
+            next_frame = index + 1
+            if len(self._events) >= self.batch_size:
+                self.stats['inserted'] += self._commit()
+                self._save_checkpoint(source, next_frame)
+            now = time.perf_counter()
+            if now - last_report >= self.report_every:
+                last_report = now
+                self._report(now - started, index, source.total)
+        self.stats['events'] += len(self.fusion.flush(force=True))
+        self.stats['inserted'] += self._commit()
+        self._save_checkpoint(source, max(next_frame, source.total), done=True)
+        self.stats['seconds'] = time.perf_counter() - started
+        return self.stats
+
+    def _report(self, elapsed, index, total):
+        message = (f"frame {index + 1}/{total or '?'}: {self.stats['frames'] / elapsed:.1f} frames/s, "
+                   f"{self.stats['recognized']} recognized faces, {self.stats['events']} attendance events")
+        if self.progress is not None:
+            self.progress(message)
+        else:
+            log.info(message)
@@ -0,0 +1,99 @@
+from collections import Counter
+import os
+import sys
+import threading
+import time
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the running process, switched on and off at runtime.
+
+    While running, a daemon thread wakes every ``interval`` seconds and
+    records the current stack of every other thread (sys._current_frames),
+    so it costs nothing while stopped and a few microseconds per thread and
+    sample while running; the profiled code is never traced. report() gives
+    the stacks in collapsed form ("thread;outer;...;inner count" per line),
+    which flamegraph.pl, speedscope and similar tools read directly. Frames
+    in worker processes are not seen, only the time threads spend waiting
+    for them.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self._stacks = Counter()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None, reset=True):
+        """Starts sampling (clearing earlier samples unless ``reset`` is off); a no-op if already running."""
+        with self._lock:
+            if self.running:
+                return self
+            if interval:
+                self.interval = interval
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+            self.started, self.stopped = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self.stopped = time.time()
+        return self
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            sampled = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}'))
+                sampled.append(';'.join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+
+    def report(self, limit=None):
+        """Collapsed stacks, most sampled first (at most ``limit`` lines)."""
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def stats(self):
+        end = self.stopped or time.time()
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'samples': self.samples,
+            'stacks': len(self._stacks),
+            'seconds': end - self.started if self.started else 0.0,
+        }
@@ -0,0 +1,174 @@
+"""
+Face detection and encoding in worker processes.
+
+dlib's HOG detector and ResNet encoder hold the GIL, so recognition threads
+in one process share a single core. RecognitionExecutor runs
+FaceRecognitionService.detect_and_encode in a pool of worker processes
+instead. Frames travel through a fixed ring of shared-memory slots (only
+the slot name, shape, dtype and detection settings are pickled), and only
+the small results, face boxes and 128-d encodings, come back, together
+with the metrics the worker recorded for the frame. Matching against the
+gallery stays in the calling process.
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+from threading import BrokenBarrierError
+import numpy as np
+from app.services.metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+_worker_service = None
+
+def _init_worker(started):
+    """Runs once in every worker: loads face_recognition and dlib's models, then waits for the other workers."""
+    global _worker_service
+    from app.services.face_recognition_service import FaceRecognitionService
+    REGISTRY.forward()
+    _worker_service = FaceRecognitionService()
+    _worker_service.warm_up()
+    try:
+        # Holds back start()'s pings until every worker is up, so each one gets spawned and warmed
+        started.wait(timeout=120)
+    except BrokenBarrierError:
+        pass
+
+def _detect_and_encode(slot_name, shape, dtype, strategy):
+    """
+    Worker task: detects and encodes the faces of the frame in a shared-memory slot.
+
+    Returns:
+        tuple: ((boxes, face_encodings), metric observations to replay in the caller)
+    """
+    from app.services.detection_strategy import DetectionStrategy
+    slot = shared_memory.SharedMemory(name=slot_name)
+    try:
+        frame = np.ndarray(shape, dtype=dtype, buffer=slot.buf)
+        result = _worker_service.detect_and_encode(frame, DetectionStrategy(**strategy) if strategy else None)
+        del frame
+    finally:
+        try:
+            slot.close()
+        except BufferError:
+            pass  # a failed task's traceback still holds the view; the mapping goes with it
+    return result, REGISTRY.drain()
+
+def _ping():
+    return os.getpid()
+
+class RecognitionExecutor:
+    """
+    Pool of worker processes that detect and encode faces.
+
+    submit() copies a frame into a free shared-memory slot and returns a
+    Future of (boxes, face_encodings); map() keeps every worker busy and
+    yields results in submission order. There are ``slots`` frames in
+    flight at most, so submit() blocks when the workers fall behind.
+    """
+
+    def __init__(self, workers=None, slots=None):
+        """
+        Args:
+            workers: Worker processes (default: one per CPU core).
+            slots: Shared-memory frame buffers (default: two per worker).
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.slot_count = max(self.workers, slots or 2 * self.workers)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = [None] * self.slot_count
+        self._free = queue.Queue()
+        for index in range(self.slot_count):
+            self._free.put(index)
+
+    def start(self):
+        """Starts the workers and waits until each has loaded its models; later calls are no-ops."""
+        with self._lock:
+            if self._pool is not None:
+                return self
+            # 'spawn' everywhere: forking a process that runs camera and Flask threads is unsafe
+            context = multiprocessing.get_context('spawn')
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=context,
+                initializer=_init_worker, initargs=(context.Barrier(self.workers),))
+            atexit.register(self.shutdown)
+        pids = {future.result() for future in [self._pool.submit(_ping) for _ in range(self.workers)]}
+        log.info("Recognition workers started: %d processes.", len(pids))
+        return self
+
+    def _slot_for(self, index, nbytes):
+        slot = self._slots[index]
+        if slot is None or slot.size < nbytes:
+            if slot is not None:
+                slot.close()
+                slot.unlink()
+            slot = self._slots[index] = shared_memory.SharedMemory(create=True, size=nbytes)
+        return slot
+
+    def submit(self, frame, strategy=None):
+        """
+        Queues one BGR camera frame.
+
+        Args:
+            strategy: DetectionStrategy.fixed() keyword arguments, or None for the default detection.
+
+        Returns:
+            Future: Resolves to (boxes, face_encodings), boxes in full-frame coordinates.
+        """
+        if self._pool is None:
+            self.start()
+        frame = np.ascontiguousarray(frame)
+        index = self._free.get()
+        try:
+            slot = self._slot_for(index, frame.nbytes)
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+            task = self._pool.submit(_detect_and_encode, slot.name, frame.shape, frame.dtype.str, strategy)
+        except BaseException:
+            self._free.put(index)
+            raise
+        future = Future()
+
+        def finished(task):
+            self._free.put(index)
+            try:
+                result, observations = task.result()
+            except BaseException as e:
+                future.set_exception(e)
+                return
+            REGISTRY.replay(observations)
+            future.set_result(result)
+
+        task.add_done_callback(finished)
+        return future
+
+    def map(self, jobs):
+        """
+        Yields (boxes, face_encodings) for every (frame, strategy) job, in
+        order, with up to ``slots`` in flight.
+        """
+        pending = deque()
+        for frame, strategy in jobs:
+            if len(pending) >= self.slot_count:
+                yield pending.popleft().result()
+            pending.append(self.submit(frame, strategy))
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self):
+        """Stops the workers and frees the shared-memory slots."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for index, slot in enumerate(self._slots):
+            if slot is not None:
+                slot.close()
+                slot.unlink()
+                self._slots[index] = None
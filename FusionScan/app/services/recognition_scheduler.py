@@ -0,0 +1,167 @@
+from collections import deque
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+class ScheduledCamera:
+    """
+    One camera's place in the RecognitionScheduler.
+
+    Frames wait in the camera's own bounded drop-oldest queue, so a camera
+    that produces more than its share only ever loses its own oldest frames.
+    """
+
+    def __init__(self, name, queue, process, weight, max_in_flight):
+        self.name = name
+        self.queue = queue
+        self.process = process
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.active = True
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self._completed = deque(maxlen=64)
+
+    @property
+    def ready(self):
+        return self.active and len(self.queue) > 0 and (self.max_in_flight is None or self.in_flight < self.max_in_flight)
+
+    def fps(self, window=10.0):
+        """Recognized frames per second over (up to) the last ``window`` seconds."""
+        now = time.monotonic()
+        recent = [t for t in self._completed if now - t <= window]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) / max(recent[-1] - recent[0], 1e-6)
+
+class RecognitionScheduler:
+    """
+    Recognition threads shared by every camera, with weighted fair scheduling.
+
+    Each worker takes the next frame from the backlogged camera with the
+    smallest virtual time, then advances that camera's virtual time by
+    1 / weight (start-time fair queuing). When every camera is busy, each gets
+    recognition in proportion to its weight, and a camera that was idle
+    rejoins at the current virtual time instead of claiming the turns it
+    missed, so one busy entrance can't starve the others. ``max_in_flight``
+    caps a camera's concurrent frames (1 for cameras whose recognition is
+    sequential, like the tracker).
+
+    Workers run inside an app context. With a RecognitionExecutor behind
+    them, each worker thread keeps one worker process busy.
+    """
+
+    def __init__(self, app, workers=1):
+        self.app = app
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._cameras = {}
+        self._clock = 0.0
+        self._threads = []
+
+    def register(self, name, queue, process, weight=1.0, max_in_flight=None):
+        """
+        Adds a camera, replacing any earlier registration under the same name.
+
+        Args:
+            name: Camera id.
+            queue: The camera's DropOldestQueue of frames.
+            process: process(frame), run on a worker thread for every scheduled frame.
+            weight: Share of recognition relative to the other cameras.
+            max_in_flight: Frames of this camera processed at once (None = no limit).
+
+        Returns:
+            ScheduledCamera: Pass it to submit() and unregister().
+        """
+        camera = ScheduledCamera(name, queue, process, max(weight, 1e-3), max_in_flight)
+        with self._cond:
+            previous = self._cameras.get(name)
+            if previous is not None:
+                previous.active = False
+            camera.virtual_time = self._clock
+            self._cameras[name] = camera
+            if not self._threads:
+                self._threads = [
+                    threading.Thread(target=self._run, name=f'recognition-{i}', daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+        return camera
+
+    def submit(self, camera, frame):
+        """Queues a frame for ``camera`` (dropping its oldest if the queue is full) and wakes a worker."""
+        with self._cond:
+            if not len(camera.queue) and not camera.in_flight:
+                # Idle cameras don't bank credit while they are away
+                camera.virtual_time = max(camera.virtual_time, self._clock)
+            camera.queue.put(frame)
+            self._cond.notify()
+
+    def unregister(self, camera, timeout=2.0):
+        """Removes ``camera`` and waits (up to ``timeout``) for its frames already being processed."""
+        with self._cond:
+            camera.active = False
+            if self._cameras.get(camera.name) is camera:
+                del self._cameras[camera.name]
+            if threading.current_thread() not in self._threads:
+                self._cond.wait_for(lambda: camera.in_flight == 0, timeout)
+
+    def _next(self):
+        """Picks the ready camera with the smallest virtual time; call with the lock held."""
+        ready = [camera for camera in self._cameras.values() if camera.ready]
+        if not ready:
+            return None
+        camera = min(ready, key=lambda c: c.virtual_time)
+        self._clock = camera.virtual_time
+        camera.virtual_time += 1.0 / camera.weight
+        camera.in_flight += 1
+        return camera
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._cond:
+                    camera = None
+                    while camera is None:
+                        camera = self._next()
+                        if camera is None:
+                            self._cond.wait()
+                    frame = camera.queue.get(timeout=0)
+                if frame is not None:
+                    start = time.perf_counter()
+                    try:
+                        camera.process(frame)
+                    except Exception as e:
+                        log.error("Recognition for camera %s failed: %s", camera.name, e)
+                    finished = time.perf_counter()
+                with self._cond:
+                    camera.in_flight -= 1
+                    if frame is not None:
+                        camera.processed += 1
+                        camera.busy_seconds += finished - start
+                        camera.wait_seconds += max(0.0, time.time() - frame.timestamp - (finished - start))
+                        camera._completed.append(time.monotonic())
+                    self._cond.notify_all()
+
+    def stats(self, name):
+        """Throughput and share of recognition time for one camera, or {} if it isn't registered."""
+        with self._cond:
+            camera = self._cameras.get(name)
+            if camera is None:
+                return {}
+            total_busy = sum(c.busy_seconds for c in self._cameras.values())
+            return {
+                'fps': camera.fps(),
+                'processed': camera.processed,
+                'in_flight': camera.in_flight,
+                'weight': camera.weight,
+                'share': camera.busy_seconds / total_busy if total_busy else 0.0,
+                'avg_wait_ms': camera.wait_seconds * 1000.0 / camera.processed if camera.processed else 0.0,
+                'shared_workers': self.workers,
+            }
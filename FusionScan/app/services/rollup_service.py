@@ -0,0 +1,254 @@
+from datetime import datetime, time, timedelta
+import logging
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Attendance, User, UserDailyAttendance, StrandDailyAttendance, AttendanceDay, _DailyRollup
+
+log = logging.getLogger(__name__)
+
+UNASSIGNED_STRAND = 'Unassigned'
+ROLLUP_FIELDS = ('first_seen', 'last_seen', 'count', 'temperature_min', 'temperature_max',
+                 'temperature_sum', 'temperature_count', 'anomaly_count')
+
+class _Aggregate:
+    """Unsaved rollup of a few attendance rows, merged into the rollup tables by apply()."""
+    __slots__ = ROLLUP_FIELDS
+
+    merge = _DailyRollup.merge
+    temperature_mean = _DailyRollup.temperature_mean
+    to_dict = _DailyRollup.to_dict
+
+    def __init__(self):
+        self.first_seen = None
+        self.last_seen = None
+        self.count = 0
+        self.temperature_min = None
+        self.temperature_max = None
+        self.temperature_sum = 0.0
+        self.temperature_count = 0
+        self.anomaly_count = 0
+
+    def add(self, timestamp, temperature, status):
+        self.first_seen = timestamp if self.first_seen is None else min(self.first_seen, timestamp)
+        self.last_seen = timestamp if self.last_seen is None else max(self.last_seen, timestamp)
+        self.count += 1
+        if temperature is not None:
+            self.temperature_min = temperature if self.temperature_min is None else min(self.temperature_min, temperature)
+            self.temperature_max = temperature if self.temperature_max is None else max(self.temperature_max, temperature)
+            self.temperature_sum += temperature
+            self.temperature_count += 1
+        if status == 'Anomaly':
+            self.anomaly_count += 1
+
+class AttendanceRollup:
+    """
+    Per-user-per-day and per-strand-per-day attendance aggregates.
+
+    apply() folds newly written attendance rows into the rollups inside the
+    caller's transaction, so they commit (or roll back) with the rows
+    themselves. Once a day is over it is finalized exactly once: its rollups
+    are rebuilt from the raw rows, which corrects anything the incremental
+    path could have missed (rows written by another process, a lost update
+    between two writers), and an AttendanceDay row marks it done.
+
+    Days are UTC dates, like the attendance timestamps.
+    """
+
+    def __init__(self):
+        self._finalized_before = None
+
+    def apply(self, rows):
+        """
+        Adds attendance rows (dicts with user_id/status/temperature/timestamp) to the rollups.
+
+        Does not commit.
+        """
+        batch = {}
+        for row in rows:
+            key = (row['timestamp'].date(), row['user_id'])
+            batch.setdefault(key, _Aggregate()).add(row['timestamp'], row['temperature'], row['status'])
+        if not batch:
+            return
+        days = {day for day, _ in batch}
+        user_ids = {user_id for _, user_id in batch}
+        existing = {
+            (row.day, row.user_id): row
+            for row in UserDailyAttendance.query.filter(UserDailyAttendance.day.in_(days),
+                                                        UserDailyAttendance.user_id.in_(user_ids))
+        }
+        strands = dict(db.session.query(User.id, User.strand).filter(User.id.in_(user_ids)))
+
+        strand_batch = {}
+        for (day, user_id), aggregate in batch.items():
+            row = existing.get((day, user_id))
+            if row is None:
+                row = UserDailyAttendance(day=day, user_id=user_id)
+                db.session.add(row)
+            row.merge(aggregate)
+            key = (day, strands.get(user_id) or UNASSIGNED_STRAND)
+            strand_aggregate, new_users = strand_batch.get(key, (None, 0))
+            if strand_aggregate is None:
+                strand_aggregate = _Aggregate()
+            strand_aggregate.merge(aggregate)
+            strand_batch[key] = (strand_aggregate, new_users + ((day, user_id) not in existing))
+
+        existing_strands = {
+            (row.day, row.strand): row
+            for row in StrandDailyAttendance.query.filter(
+                StrandDailyAttendance.day.in_(days),
+                StrandDailyAttendance.strand.in_({strand for _, strand in strand_batch}))
+        }
+        for (day, strand), (aggregate, new_users) in strand_batch.items():
+            row = existing_strands.get((day, strand))
+            if row is None:
+                row = StrandDailyAttendance(day=day, strand=strand, users=0)
+                db.session.add(row)
+            row.merge(aggregate)
+            row.users += new_users
+
+    def rebuild_day(self, day):
+        """
+        Recomputes one day's rollups from the raw attendance rows. Does not commit.
+
+        Scans only that day's rows (through the timestamp index).
+        """
+        start = datetime.combine(day, time.min)
+        end = start + timedelta(days=1)
+        is_anomaly = db.case((Attendance.status == 'Anomaly', 1), else_=0)
+        rows = (db.session.query(
+                    Attendance.user_id,
+                    db.func.min(Attendance.timestamp), db.func.max(Attendance.timestamp),
+                    db.func.count(Attendance.id),
+                    db.func.min(Attendance.temperature), db.func.max(Attendance.temperature),
+                    db.func.coalesce(db.func.sum(Attendance.temperature), 0.0),
+                    db.func.count(Attendance.temperature),
+                    db.func.sum(is_anomaly))
+                .filter(Attendance.timestamp >= start, Attendance.timestamp < end,
+                        Attendance.user_id.isnot(None))
+                .group_by(Attendance.user_id)
+                .all())
+        UserDailyAttendance.query.filter_by(day=day).delete()
+        if rows:
+            db.session.execute(db.insert(UserDailyAttendance), [
+                dict(zip(('user_id',) + ROLLUP_FIELDS, row), day=day) for row in rows
+            ])
+        self.rebuild_strands(day)
+
+    def rebuild_strands(self, day):
+        """Recomputes one day's strand rollups from its user rollups. Does not commit."""
+        rows = (db.session.query(
+                    User.strand,
+                    db.func.min(UserDailyAttendance.first_seen), db.func.max(UserDailyAttendance.last_seen),
+                    db.func.sum(UserDailyAttendance.count),
+                    db.func.min(UserDailyAttendance.temperature_min), db.func.max(UserDailyAttendance.temperature_max),
+                    db.func.sum(UserDailyAttendance.temperature_sum),
+                    db.func.sum(UserDailyAttendance.temperature_count),
+                    db.func.sum(UserDailyAttendance.anomaly_count),
+                    db.func.count(UserDailyAttendance.user_id))
+                .outerjoin(User, User.id == UserDailyAttendance.user_id)
+                .filter(UserDailyAttendance.day == day)
+                .group_by(User.strand)
+                .all())
+        strands = {}
+        for strand, *values, users in rows:
+            # Users without a strand and users deleted since both land in UNASSIGNED_STRAND
+            aggregate = _Aggregate()
+            for field, value in zip(ROLLUP_FIELDS, values):
+                setattr(aggregate, field, value)
+            strand = strand or UNASSIGNED_STRAND
+            if strand in strands:
+                strands[strand][0].merge(aggregate)
+                strands[strand][1] += users
+            else:
+                strands[strand] = [aggregate, users]
+        StrandDailyAttendance.query.filter_by(day=day).delete()
+        if strands:
+            db.session.execute(db.insert(StrandDailyAttendance), [
+                dict({field: getattr(aggregate, field) for field in ROLLUP_FIELDS}, day=day, strand=strand, users=users)
+                for strand, (aggregate, users) in strands.items()
+            ])
+
+    def remove_user(self, user_id):
+        """Drops a user's rollups and rebuilds the strand totals of the days they appeared. Does not commit."""
+        days = [day for day, in db.session.query(UserDailyAttendance.day).filter_by(user_id=user_id)]
+        UserDailyAttendance.query.filter_by(user_id=user_id).delete()
+        for day in days:
+            self.rebuild_strands(day)
+
+    def finalize_pending(self, today=None):
+        """
+        Finalizes every day before ``today`` that has rollups but no AttendanceDay yet.
+
+        Cheap after the first call of each day: the result is remembered until
+        the date changes. Commits once per finalized day. If another process
+        finalizes the same day first, its AttendanceDay insert wins and this
+        one rolls back.
+
+        Returns:
+            list: The days finalized by this call.
+        """
+        today = today or datetime.utcnow().date()
+        if self._finalized_before == today:
+            return []
+        pending = [
+            day for day, in db.session.query(UserDailyAttendance.day).distinct()
+            .outerjoin(AttendanceDay, AttendanceDay.day == UserDailyAttendance.day)
+            .filter(UserDailyAttendance.day < today, AttendanceDay.day.is_(None))
+            .order_by(UserDailyAttendance.day)
+        ]
+        finalized = []
+        for day in pending:
+            try:
+                db.session.add(AttendanceDay(day=day))
+                db.session.flush()
+                self.rebuild_day(day)
+                db.session.commit()
+                finalized.append(day)
+            except IntegrityError:
+                db.session.rollback()
+        if finalized:
+            log.info("Finalized attendance rollups for %d day(s).", len(finalized))
+        self._finalized_before = today
+        return finalized
+
+    def summary(self, start, end, strand=None, user_id=None):
+        """
+        Day-by-day attendance summary answered from the rollups only.
+
+        Args:
+            start, end: Inclusive date range.
+            strand: Only this strand.
+            user_id: Only this user (per-user rollups instead of strand ones).
+
+        Returns:
+            dict: {'start', 'end', 'days': [{'day', 'finalized', 'totals', 'strands' or 'user'}]}
+        """
+        finalized = {
+            day for day, in db.session.query(AttendanceDay.day)
+            .filter(AttendanceDay.day >= start, AttendanceDay.day <= end)
+        }
+        days = {}
+        if user_id is not None:
+            rows = (UserDailyAttendance.query.filter_by(user_id=user_id)
+                    .filter(UserDailyAttendance.day >= start, UserDailyAttendance.day <= end))
+            for row in rows:
+                days[row.day] = {'totals': row.to_dict()}
+        else:
+            query = StrandDailyAttendance.query.filter(StrandDailyAttendance.day >= start,
+                                                       StrandDailyAttendance.day <= end)
+            if strand:
+                query = query.filter_by(strand=strand)
+            totals = {}
+            for row in query:
+                entry = days.setdefault(row.day, {'strands': {}})
+                entry['strands'][row.strand] = row.to_dict()
+                total = totals.setdefault(row.day, [_Aggregate(), 0])
+                total[0].merge(row)
+                total[1] += row.users or 0
+            for day, (aggregate, users) in totals.items():
+                days[day]['totals'] = dict(aggregate.to_dict(), users=users)
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': [dict(entry, day=day.isoformat(), finalized=day in finalized)
+                     for day, entry in sorted(days.items())],
+        }
@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+from functools import partial
+import logging
+import threading
+from app.services.attendance_fusion import AttendanceFusion
+from app.services.detection_strategy import DetectionStrategy
+from app.services.face_tracker import FaceTracker
+from app.services.frame_pipeline import FramePipeline
+from app.services.stream_output import parse_profiles
+from app.services.video_file_source import open_capture
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+class ScannerService:
+    """
+    Per-camera glue between recognition, the thermal sensor and attendance.
+
+    Provides the recognize / on_results / annotate / on_stop callbacks a
+    FramePipeline needs for one entrance. Sightings are fused with thermal
+    samples by AttendanceFusion, which writes one attendance row per pass.
+    """
+
+    def __init__(self, recognizer, thermal_sensor, attendance_sink, tracker_options=None, fusion_options=None,
+                 strategy=None):
+        self.recognizer = recognizer
+        self.thermal_sensor = thermal_sensor
+        self.attendance_sink = attendance_sink
+        self.strategy = strategy or recognizer.strategy
+        self.tracker = None
+        if tracker_options is not None:
+            self.tracker = FaceTracker(recognizer, strategy=self.strategy, **tracker_options)
+        self.fusion = AttendanceFusion(thermal_sensor, self.record_event, **(fusion_options or {}))
+        self.last_temperature = None
+        self._fusion_lock = threading.Lock()
+
+    def recognize(self, image):
+        if self.tracker is not None:
+            return self.tracker.track(image)
+        return self.recognizer.recognize_frame(image, self.strategy)
+
+    def record(self, frame, results):
+        """Feeds the frame's recognized faces to the fusion stage and emits finished passes."""
+        user_ids = [result.user.id for result in results if result.user is not None]
+        with self._fusion_lock:
+            self.fusion.observe(user_ids, frame.timestamp)
+            self.fusion.flush(frame.timestamp)
+
+        reading = self.thermal_sensor.latest(max_age=self.thermal_sensor.max_age) if user_ids else None
+        self.last_temperature = reading.temperature if reading else None
+
+    def record_event(self, event):
+        log.debug("Attendance event for user %s: %s°C from %d samples (%s)",
+                  event.user_id, event.temperature, event.samples, event.status)
+        # Stamped when the face was first seen, not when the pass closed seconds later
+        first_seen = datetime.fromtimestamp(event.first_seen, timezone.utc).replace(tzinfo=None)
+        self.attendance_sink.record_attendance(event.user_id, event.status, event.temperature, timestamp=first_seen)
+
+    def stop(self):
+        """Emits the passes still open when the camera stops."""
+        with self._fusion_lock:
+            self.fusion.flush(force=True)
+
+    def annotate(self, image, results):
+        """Draws the face boxes plus the temperature or status message."""
+        self.recognizer.draw_results(image, results)
+        if any(result.user is not None for result in results):
+            if self.last_temperature is not None:
+                temp_text = f"Temp: {self.last_temperature:.1f}°C"
+                cv2.putText(image, temp_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        elif not len(self.recognizer.gallery):
+            cv2.putText(image, "No known faces loaded!", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        elif not results:
+            cv2.putText(image, "No face detected", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 255), 2)
+        return image
+
+def build_scanner_pipeline(app, recognizer, thermal_sensor, attendance_sink, scheduler, camera):
+    """
+    Creates (but does not start) the recognition pipeline for one camera.
+
+    Its frames are recognized by the shared ``scheduler``. With in-process
+    recognition each camera gets its own tracker, and since tracking is
+    sequential, at most one of its frames is recognized at a time.
+    """
+    config = app.config
+    tracker_options = None
+    if recognizer.executor is None:  # the tracker detects in-process
+        tracker_options = dict(
+            detect_every=config['TRACKER_DETECT_EVERY'],
+            vote_window=config['TRACKER_VOTE_WINDOW'],
+            min_votes=config['TRACKER_MIN_VOTES'],
+            box_tracker=config['TRACKER_BOX_TRACKER'],
+            verify_every=config['TRACKER_VERIFY_EVERY'])
+    thermal_sensor.start()
+    fusion_options = dict(
+        window=config['FUSION_WINDOW'],
+        pass_gap=config['FUSION_PASS_GAP'],
+        max_pass=config['FUSION_MAX_PASS'],
+        top_n=config['FUSION_TOP_N'],
+        anomaly_threshold=config['ANOMALY_THRESHOLD'])
+    attendance_sink.start()
+    scanner = ScannerService(recognizer, thermal_sensor, attendance_sink, tracker_options, fusion_options,
+                             strategy=DetectionStrategy.from_config(config, camera.id))
+    return FramePipeline(
+        app, camera.source,
+        recognize=scanner.recognize,
+        on_results=scanner.record,
+        annotate=scanner.annotate,
+        on_stop=scanner.stop,
+        queue_size=config['PIPELINE_QUEUE_SIZE'],
+        profiles=parse_profiles(config['STREAM_PROFILES']),
+        change_threshold=config['STREAM_CHANGE_THRESHOLD'],
+        scheduler=scheduler,
+        name=camera.id,
+        weight=camera.weight,
+        max_in_flight=1 if scanner.tracker is not None else None,
+        open_capture=partial(open_capture, realtime=config['CAMERA_FILE_REALTIME'], loop=config['CAMERA_FILE_LOOP'],
+                             fps=config['CAMERA_FILE_FPS'] or None))
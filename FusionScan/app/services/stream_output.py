@@ -0,0 +1,183 @@
+from collections import deque, namedtuple
+import logging
+import threading
+import time
+import numpy as np
+from app.services.metrics import JPEG_ENCODE_SECONDS
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+log = logging.getLogger(__name__)
+
+# quality is the JPEG quality (1-100); scale the output size relative to the camera frame
+OutputProfile = namedtuple('OutputProfile', ['name', 'quality', 'scale'])
+
+# part is the complete multipart chunk (boundary, headers, JPEG, CRLF), shared by every viewer;
+# jpeg is a zero-copy view of the JPEG inside it
+EncodedFrame = namedtuple('EncodedFrame', ['seq', 'part', 'jpeg'])
+
+BOUNDARY = b'frame'
+
+def parse_profiles(spec):
+    """
+    'high=80:1,medium=70:0.5,low=50:0.25' -> [OutputProfile, ...]; the first is the default.
+
+    Each entry is name=quality:scale, with quality 1-100 and 0 < scale <= 1.
+    """
+    profiles = []
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        try:
+            name, settings = item.split('=', 1)
+            quality, scale = settings.split(':')
+            profile = OutputProfile(name.strip(), int(quality), float(scale))
+        except ValueError:
+            raise ValueError(f"Invalid stream profile '{item}', expected name=quality:scale")
+        if not (1 <= profile.quality <= 100 and 0 < profile.scale <= 1):
+            raise ValueError(f"Invalid stream profile '{item}': quality must be 1-100 and scale in (0, 1]")
+        profiles.append(profile)
+    if not profiles:
+        raise ValueError('At least one stream profile must be configured')
+    return profiles
+
+def multipart_part(jpeg):
+    """
+    Wraps an encoded JPEG (any buffer, e.g. cv2.imencode's array) in one multipart chunk.
+
+    The chunk is assembled with a single copy straight from the encoder's
+    buffer; WSGI servers need bytes, so this is the one copy per frame.
+
+    Returns:
+        tuple: (part bytes, memoryview of the JPEG inside it)
+    """
+    jpeg = memoryview(jpeg).cast('B')
+    header = b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % (BOUNDARY, jpeg.nbytes)
+    part = b''.join((header, jpeg, b'\r\n'))
+    return part, memoryview(part)[len(header):len(header) + jpeg.nbytes]
+
+class ProfileStats:
+    """Encode time and output rate of one profile."""
+
+    def __init__(self, window=5.0):
+        self.window = window
+        self.frames = 0
+        self.unchanged = 0
+        self.encode_seconds = 0.0
+        self.bytes = 0
+        self._first = None
+        self._recent = deque()  # (monotonic time, bytes)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, size):
+        now = time.monotonic()
+        with self._lock:
+            if self._first is None:
+                self._first = now
+            self.frames += 1
+            self.encode_seconds += seconds
+            self.bytes += size
+            self._recent.append((now, size))
+            while self._recent and now - self._recent[0][0] > self.window:
+                self._recent.popleft()
+
+    def skip(self):
+        with self._lock:
+            self.unchanged += 1
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            recent = [size for t, size in self._recent if now - t <= self.window]
+            span = min(self.window, now - self._first) if self._first is not None else self.window
+            return {
+                'frames': self.frames,
+                'unchanged': self.unchanged,
+                'avg_encode_ms': self.encode_seconds * 1000.0 / self.frames if self.frames else 0.0,
+                'avg_frame_bytes': self.bytes / self.frames if self.frames else 0,
+                'bytes_per_second': sum(recent) / max(span, 1e-3),
+            }
+
+class StreamOutput:
+    """
+    The MJPEG output stage of a FramePipeline.
+
+    Each annotated frame is encoded at most once per profile, and only for
+    profiles someone is watching. Frames that look the same as the last one
+    shown (the largest change on a small grayscale thumbnail is at most
+    ``change_threshold`` levels) are not encoded or sent again. Every viewer
+    of a profile gets the same EncodedFrame.
+    """
+
+    def __init__(self, profiles, change_threshold=4.0, thumbnail=(80, 60)):
+        self.profiles = {profile.name: profile for profile in profiles}
+        self.default = profiles[0].name
+        self.change_threshold = change_threshold
+        self.thumbnail = thumbnail
+        self.stats = {name: ProfileStats() for name in self.profiles}
+        self._encode_seconds = {name: JPEG_ENCODE_SECONDS.labels(name) for name in self.profiles}
+        self._reference = None
+        self._shown_seq = -1
+        self._encoded = {}  # profile name -> EncodedFrame of the frame last shown
+
+    def resolve(self, name=None):
+        """The profile name to use for ``name`` (None = default); raises KeyError for unknown names."""
+        name = name or self.default
+        if name not in self.profiles:
+            raise KeyError(name)
+        return name
+
+    def latest(self, name=None):
+        return self._encoded.get(name or self.default)
+
+    def _changed(self, image):
+        """Whether ``image`` differs visibly from the last frame shown; updates the reference if so."""
+        if self.change_threshold is None or self.change_threshold < 0:
+            return True
+        thumb = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), self.thumbnail, interpolation=cv2.INTER_AREA)
+        if self._reference is not None:
+            difference = cv2.absdiff(thumb, self._reference)
+            if float(np.max(difference)) <= self.change_threshold:
+                return False
+        self._reference = thumb
+        return True
+
+    def encode(self, seq, image, active):
+        """
+        Encodes an annotated frame for the profiles in ``active``.
+
+        A profile is skipped when its latest encoding already shows an
+        unchanged frame; a profile without one (just subscribed) is encoded
+        either way.
+
+        Returns:
+            dict: {profile name: EncodedFrame} for the profiles encoded.
+        """
+        if self._changed(image):
+            self._shown_seq = seq
+        encoded = {}
+        for name in active:
+            profile = self.profiles[name]
+            previous = self._encoded.get(name)
+            if previous is not None and previous.seq >= self._shown_seq:
+                self.stats[name].skip()
+                continue
+            start = time.perf_counter()
+            output = image
+            if profile.scale != 1.0:
+                output = cv2.resize(image, (0, 0), fx=profile.scale, fy=profile.scale, interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', output, [cv2.IMWRITE_JPEG_QUALITY, profile.quality])
+            if not ret:
+                log.warning("Error encoding frame to JPEG for profile %s.", name)
+                continue
+            part, jpeg = multipart_part(buffer)
+            seconds = time.perf_counter() - start
+            self._encode_seconds[name].observe(seconds)
+            self.stats[name].record(seconds, len(part))
+            encoded[name] = self._encoded[name] = EncodedFrame(seq, part, jpeg)
+        return encoded
+
+    def snapshot(self):
+        return {name: dict(stats.snapshot(), quality=self.profiles[name].quality, scale=self.profiles[name].scale)
+                for name, stats in self.stats.items()}
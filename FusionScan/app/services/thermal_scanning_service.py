@@ -1,40 +1,211 @@
-import serial
+from bisect import bisect_left, bisect_right
+from collections import deque, namedtuple
+import logging
+import math
+import threading
 import time
+import serial
+from app.services.metrics import SERIAL_ERRORS, SERIAL_READ_SECONDS
 
-def get_temperature_from_arduino():
+log = logging.getLogger(__name__)
+
+ThermalReading = namedtuple('ThermalReading', ['timestamp', 'temperature'])
+
+class ThermalSensor:
     """
-    Reads the temperature from an MLX90614 sensor connected to an Arduino via serial.
+    Long-lived connection to the MLX90614 sensor on the Arduino.
 
-    Returns:
-        float: The temperature in Celsius, or None if an error occurred.
+    A background thread keeps one serial connection open, requests a reading
+    every ``interval`` seconds and stores it with its timestamp in a ring
+    buffer of ``buffer_size`` samples. Callers never touch the port: latest()
+    and nearest() only look at the buffer. If the port fails, the sampler
+    closes it and reconnects after ``reconnect_delay`` seconds.
+
+    Args:
+        port: Serial port name or a pyserial URL (e.g. 'COM11', '/dev/ttyACM0',
+            'socket://host:port'). 'fake' uses FakeArduinoSerial; 'fake:<file>'
+            plays the readings in a script file (see fake_serial.load_script)
+            over and over.
+        max_age: Readings older than this many seconds are considered stale
+            by get_temperature_from_arduino.
+        serial_factory: Optional callable(port, baudrate, timeout) returning a
+            serial-like object; overrides the port lookup.
+        event_bus: Optional EventBus that gets a 'temperature' event at most
+            every ``publish_interval`` seconds.
     """
-    try:
-        # Configure the serial port
-        ser = serial.Serial('COM11', 9600, timeout=2)  # Replace 'COM11' with your Arduino's port
 
-        time.sleep(2)  # Allow time for the Arduino to initialize
+    def __init__(self, port='COM11', baudrate=9600, interval=0.2, buffer_size=600,
+                 timeout=2, reset_delay=2.0, reconnect_delay=1.0, max_age=2.0, serial_factory=None,
+                 event_bus=None, publish_interval=1.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.interval = interval
+        self.timeout = timeout
+        self.reset_delay = reset_delay
+        self.reconnect_delay = reconnect_delay
+        self.max_age = max_age
+        if serial_factory is None:
+            if port == 'fake' or port.startswith('fake:'):
+                from app.services.fake_serial import fake_serial_factory, load_script
+                script_path = port.partition(':')[2]
+                options = dict(script=load_script(script_path), loop=True) if script_path else {}
+                serial_factory = fake_serial_factory(**options)
+                self.reset_delay = 0.0
+            else:
+                serial_factory = serial.serial_for_url
+        self.serial_factory = serial_factory
+        self.event_bus = event_bus
+        self.publish_interval = publish_interval
+        self._last_published = 0.0
+        self.connected = False
+        self.errors = 0
+        self.bad_reads = 0
+        self.reconnects = 0
+        self._readings = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._serial = None
 
-        # Send a command to the Arduino to request the temperature
-        ser.write(b'T')  # Send 'T' to request temperature
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
 
-        # Read the temperature from the serial port
-        line = ser.readline().decode('utf-8').strip()
+    def start(self):
+        """Starts the sampler thread; calling it again while running is a no-op."""
+        with self._lock:
+            if self.running:
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='thermal-sampler', daemon=True)
+            self._thread.start()
+        return self
 
-        # Check if the response is valid
-        if line:
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout if timeout is not None else self.timeout + 1)
+        self._disconnect()
+
+    def _connect(self):
+        self._serial = self.serial_factory(self.port, baudrate=self.baudrate, timeout=self.timeout)
+        if self.reset_delay:
+            self._stop.wait(self.reset_delay)  # The Arduino resets when the port opens
+        self.connected = True
+
+    def _disconnect(self):
+        ser, self._serial = self._serial, None
+        self.connected = False
+        if ser is not None:
             try:
-                temperature = float(line)
-                return temperature
-            except ValueError:
-                print(f"Error: Invalid temperature reading from Arduino: '{line}'")
-                return None
-        else:
-            print("Error: No temperature reading received from Arduino.")
+                ser.close()
+            except Exception:
+                pass
+
+    def _read_once(self):
+        with SERIAL_READ_SECONDS.time():
+            self._serial.write(b'T')
+            line = self._serial.readline().decode('utf-8', errors='replace').strip()
+        if not line:
+            return None
+        try:
+            temperature = float(line)
+        except ValueError:
+            temperature = math.nan
+        # float() also accepts 'nan' and 'inf', which is what the sensor library sends for a failed read
+        if not math.isfinite(temperature):
+            self.bad_reads += 1
+            SERIAL_ERRORS.inc()
+            log.debug("Invalid temperature reading from Arduino: '%s'", line)
             return None
+        return temperature
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self._serial is None:
+                    self._connect()
+                temperature = self._read_once()
+                if temperature is not None:
+                    self.add_reading(temperature)
+            except (serial.SerialException, OSError) as e:
+                self.errors += 1
+                SERIAL_ERRORS.inc()
+                # Warn when the connection is lost, not on every retry while the sensor stays unplugged
+                level = logging.WARNING if self.connected or not self.reconnects else logging.DEBUG
+                log.log(level, "Serial connection to %s failed: %s", self.port, e)
+                self._disconnect()
+                self.reconnects += 1
+                self._stop.wait(self.reconnect_delay)
+                continue
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+        self._disconnect()
+
+    def add_reading(self, temperature, timestamp=None):
+        """Stores a sample; normally only called by the sampler thread."""
+        reading = ThermalReading(time.time() if timestamp is None else timestamp, temperature)
+        with self._lock:
+            self._readings.append(reading)
+        if self.event_bus is not None and reading.timestamp - self._last_published >= self.publish_interval:
+            self._last_published = reading.timestamp
+            from app.services.event_bus import temperature_event
+            self.event_bus.publish('temperature', temperature_event(reading))
+        return reading
 
-    except serial.SerialException as e:
-        print(f"Error: Could not open serial port: {e}")
-        return None
-    finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
\ No newline at end of file
+    def latest(self, max_age=None):
+        """Returns the newest ThermalReading, or None if there is none (or it is older than max_age)."""
+        with self._lock:
+            reading = self._readings[-1] if self._readings else None
+        if reading is None or (max_age is not None and time.time() - reading.timestamp > max_age):
+            return None
+        return reading
+
+    def nearest(self, timestamp, max_skew=None):
+        """Returns the reading closest in time to ``timestamp``, or None if none is within max_skew."""
+        with self._lock:
+            readings = list(self._readings)
+        if not readings:
+            return None
+        i = bisect_left(readings, timestamp, key=lambda r: r.timestamp)
+        candidates = readings[max(0, i - 1):i + 1]
+        reading = min(candidates, key=lambda r: abs(r.timestamp - timestamp))
+        if max_skew is not None and abs(reading.timestamp - timestamp) > max_skew:
+            return None
+        return reading
+
+    def readings(self, start, end):
+        """Returns every reading with start <= timestamp <= end, oldest first."""
+        with self._lock:
+            readings = list(self._readings)
+        lo = bisect_left(readings, start, key=lambda r: r.timestamp)
+        hi = bisect_right(readings, end, key=lambda r: r.timestamp)
+        return readings[lo:hi]
+
+    def stats(self):
+        latest = self.latest()
+        return {
+            'port': self.port,
+            'connected': self.connected,
+            'running': self.running,
+            'samples': len(self._readings),
+            'errors': self.errors,
+            'bad_reads': self.bad_reads,
+            'reconnects': self.reconnects,
+            'latest': latest.temperature if latest else None,
+            'latest_age_s': time.time() - latest.timestamp if latest else None,
+        }
+
+def get_temperature_from_arduino():
+    """
+    Returns the latest temperature from the shared thermal sensor.
+
+    Kept for existing callers; it never blocks on the serial port.
+
+    Returns:
+        float: The temperature in Celsius, or None if no fresh reading is available.
+    """
+    from app import thermal_sensor
+    thermal_sensor.start()
+    reading = thermal_sensor.latest(max_age=thermal_sensor.max_age)
+    return reading.temperature if reading else None
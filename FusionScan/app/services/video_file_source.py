@@ -0,0 +1,65 @@
+import os
+import time
+from app.utils.lazy_import import lazy_import
+
+cv2 = lazy_import('cv2')
+
+class VideoFileCapture:
+    """
+    A video file that plays like a live camera.
+
+    cv2.VideoCapture hands out a file's frames as fast as they can be
+    decoded, so a file camera used to race through its recording in a few
+    seconds. This wrapper delivers frame i no earlier than i / ``fps``
+    seconds after the first read (the file's own rate by default) and can
+    start over at the end instead of failing. Frames are never skipped, so
+    every run over the same file sees the same frames in the same order,
+    which is what the replay benchmark relies on.
+
+    Has the read()/get()/isOpened()/release() subset of cv2.VideoCapture
+    FramePipeline uses.
+    """
+
+    def __init__(self, path, fps=None, loop=False):
+        self.path = path
+        self.loop = loop
+        self._capture = cv2.VideoCapture(path)
+        self.fps = fps or self._capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frames = 0
+        self.loops = 0
+        self._started = None
+
+    def isOpened(self):
+        return self._capture.isOpened()
+
+    def get(self, prop):
+        return self._capture.get(prop)
+
+    def read(self):
+        success, image = self._capture.read()
+        if not success and self.loop and self.frames:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, image = self._capture.read()
+            self.loops += 1
+        if not success:
+            return False, None
+        if self._started is None:
+            self._started = time.monotonic()
+        else:
+            delay = self._started + self.frames / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.frames += 1
+        return True, image
+
+    def release(self):
+        self._capture.release()
+
+def open_capture(source, realtime=True, loop=False, fps=None):
+    """
+    Opens a camera source: a VideoFileCapture for existing video files when
+    ``realtime`` is on, otherwise cv2.VideoCapture (device index or URL).
+    """
+    if realtime and isinstance(source, str) and os.path.isfile(source):
+        return VideoFileCapture(source, fps=fps, loop=loop)
+    return cv2.VideoCapture(source)
@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+class Warmup:
+    """
+    Runs the app's slow start-up tasks (gallery load, model load) once.
+
+    Tasks run in order, inside an app context, either inline (start with
+    ``background=False``) or in a daemon thread so the app can serve requests
+    while they run. status() backs the readiness endpoint.
+    """
+
+    def __init__(self, app, tasks):
+        """
+        Args:
+            app: The Flask app.
+            tasks: Sequence of (name, callable) pairs.
+        """
+        self.app = app
+        self.tasks = list(tasks)
+        self._lock = threading.Lock()
+        self._started = False
+        self._thread = None
+        self._state = {name: {'state': 'pending', 'seconds': None, 'error': None} for name, _ in self.tasks}
+
+    def start(self, background=True):
+        """Starts the tasks unless they already ran or are running; cheap to call on every request."""
+        if self._started:
+            return self
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        if background:
+            self._thread = threading.Thread(target=self._run, name='warmup', daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+        return self
+
+    def _run(self):
+        with self.app.app_context():
+            for name, task in self.tasks:
+                state = self._state[name]
+                state['state'] = 'running'
+                start = time.perf_counter()
+                try:
+                    task()
+                    state['state'] = 'done'
+                except Exception as e:
+                    state['state'] = 'failed'
+                    state['error'] = str(e)
+                    log.error("Warm-up task '%s' failed: %s", name, e)
+                state['seconds'] = round(time.perf_counter() - start, 3)
+
+    @property
+    def ready(self):
+        return all(state['state'] == 'done' for state in self._state.values())
+
+    def wait(self, timeout=None):
+        """Blocks until the background tasks finish. Returns ``ready``."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'started': self._started,
+            'tasks': {name: dict(state) for name, state in self._state.items()},
+        }
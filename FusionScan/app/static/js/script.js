@@ -4,15 +4,16 @@ document.addEventListener('DOMContentLoaded', function() {
     cameraSelect.id = 'cameraSelect';
     document.body.appendChild(cameraSelect); // Or append to a specific container
 
-    navigator.mediaDevices.enumerateDevices()
-        .then(function(devices) {
-            devices.forEach(function(device) {
-                if (device.kind === 'videoinput') {
-                    const option = document.createElement('option');
-                    option.value = device.deviceId;
-                    option.text = device.label || `Camera ${cameraSelect.length + 1}`;
-                    cameraSelect.appendChild(option);
-                }
+    // The cameras are the server's (see CAMERAS), not this browser's devices
+    fetch('/cameras')
+        .then(response => response.json())
+        .then(data => {
+            data.cameras.forEach(function(camera) {
+                const option = document.createElement('option');
+                option.value = camera.id;
+                option.text = camera.id;
+                option.selected = camera.id === data.selected;
+                cameraSelect.appendChild(option);
             });
 
             // Handle camera changes
@@ -20,7 +21,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const selectedCameraId = this.value;
                 console.log('Selected camera ID:', selectedCameraId);
 
-                // Send the selected camera ID to the Flask backend
+                // Remember the choice on the server and switch the feeds on this page
                 fetch('/update_camera', {
                     method: 'POST',
                     headers: {
@@ -32,9 +33,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (!response.ok) {
                         throw new Error('Network response was not ok');
                     }
-                    console.log('Camera ID updated on the server');
-                    // Reload the video feed or update the stream (implementation depends on your approach)
-                    // You might need to stop the current stream and start a new one with the new camera ID
+                    return response.json();
+                })
+                .then(data => {
+                    document.querySelectorAll('img.video-feed').forEach(function(feed) {
+                        // Keep the feed's stream profile (?profile=low) on the new camera
+                        const profile = new URL(feed.src, window.location.href).searchParams.get('profile');
+                        feed.src = data.video_feed + (profile ? '?profile=' + encodeURIComponent(profile) : '');
+                    });
                 })
                 .catch(error => {
                     console.error('Error updating camera:', error);
@@ -43,25 +49,61 @@ document.addEventListener('DOMContentLoaded', function() {
 
         })
         .catch(function(err) {
-            console.error('Error accessing media devices.', err);
+            console.error('Error loading cameras.', err);
         });
 
-    // --- Temperature Display ---
-    function updateTemperature() {
-        fetch('/get_temperature')
-            .then(response => response.json())
-            .then(data => {
-                const temperatureElement = document.getElementById('temperatureDisplay');
-                if (temperatureElement) {
-                    if (data.error) {
-                        temperatureElement.textContent = `Temperature: Error`;
-                    } else {
-                        temperatureElement.textContent = `Temperature: ${data.temperature}°C`;
-                    }
-                }
-            })
-            .catch(error => console.error('Error fetching temperature:', error));
+    // --- Live Updates ---
+    // The server pushes temperature readings and attendance changes; the browser reconnects
+    // on its own and resumes after the last event it saw (Last-Event-ID)
+    const temperatureElement = document.getElementById('temperatureDisplay');
+    const attendanceTable = document.getElementById('attendanceTable');
+    if (!temperatureElement && !attendanceTable) {
+        return;
     }
+    const cursor = attendanceTable ? attendanceTable.dataset.eventCursor : '';
+    const events = new EventSource('/events' + (cursor ? '?cursor=' + encodeURIComponent(cursor) : ''));
+
+    events.addEventListener('temperature', function(event) {
+        const data = JSON.parse(event.data);
+        if (temperatureElement) {
+            if (data.temperature === null) {
+                temperatureElement.textContent = `Temperature: --°C`;
+            } else {
+                temperatureElement.textContent = `Temperature: ${data.temperature}°C`;
+            }
+        }
+    });
+
+    events.addEventListener('attendance', function(event) {
+        if (!attendanceTable) {
+            return;
+        }
+        JSON.parse(event.data).rows.forEach(function(row) {
+            // Only users on this page of the table are shown
+            const tableRow = attendanceTable.querySelector(`tr[data-user-id="${row.user_id}"]`);
+            if (tableRow) {
+                tableRow.querySelector('.attendance-status').textContent = row.status;
+                tableRow.querySelector('.attendance-temperature').textContent = row.temperature === null ? 'N/A' : `${row.temperature}°C`;
+                tableRow.querySelector('.attendance-timestamp').textContent = row.timestamp;
+            }
+        });
+    });
+
+    events.addEventListener('user_deleted', function(event) {
+        const userId = JSON.parse(event.data).user_id;
+        const tableRow = attendanceTable && attendanceTable.querySelector(`tr[data-user-id="${userId}"]`);
+        if (tableRow) {
+            tableRow.remove();
+        }
+    });
+
+    events.addEventListener('reset', function() {
+        // Attendance was cleared, or we were away too long to catch up
+        events.close();
+        window.location.reload();
+    });
 
-    setInterval(updateTemperature, 1000); // Update every 1 second
-});
\ No newline at end of file
+    window.addEventListener('beforeunload', function() {
+        events.close();
+    });
+});
\ No newline at end of file
@@ -0,0 +1,39 @@
+import os
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+def try_lock(path):
+    """
+    Takes an exclusive lock on ``path`` (created if missing) without waiting.
+
+    The lock lasts until unlock() or until the process exits, however it
+    exits, so a lock file that can be locked tells that its owner is gone.
+
+    Returns:
+        file: The open, locked file, or None if another process holds the lock.
+    """
+    handle = open(path, 'a+b')
+    try:
+        if os.name == 'nt':
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def unlock(handle):
+    """Releases a lock taken by try_lock() and closes its file."""
+    try:
+        if os.name == 'nt':
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        handle.close()
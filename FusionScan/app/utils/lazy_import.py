@@ -0,0 +1,46 @@
+import importlib
+import sys
+import threading
+import types
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Lets heavy dependencies (face_recognition with dlib's models, cv2) be
+    named at the top of a file without paying for them until they are used,
+    so CLI commands and the login page never load them. After the import,
+    the real module's attributes are copied onto the stand-in, so later
+    lookups cost the same as on the module itself.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__.update(
+                        (key, value) for key, value in module.__dict__.items() if not key.startswith('__'))
+                    self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name):
+    """Returns the module if it is already imported, otherwise a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+def is_loaded(name):
+    """True once ``name`` has really been imported (by anyone)."""
+    return name in sys.modules
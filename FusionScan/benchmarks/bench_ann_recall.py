@@ -0,0 +1,61 @@
+"""
+Recall and latency of the IVF matching backend against exact search.
+
+For every gallery size and nprobe setting, reports recall@1 (the IVF top
+user agrees with the exact top user), p50/p99 single-face query latency and
+the index build time.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_ann_recall [--sizes 10000 50000 250000] [--nprobe 4 8 16 32]
+"""
+import argparse
+import time
+import numpy as np
+from app.services.face_gallery import FaceGallery
+from benchmarks.synthetic import make_entries, make_probes
+
+def _latencies(gallery, probes, **kwargs):
+    results = []
+    samples = []
+    for probe in probes:
+        start = time.perf_counter()
+        results.append(gallery.match(probe[None, :], k=1, **kwargs)[0])
+        samples.append(time.perf_counter() - start)
+    samples = np.asarray(samples) * 1000.0
+    return results, np.percentile(samples, 50), np.percentile(samples, 99)
+
+def _top_ids(results):
+    return np.asarray([r[0].user.id if r else -1 for r in results])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 250000])
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'encodings':>10} {'mode':>10} {'recall@1':>9} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for size in args.sizes:
+        entries, centers = make_entries(size)
+        probes, _ = make_probes(centers, args.queries)
+
+        exact = FaceGallery()
+        start = time.perf_counter()
+        exact.build(entries)
+        build = time.perf_counter() - start
+        exact_results, p50, p99 = _latencies(exact, probes)
+        exact_ids = _top_ids(exact_results)
+        print(f"{len(exact):>10} {'exact':>10} {1.0:>9.3f} {p50:>8.3f} {p99:>8.3f} {build:>8.2f}")
+
+        ivf = FaceGallery(backend='ivf', ivf_nlist=args.nlist, ivf_min_size=0)
+        start = time.perf_counter()
+        ivf.build(entries)
+        build = time.perf_counter() - start
+        for nprobe in args.nprobe:
+            results, p50, p99 = _latencies(ivf, probes, nprobe=nprobe)
+            recall = np.mean(_top_ids(results) == exact_ids)
+            print(f"{len(ivf):>10} {f'ivf/{nprobe}':>10} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f} {build:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Attendance export: the old pandas path (Attendance.query.all(), one
+User.query.get per row, DataFrame, to_excel) versus AttendanceExporter's
+joined, chunked query streamed as CSV and as constant-memory xlsx.
+
+Each export runs in a fresh child process so its peak RSS can be reported.
+The old path is run on a smaller table by default; it grows linearly.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_attendance_export [--rows 1000000] [--legacy-rows 50000] [--users 2000]
+"""
+import argparse
+from datetime import datetime, timedelta
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+
+def make_database(path, rows, users, seed=0):
+    """Creates the app's tables and fills them with synthetic users and attendance."""
+    from app.models import User, Attendance
+    from flask import Flask
+    from app import db
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.engine.dispose()
+
+    rng = random.Random(seed)
+    strands = ['STEM', 'ABM', 'HUMSS', 'GAS', 'TVL']
+    start = datetime(2025, 6, 1, 7, 0, 0)
+    connection = sqlite3.connect(path)
+    connection.executemany(
+        f'INSERT INTO {User.__tablename__} (id, username, email, student_lrn, strand, is_admin) '
+        'VALUES (?, ?, ?, ?, ?, 0)',
+        ((i, f'student{i}', f'student{i}@example.com', f'{i:012d}', strands[i % len(strands)])
+         for i in range(1, users + 1)))
+    connection.executemany(
+        f'INSERT INTO {Attendance.__tablename__} (user_id, timestamp, status, temperature) VALUES (?, ?, ?, ?)',
+        ((rng.randint(1, users),
+          (start + timedelta(seconds=i * 15)).isoformat(sep=' '),
+          'Present' if i % 50 else 'Anomaly',
+          round(rng.uniform(35.8, 38.0), 1))
+         for i in range(rows)))
+    connection.commit()
+    connection.close()
+
+def make_app(path):
+    from flask import Flask
+    from app import db
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def export_legacy(app, output):
+    import pandas as pd
+    from app.models import User, Attendance
+    with app.app_context():
+        data = []
+        for record in Attendance.query.all():
+            user = User.query.get(record.user_id)
+            data.append({
+                'Timestamp': record.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'Username': user.username if user else 'Unknown',
+                'LRN': user.student_lrn if user else 'N/A',
+                'Status': record.status,
+                'Temperature': record.temperature
+            })
+        df = pd.DataFrame(data)
+        df.sort_values(by='Timestamp', ascending=False, inplace=True)
+        df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+        df['Timestamp'] = df['Timestamp'].dt.strftime('%Y-%m-%d %I:%M:%S %p')
+        df = df[['Timestamp', 'Username', 'LRN', 'Status', 'Temperature']]
+        df.to_excel(output + '.xlsx', index=False, engine='xlsxwriter')
+        return len(df)
+
+def export_csv(app, output):
+    from app.services.export_service import AttendanceExporter
+    with app.app_context(), open(output + '.csv', 'w', encoding='utf-8', newline='') as out:
+        for chunk in AttendanceExporter().iter_csv():
+            out.write(chunk)
+
+def export_xlsx(app, output):
+    from app.services.export_service import AttendanceExporter
+    with app.app_context(), open(output + '.xlsx', 'wb') as out:
+        for chunk in AttendanceExporter().iter_xlsx():
+            out.write(chunk)
+
+MODES = {'legacy': export_legacy, 'csv': export_csv, 'xlsx': export_xlsx}
+
+def _child(mode, path, output, results):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    app = make_app(path)
+    start = time.perf_counter()
+    MODES[mode](app, output)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((elapsed, baseline, peak, os.path.getsize(output + ('.csv' if mode == 'csv' else '.xlsx'))))
+
+def run(mode, path, output):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_child, args=(mode, path, output, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--legacy-rows', type=int, default=50_000, help='0 to skip the old path')
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = []
+        if args.legacy_rows:
+            cases.append(('legacy', args.legacy_rows))
+        cases += [('csv', args.rows), ('xlsx', args.rows)]
+        databases = {}
+        print(f"{'export':<8} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'peak RSS MB':>12} {'growth MB':>10} {'file MB':>8}")
+        for mode, rows in cases:
+            if rows not in databases:
+                databases[rows] = os.path.join(tmp, f'attendance_{rows}.db')
+                make_database(databases[rows], rows, args.users)
+            elapsed, baseline, peak, size = run(mode, databases[rows], os.path.join(tmp, f'export_{mode}'))
+            # ru_maxrss is in KB on Linux
+            print(f"{mode:<8} {rows:>9} {elapsed:>9.2f} {rows / elapsed:>10.0f} {peak / 1024:>12.1f} "
+                  f"{(peak - baseline) / 1024:>10.1f} {size / 2 ** 20:>8.1f}")
+
+if __name__ == '__main__':
+    main()
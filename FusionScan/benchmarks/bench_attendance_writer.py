@@ -0,0 +1,83 @@
+"""
+Attendance write throughput: DataService.record_attendance (SELECT + INSERT +
+commit per event) versus the write-behind AttendanceWriter, on a scratch
+SQLite database in rollback-journal and WAL mode.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_attendance_writer [--events 2000] [--users 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+from flask import Flask
+from sqlalchemy import event
+from app import db, _enable_sqlite_wal
+from app.models import User, Attendance
+from app.services.attendance_writer import AttendanceWriter
+from app.services.data_service import DataService
+
+def make_app(path, wal, users):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    with app.app_context():
+        if wal:
+            event.listen(db.engine, 'connect', _enable_sqlite_wal)
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'username': f'student{i}', 'email': f'student{i}@example.com', 'student_lrn': f'{i:012d}'}
+            for i in range(1, users + 1)
+        ])
+        db.session.commit()
+    return app
+
+def run_legacy(app, events):
+    service = DataService()
+    with app.app_context():
+        start = time.perf_counter()
+        for user_id in events:
+            service.record_attendance(user_id, 'Present', 36.5)
+        return time.perf_counter() - start
+
+def run_writer(app, events, journal, batch_size):
+    writer = AttendanceWriter(app, journal, batch_size=batch_size, flush_interval=0.5, dedup_seconds=0)
+    writer.start()
+    start = time.perf_counter()
+    for user_id in events:
+        writer.record_attendance(user_id, 'Present', 36.5)
+    enqueue = time.perf_counter() - start
+    writer.stop()
+    total = time.perf_counter() - start
+    return enqueue, total
+
+def count_rows(app):
+    with app.app_context():
+        return db.session.query(Attendance).count()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    # Users in round-robin; keep --users >= --events so the 5-second dedup doesn't drop any
+    events = [(i % args.users) + 1 for i in range(args.events)]
+
+    print(f"{'path':<28} {'events/s':>10} {'caller us/event':>16} {'rows':>6}")
+    for wal in (False, True):
+        mode = 'WAL' if wal else 'rollback'
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(os.path.join(tmp, 'legacy.db'), wal, args.users)
+            elapsed = run_legacy(app, events)
+            print(f"{f'record_attendance ({mode})':<28} {len(events) / elapsed:>10.0f} "
+                  f"{elapsed * 1e6 / len(events):>16.1f} {count_rows(app):>6}")
+
+            app = make_app(os.path.join(tmp, 'writer.db'), wal, args.users)
+            enqueue, total = run_writer(app, events, os.path.join(tmp, 'attendance.journal'), args.batch_size)
+            print(f"{f'AttendanceWriter ({mode})':<28} {len(events) / total:>10.0f} "
+                  f"{enqueue * 1e6 / len(events):>16.1f} {count_rows(app):>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Detection latency and detection rate of each DetectionStrategy on a recording.
+
+Every strategy runs detect_and_encode over the same in-memory frames. Faces
+found at full resolution (scale 1.0, no region of interest) are the
+reference: recall is the share of reference faces a strategy also finds
+(IoU >= 0.3). With --recognize, faces are also matched against the
+application's gallery and the recognized share is reported.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_detection_strategies gate.mp4 [--frames 300] [--roi 0.25:0:0.75:1] [--recognize]
+"""
+import argparse
+import time
+import numpy as np
+import cv2
+from app.services.detection_strategy import DetectionStrategy, box_iou, parse_roi
+from app.services.face_recognition_service import FaceRecognitionService
+
+def load_frames(path, count):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    frames = []
+    while len(frames) < count:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+def strategies(roi):
+    yield 'scale 0.25', dict(scale=0.25)
+    yield 'scale 0.5', dict(scale=0.5)
+    if roi:
+        yield 'roi 0.25', dict(scale=0.25, roi=roi)
+        yield 'roi 0.5', dict(scale=0.5, roi=roi)
+    yield 'refine 0.25', dict(scale=0.25, refine=True)
+    yield 'auto', dict(auto_scale=True, roi=roi)
+    yield 'auto+refine', dict(auto_scale=True, roi=roi, refine=True)
+
+def run(service, frames, options, recognize=False):
+    strategy = DetectionStrategy(**options)
+    latencies, found, recognized = [], [], 0
+    for frame in frames:
+        start = time.perf_counter()
+        boxes, encodings = service.detect_and_encode(frame, strategy)
+        if recognize and boxes:
+            recognized += sum(result.user is not None for result in service.match_faces(boxes, encodings))
+        latencies.append(time.perf_counter() - start)
+        found.append(boxes)
+    return np.array(latencies) * 1e3, found, recognized, strategy
+
+def recall(found, reference):
+    hits = total = 0
+    for boxes, expected in zip(found, reference):
+        total += len(expected)
+        hits += sum(any(box_iou(box, other) >= 0.3 for other in boxes) for box in expected)
+    return hits / total if total else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--roi', type=parse_roi, help='scanner region x0:y0:x1:y1 (frame fractions)')
+    parser.add_argument('--recognize', action='store_true', help="also match against the app's gallery")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    if args.recognize:
+        from app import create_app
+        import app as application
+        context = create_app().app_context()
+        context.push()
+        service = application.face_recognition_service
+        service.ensure_loaded()
+    else:
+        service = FaceRecognitionService()
+    service.warm_up()
+
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    reference_ms, reference, reference_recognized, _ = run(service, frames, dict(scale=1.0), args.recognize)
+    faces = sum(len(boxes) for boxes in reference)
+    print(f"{'strategy':<13} {'mean ms':>8} {'p95 ms':>7} {'faces':>6} {'recall':>7} {'recognized':>11} {'final scale':>12}")
+    rows = [('full res', reference_ms, reference, reference_recognized, 1.0)]
+    for name, options in strategies(args.roi):
+        latencies, found, recognized, strategy = run(service, frames, options, args.recognize)
+        rows.append((name, latencies, found, recognized, strategy.scale))
+    for name, latencies, found, recognized, scale in rows:
+        count = sum(len(boxes) for boxes in found)
+        print(f"{name:<13} {latencies.mean():>8.1f} {np.percentile(latencies, 95):>7.1f} {count:>6} "
+              f"{recall(found, reference):>7.2f} "
+              f"{(f'{recognized / count:.2f}' if args.recognize and count else '-'):>11} {scale:>12.3f}")
+    print(f"({faces} reference faces)")
+
+if __name__ == '__main__':
+    main()
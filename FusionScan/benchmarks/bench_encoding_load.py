@@ -0,0 +1,105 @@
+"""
+Gallery load at startup: pickled float64 lists unpickled user by user (the
+old load_known_faces) versus the binary float32 format decoded in bulk by
+FaceGallery.build_from_blobs.
+
+Both read the same users from a scratch SQLite database, each in a fresh
+child process; memory is the tracemalloc peak during the load.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_encoding_load [--users 10000] [--per-user 5]
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+
+def make_app(path):
+    from flask import Flask
+    from app import db
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def make_database(path, users, per_user, legacy):
+    from app import db
+    from app.models import User
+    from app.services.encoding_format import encode_encodings
+    from benchmarks.synthetic import make_entries
+    entries, _ = make_entries(users * per_user, per_user=per_user)
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {
+                'id': user.id, 'username': user.username, 'email': f'{user.username}@example.com',
+                'student_lrn': user.student_lrn,
+                # The old capture loop stored a list of float64 arrays from face_recognition
+                'face_encodings': (pickle.dumps([row.astype('float64') for row in encodings]) if legacy
+                                   else encode_encodings(encodings)),
+            }
+            for user, encodings in entries
+        ])
+        db.session.commit()
+        return db.session.query(db.func.sum(db.func.length(User.face_encodings))).scalar()
+
+def load_legacy(gallery):
+    from app.models import User
+    from app.services.face_gallery import GalleryUser
+    entries = []
+    for user in User.query.all():
+        if user.face_encodings:
+            entries.append((GalleryUser(user.id, user.username, user.student_lrn), pickle.loads(user.face_encodings)))
+    gallery.build(entries)
+
+def load_binary(gallery):
+    from app import db
+    from app.models import User
+    from app.services.face_gallery import GalleryUser
+    rows = (db.session.query(User.id, User.username, User.student_lrn, User.face_encodings)
+            .filter(User.face_encodings.isnot(None)).order_by(User.id).all())
+    gallery.build_from_blobs([(GalleryUser(*row[:3]), row[3]) for row in rows])
+
+def _child(mode, path, results):
+    from app.services.face_gallery import FaceGallery
+    app = make_app(path)
+    gallery = FaceGallery()
+    with app.app_context():
+        tracemalloc.start()
+        start = time.perf_counter()
+        (load_legacy if mode == 'legacy' else load_binary)(gallery)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results.put((elapsed, peak, len(gallery), gallery.user_count))
+
+def run(mode, path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_child, args=(mode, path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--per-user', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'format':<8} {'users':>7} {'encodings':>10} {'load ms':>9} {'peak MB':>9} {'stored MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('legacy', 'binary'):
+            path = os.path.join(tmp, f'{mode}.db')
+            stored = make_database(path, args.users, args.per_user, legacy=mode == 'legacy')
+            elapsed, peak, encodings, users = run(mode, path)
+            print(f"{mode:<8} {users:>7} {encodings:>10} {elapsed * 1e3:>9.1f} {peak / 2 ** 20:>9.1f} "
+                  f"{stored / 2 ** 20:>10.1f}")
+
+if __name__ == '__main__':
+    main()
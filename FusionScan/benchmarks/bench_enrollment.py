@@ -0,0 +1,93 @@
+"""
+Enrollment cost: the old capture loop versus EnrollmentService's
+quality-gated sampling, on the same recording.
+
+The old loop ran the CNN detector on every full frame and, for each centered
+face, encoded a grayscale crop twice (plain, then num_jitters=3) until it had
+--samples encodings. The new path scores one frame every --sample-interval
+seconds of video (HOG at the enrollment detection scale, 5-point landmarks),
+keeps the best crops and encodes them in one jittered call. Wall time and
+process CPU time are reported for each; frames are held in memory.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_enrollment enroll.mp4 [--samples 5] [--fps 30]
+"""
+import argparse
+import time
+import cv2
+import face_recognition
+from app.services.enrollment_service import EnrollmentJob, EnrollmentService
+from app.services.frame_pipeline import Frame
+
+def load_frames(path, count):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    frames = []
+    while len(frames) < count:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+def legacy(frames, samples):
+    """The removed capture loop, minus the camera and drawing."""
+    encodings = frames_used = 0
+    for frame in frames:
+        if encodings >= samples:
+            break
+        frames_used += 1
+        locations = face_recognition.face_locations(frame, model='cnn')
+        if len(locations) != 1:
+            continue
+        top, right, bottom, left = locations[0]
+        height, width = frame.shape[:2]
+        margin_x, margin_y = width // 8, height // 8
+        if not (width // 2 - margin_x < left < width // 2 + margin_x and width // 2 - margin_x < right < width // 2 + margin_x and
+                height // 2 - margin_y < top < height // 2 + margin_y and height // 2 - margin_y < bottom < height // 2 + margin_y):
+            continue
+        gray = cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2GRAY)
+        if face_recognition.face_encodings(gray):
+            encodings += len(face_recognition.face_encodings(gray, num_jitters=3)[:1])
+    return encodings, frames_used
+
+def quality_gated(frames, samples, fps, sample_interval):
+    service = EnrollmentService(None, None, None, samples=samples, sample_interval=sample_interval)
+    job = EnrollmentJob(None, None)
+    kept, frames_used = [], 0
+    step = max(1, round(sample_interval * fps))
+    for seq in range(0, len(frames), step):
+        frames_used += 1
+        sample = service.score_frame(job, Frame(seq, seq / fps, frames[seq]))
+        if sample is not None:
+            kept = sorted(kept + [sample], key=lambda s: s.quality.score, reverse=True)[:samples]
+        if len(kept) == samples and kept[-1].quality.score >= service.good_score and seq / fps >= service.min_seconds:
+            break
+    return len(service.encode_samples(kept)) if kept else 0, frames_used
+
+def measure(run):
+    wall, cpu = time.perf_counter(), time.process_time()
+    encodings, frames_used = run()
+    return time.perf_counter() - wall, time.process_time() - cpu, encodings, frames_used
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=900)
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--fps', type=float, default=30.0, help='frame rate the recording was made at')
+    parser.add_argument('--sample-interval', type=float, default=0.2)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'path':<15} {'wall s':>8} {'cpu s':>8} {'frames':>7} {'encodings':>10}")
+    for name, run in (('capture loop', lambda: legacy(frames, args.samples)),
+                      ('quality-gated', lambda: quality_gated(frames, args.samples, args.fps, args.sample_interval))):
+        wall, cpu, encodings, frames_used = measure(run)
+        print(f"{name:<15} {wall:>8.2f} {cpu:>8.2f} {frames_used:>7} {encodings:>10}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Micro-benchmark for FaceGallery matching.
+
+Reports per-frame match latency at several gallery sizes, comparing the old
+list-of-arrays path (what face_recognition.face_distance does with the
+known_face_encodings list) against the vectorized gallery.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_gallery_match [--sizes 100 1000 10000 100000]
+"""
+import argparse
+import time
+import numpy as np
+from app.services.face_gallery import FaceGallery
+from benchmarks.synthetic import make_entries, make_probes
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.median(samples) * 1000.0
+
+def legacy_match(known_face_encodings, probe):
+    """The pre-gallery path: list -> array conversion plus a norm on every call."""
+    distances = np.linalg.norm(np.array(known_face_encodings) - probe, axis=1)
+    best = np.argmin(distances)
+    return best, distances[best]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--batch', type=int, default=4, help='Faces per frame for the batched match.')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'encodings':>10} {'legacy ms':>10} {'gallery ms':>11} {f'batch{args.batch} ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        entries, centers = make_entries(size)
+        gallery = FaceGallery()
+        gallery.build(entries)
+        known_face_encodings = [row.astype(np.float64) for _, block in entries for row in block]
+        probes, _ = make_probes(centers, args.batch)
+
+        legacy = _time(lambda: legacy_match(known_face_encodings, probes[0]), args.repeat)
+        single = _time(lambda: gallery.match(probes[:1], k=1, tolerance=0.5), args.repeat)
+        batch = _time(lambda: gallery.match(probes, k=1, tolerance=0.5), args.repeat)
+        print(f"{len(gallery):>10} {legacy:>10.3f} {single:>11.3f} {batch:>10.3f} {legacy / single:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Worker startup and memory with the gallery loaded from the database in every
+worker versus mapped from one shared snapshot file.
+
+Starts --workers processes at once (like gunicorn workers). Each loads the
+gallery, runs a batch of matches so every page is touched, waits for the
+others, then reports its startup time and /proc smaps_rollup memory: Pss
+(proportional share, so pages shared by N workers count 1/N) and Private.
+
+Usage (from the FusionScan directory, Linux only):
+    python -m benchmarks.bench_gallery_snapshot [--users 10000] [--workers 4]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from benchmarks.bench_encoding_load import make_app, make_database, load_binary
+
+def memory_kb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values.get('Pss', 0), values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+
+def _worker(mode, db_path, snapshot_path, barrier, lock, results):
+    import numpy as np
+    from app.services.face_gallery import FaceGallery
+    from app.services.gallery_snapshot import open_snapshot
+    # Loads are timed one worker at a time so CPU contention doesn't count
+    with lock:
+        start = time.perf_counter()
+        gallery = FaceGallery()
+        if mode == 'database':
+            app = make_app(db_path)
+            with app.app_context():
+                load_binary(gallery)
+        else:
+            snapshot = open_snapshot(snapshot_path)
+            gallery.build_arrays(snapshot.users, snapshot.encodings, snapshot.counts, sq_norms=snapshot.sq_norms)
+        startup = time.perf_counter() - start
+    gallery.match(np.random.default_rng(0).normal(0.0, 0.06, size=(8, 128)).astype(np.float32))
+    barrier.wait()
+    pss, private = memory_kb()
+    barrier.wait()
+    results.put((startup, pss, private))
+
+def run(mode, workers, db_path, snapshot_path):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    lock = context.Lock()
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, db_path, snapshot_path, barrier, lock, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--per-user', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    from app.services.face_gallery import FaceGallery
+    from app.services.gallery_snapshot import write_snapshot
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'gallery.db')
+        snapshot_path = os.path.join(tmp, 'gallery.snapshot')
+        make_database(db_path, args.users, args.per_user, legacy=False)
+        gallery = FaceGallery()
+        with make_app(db_path).app_context():
+            load_binary(gallery)
+        write_snapshot(snapshot_path, gallery._segment_users, gallery.encodings, gallery._segment_sizes)
+        print(f"{len(gallery)} encodings, {os.path.getsize(snapshot_path) / 2 ** 20:.1f} MB snapshot, "
+              f"{args.workers} workers")
+
+        print(f"{'source':<10} {'startup ms':>11} {'Pss MB/worker':>14} {'Private MB/worker':>18} {'total Pss MB':>13}")
+        for mode in ('database', 'snapshot'):
+            measured = run(mode, args.workers, db_path, snapshot_path)
+            startup = sum(m[0] for m in measured) / len(measured)
+            pss = sum(m[1] for m in measured)
+            private = sum(m[2] for m in measured) / len(measured)
+            print(f"{mode:<10} {startup * 1e3:>11.1f} {pss / len(measured) / 1024:>14.1f} "
+                  f"{private / 1024:>18.1f} {pss / 1024:>13.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Start-up import cost, measured with ``python -X importtime``.
+
+Runs ``import app`` and ``create_app()`` in fresh interpreters (in a scratch
+directory, against a scratch database) and reports the total import time,
+wall time and the heaviest top-level packages. Fails (exit status 1) if a
+module listed in --forbid gets imported by create_app(), or the import time
+exceeds --budget-ms, so it can guard against start-up regressions.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_import_time [--budget-ms 0] [--forbid face_recognition,dlib,cv2,pandas]
+"""
+import argparse
+from collections import defaultdict
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPETS = {
+    'import app': 'import app',
+    'create_app()': 'from app import create_app; create_app()',
+}
+
+# importlib.import_module() (used by lazy imports) doesn't show up in -X importtime, so
+# the loaded modules are also read back from sys.modules
+LIST_MODULES = "\nimport sys; print('\\n'.join(sys.modules))"
+
+SETUP = 'from app import create_app, db\napp = create_app()\nwith app.app_context(): db.create_all()'
+
+def parse_importtime(stderr):
+    """
+    Parses ``-X importtime`` output.
+
+    Returns:
+        tuple: (total microseconds of top-level imports, {top-level package: self microseconds}, set of module names)
+    """
+    total = 0
+    by_package = defaultdict(int)
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        module = name.strip()
+        modules.add(module)
+        by_package[module.split('.')[0]] += int(self_us)
+        if not name[1:].startswith(' '):  # depth 0: nested imports are indented by two spaces per level
+            total += int(cumulative_us)
+    return total, by_package, modules
+
+def _env(scratch, warmup_mode):
+    return dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [PROJECT_DIR, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=f"sqlite:///{os.path.join(scratch, 'app.db')}",
+               ATTENDANCE_JOURNAL=os.path.join(scratch, 'attendance.journal'),
+               GALLERY_SNAPSHOT=os.path.join(scratch, 'gallery.snapshot'),
+               WARMUP_MODE=warmup_mode)
+
+def measure(snippet, scratch, warmup_mode):
+    env = _env(scratch, warmup_mode)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', snippet + LIST_MODULES], cwd=scratch, env=env,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"'{snippet}' failed:\n{result.stderr[-2000:]}")
+    total, by_package, _ = parse_importtime(result.stderr)
+    return wall, total, by_package, set(result.stdout.split())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=0, help='fail if create_app() imports take longer (0 = no limit)')
+    parser.add_argument('--forbid', default='face_recognition,dlib,cv2,pandas',
+                        help='comma-separated modules create_app() must not import')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--warmup-mode', default='background')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as scratch:
+        subprocess.run([sys.executable, '-c', SETUP], cwd=scratch, env=_env(scratch, 'lazy'),
+                       check=True, capture_output=True)
+        print(f"{'snippet':<14} {'imports ms':>11} {'wall ms':>9} {'modules':>8}")
+        for label, snippet in SNIPPETS.items():
+            wall, total, by_package, modules = measure(snippet, scratch, args.warmup_mode)
+            print(f"{label:<14} {total / 1e3:>11.1f} {wall * 1e3:>9.1f} {len(modules):>8}")
+
+        print("\nHeaviest packages during create_app() (self time):")
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<24} {self_us / 1e3:>8.1f} ms")
+
+        packages = {module.split('.')[0] for module in modules}
+        forbidden = sorted(name for name in filter(None, args.forbid.split(',')) if name in packages)
+        if forbidden:
+            failures.append(f"create_app() imported {', '.join(forbidden)}")
+        if args.budget_ms and total / 1e3 > args.budget_ms:
+            failures.append(f"create_app() imports took {total / 1e3:.1f} ms, budget is {args.budget_ms:.1f} ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Instrumentation cost on the hot path.
+
+Measures, per call: a histogram observe(), a histogram time() block, a
+labelled counter inc(), a disabled log.debug() next to the print() it
+replaced (stdout redirected to /dev/null), and a /metrics render. Then runs
+a CPU-bound loop with the sampling profiler off and on, on --threads
+threads, to show the slowdown sampling causes.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_metrics [--calls 200000] [--threads 4] [--interval 0.005]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import threading
+import time
+from app.services.metrics import MetricsRegistry
+from app.services.profiler import SamplingProfiler
+
+def per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < end:
+        count += sum(range(100))
+    return count
+
+def work_rate(threads, seconds):
+    """Loop iterations per second of ``threads`` threads spinning for ``seconds``."""
+    totals = []
+    workers = [threading.Thread(target=lambda: totals.append(spin(seconds))) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return sum(totals) / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=0.005)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('bench_seconds', 'Benchmark histogram.')
+    counter = registry.counter('bench_total', 'Benchmark counter.', ['result']).labels('recognized')
+    log = logging.getLogger('app.services.bench')
+    log.setLevel(logging.WARNING)
+
+    def timed():
+        with histogram.time():
+            pass
+
+    print(f"{'operation':<28} {'ns/call':>10}")
+    print(f"{'histogram.observe':<28} {per_call(lambda: histogram.observe(0.004), args.calls):>10.0f}")
+    print(f"{'histogram.time block':<28} {per_call(timed, args.calls):>10.0f}")
+    print(f"{'counter.inc':<28} {per_call(counter.inc, args.calls):>10.0f}")
+    print(f"{'log.debug (disabled)':<28} {per_call(lambda: log.debug('No faces detected in the frame.'), args.calls):>10.0f}")
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        printed = per_call(lambda: print('No faces detected in the frame.'), args.calls)
+    print(f"{'print (to /dev/null)':<28} {printed:>10.0f}")
+    print(f"{'render /metrics':<28} {per_call(registry.render, 1000):>10.0f}")
+
+    baseline = work_rate(args.threads, args.seconds)
+    profiler = SamplingProfiler(interval=args.interval).start()
+    profiled = work_rate(args.threads, args.seconds)
+    profiler.stop()
+    print(f"\nprofiler at {args.interval * 1000:.1f} ms, {args.threads} threads: "
+          f"{profiler.samples} samples, {(1 - profiled / baseline) * 100:.1f}% slower")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Detection + encoding throughput (frames/second) in-process versus a
+RecognitionExecutor with 1, 2, 4, ... worker processes.
+
+Frames come from a video file (so faces are found and encoded) or, without
+one, are synthetic noise frames, which cost dlib a full HOG scan but find no
+faces. Frames are held in memory and fed as fast as the workers take them;
+worker start-up is not timed.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_recognition_processes [gate.mp4] [--frames 120] [--max-workers 8]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from app.services.face_recognition_service import FaceRecognitionService
+from app.services.recognition_executor import RecognitionExecutor
+
+def load_frames(path, count, width, height):
+    if path is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+    import cv2
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    frames = []
+    while len(frames) < count:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+def worker_counts(max_workers):
+    count = 1
+    while count < max_workers:
+        yield count
+        count *= 2
+    yield max_workers
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, args.width, args.height)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, {os.cpu_count()} CPU cores")
+
+    service = FaceRecognitionService()
+    service.warm_up()
+    start = time.perf_counter()
+    faces = sum(len(service.detect_and_encode(frame)[0]) for frame in frames)
+    baseline = len(frames) / (time.perf_counter() - start)
+
+    print(f"{'workers':<12} {'frames/s':>9} {'speedup':>8} {'faces':>6}")
+    print(f"{'in-process':<12} {baseline:>9.1f} {1.0:>8.2f} {faces:>6}")
+    for workers in worker_counts(args.max_workers):
+        executor = RecognitionExecutor(workers=workers).start()
+        try:
+            start = time.perf_counter()
+            faces = sum(len(boxes) for boxes, _ in executor.map((frame, None) for frame in frames))
+            fps = len(frames) / (time.perf_counter() - start)
+        finally:
+            executor.shutdown()
+        print(f"{workers:<12} {fps:>9.1f} {fps / baseline:>8.2f} {faces:>6}")
+
+if __name__ == '__main__':
+    main()
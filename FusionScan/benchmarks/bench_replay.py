@@ -0,0 +1,326 @@
+"""
+End-to-end replay: a recorded video through the whole scanner, headless, reported as JSON.
+
+Builds a throwaway instance (SQLite database, journal, gallery snapshot in
+a temporary directory), so no webcam, Arduino or hand-populated app.db is
+needed:
+
+- The people in the recording are enrolled from the recording itself: faces
+  found in every --enroll-every-th frame of the first --enroll-frames are
+  clustered by encoding, and each cluster seen at least twice becomes a user.
+- Synthetic users (benchmarks.synthetic) fill the gallery up to
+  --gallery-size encodings.
+- The thermal sensor is a FakeArduinoSerial replaying a seeded script of
+  readings (THERMAL_PORT=fake:<script>), with a share of feverish passes
+  set by --anomaly-rate.
+- The recording is the camera: played at its own frame rate (or --fps) by
+  VideoFileCapture, so every run sees the same frames at the same pace;
+  --fps 0 reads it as fast as possible to measure peak throughput.
+
+The application is created with create_app() and driven through the real
+CameraHub: frames are recognized by the shared scheduler (and worker
+processes with --processes), fused with the thermal readings, written by the
+AttendanceWriter and encoded for --viewers stream subscribers. The JSON
+result has frames per second per stage, capture-to-result and
+capture-to-viewer latency percentiles, attendance rows and commits per
+second, mean stage times from the /metrics histograms and peak RSS, plus the
+git revision and parameters, for comparing builds.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_replay gate.mp4 [--gallery-size 1000] [--processes 0] [--viewers 1]
+                                      [--fps 30] [--seconds 60 --loop] [--output result.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from benchmarks.synthetic import make_entries, make_user_rows
+
+CAMERA_ID = 'replay'
+
+def write_thermal_script(path, seed, anomaly_rate, readings=6000, block=25):
+    """
+    Writes a FakeArduinoSerial script: blocks of ``block`` readings (5 s at the
+    default sample interval), each normal or, with ``anomaly_rate``, feverish;
+    about 1 in 100 is a failed read ('nan').
+    """
+    rng = random.Random(seed)
+    lines = [f'# replay benchmark, seed {seed}, anomaly rate {anomaly_rate}']
+    while len(lines) <= readings:
+        base, jitter = (38.2, 0.15) if rng.random() < anomaly_rate else (36.5, 0.2)
+        for _ in range(block):
+            lines.append('nan' if rng.random() < 0.01 else f'{rng.gauss(base, jitter):.2f}')
+    with open(path, 'w', encoding='utf-8') as script:
+        script.write('\n'.join(lines) + '\n')
+
+def bench_config(args, workdir, thermal_script):
+    from config import Config
+
+    class BenchConfig(Config):
+        TESTING = True  # no log files or error mails
+        LOG_LEVEL = 'ERROR'
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        ATTENDANCE_JOURNAL = os.path.join(workdir, 'attendance.journal')
+        GALLERY_SNAPSHOT = os.path.join(workdir, 'gallery.snapshot')
+        WARMUP_MODE = 'lazy'  # the gallery is loaded once the users are inserted
+        THERMAL_PORT = f'fake:{thermal_script}'
+        CAMERAS = f'{CAMERA_ID}={os.path.abspath(args.video)}'
+        CAMERA_FILE_REALTIME = args.fps != 0
+        CAMERA_FILE_FPS = args.fps or 0
+        CAMERA_FILE_LOOP = args.loop
+        RECOGNITION_PROCESSES = args.processes
+        FACE_MATCH_BACKEND = args.backend
+    return BenchConfig
+
+def enroll_from_video(recognizer, path, every, max_frames, per_user, threshold=0.45):
+    """Clusters the faces of a recording into people; returns make_entries()-style (None, encodings) entries."""
+    import cv2
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    clusters = []
+    for index in range(max_frames):
+        success, frame = capture.read()
+        if not success:
+            break
+        if index % every:
+            continue
+        _, face_encodings = recognizer.detect_and_encode(frame)
+        for encoding in face_encodings:
+            for cluster in clusters:
+                if np.linalg.norm(np.mean(cluster, axis=0) - encoding) < threshold:
+                    cluster.append(encoding)
+                    break
+            else:
+                clusters.append([encoding])
+    capture.release()
+    return [(None, np.asarray(cluster[:per_user], dtype=np.float32)) for cluster in clusters if len(cluster) >= 2]
+
+def populate(recognizer, args):
+    """Inserts the recording's people and the synthetic users; returns the gallery composition."""
+    from app import db
+    from app.models import User
+    people = enroll_from_video(recognizer, args.video, args.enroll_every, args.enroll_frames, args.per_user)
+    enrolled = sum(len(encodings) for _, encodings in people)
+    synthetic, _ = make_entries(args.gallery_size - enrolled, per_user=args.per_user, seed=args.seed) \
+        if args.gallery_size > enrolled else ([], None)
+    rows = make_user_rows(people, first_id=1, prefix='person')
+    rows += make_user_rows(synthetic, first_id=len(people) + 1)
+    db.session.execute(db.insert(User), rows)
+    db.session.commit()
+    return {'people_in_video': len(people), 'users': len(rows),
+            'encodings': enrolled + sum(len(encodings) for _, encodings in synthetic)}
+
+def percentiles(seconds):
+    if not seconds:
+        return None
+    values = np.asarray(seconds) * 1000.0
+    return {'p50': float(np.percentile(values, 50)), 'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)), 'max': float(values.max()), 'samples': len(values)}
+
+def peak_rss_mb(workers):
+    """Peak resident set size of this process and, with ``workers``, of the largest worker process (after it exited)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+        except ImportError:
+            return {'self': None, 'largest_worker': None}
+        info = psutil.Process().memory_info()
+        return {'self': getattr(info, 'peak_wset', info.rss) / 2 ** 20, 'largest_worker': None}
+    unit = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is in bytes on macOS, KiB elsewhere
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 2 ** 20,
+            'largest_worker': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit / 2 ** 20 if workers else None}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+class Recorder:
+    """Hooks a pipeline to time each frame from capture to fused result and to each viewer."""
+
+    def __init__(self):
+        self.captured = {}  # seq -> capture time
+        self.recognition = []
+        self.delivery = []
+
+    def instrument(self, pipeline):
+        pipeline.add_frame_listener(lambda frame: self.captured.__setitem__(frame.seq, frame.timestamp))
+        on_results = pipeline.on_results
+
+        def timed(frame, results):
+            on_results(frame, results)
+            self.recognition.append(time.time() - frame.timestamp)
+
+        pipeline.on_results = timed
+        return pipeline
+
+    def view(self, subscriber, stop):
+        while not stop.is_set():
+            frame = subscriber.next_frame(timeout=0.5)
+            if frame is None:
+                continue
+            received = time.time()
+            captured = self.captured.get(frame[0])
+            if captured is not None:
+                self.delivery.append(received - captured)
+            subscriber.sent += 1
+            subscriber.bytes_sent += len(frame[1])
+
+def run(args, workdir):
+    import app as application
+    from app import create_app, db
+    from app.services import metrics
+
+    thermal_script = os.path.join(workdir, 'thermal.txt')
+    write_thermal_script(thermal_script, args.seed, args.anomaly_rate)
+    app = create_app(bench_config(args, workdir, thermal_script))
+    recognizer = application.face_recognition_service
+    with app.app_context():
+        db.create_all()
+        print('Enrolling the people in the recording...', file=sys.stderr)
+        gallery = populate(recognizer, args)
+        application.warmup.start(background=False)
+    metrics.REGISTRY.reset()  # leave out the enrollment's detections
+
+    hub = application.camera_hub
+    recorder = Recorder()
+    pipeline_factory = hub.pipeline_factory
+    hub.pipeline_factory = lambda camera: recorder.instrument(pipeline_factory(camera))
+
+    print(f"Replaying {args.video} against {gallery['encodings']} encodings...", file=sys.stderr)
+    stop = threading.Event()
+    started = time.perf_counter()
+    subscribers = [hub.subscribe(CAMERA_ID, args.profile) for _ in range(args.viewers)]
+    viewers = [threading.Thread(target=recorder.view, args=(subscriber, stop), daemon=True)
+               for subscriber in subscribers]
+    for viewer in viewers:
+        viewer.start()
+    while hub.is_running(CAMERA_ID) and (args.seconds is None or time.perf_counter() - started < args.seconds):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    pipeline = hub.pipeline(CAMERA_ID)
+    stats = pipeline.stats()
+    stop.set()
+    for viewer in viewers:
+        viewer.join()
+    hub.stop_all()  # closes the passes still open
+    writer_started = time.perf_counter()
+    application.attendance_writer.stop()
+    application.thermal_sensor.stop()
+    if recognizer.executor is not None:
+        recognizer.executor.shutdown()
+
+    times = list(recorder.captured.values())
+    span = max(times) - min(times) if len(times) > 1 else elapsed
+    writer = application.attendance_writer.stats()
+    db_writes, db_seconds = metrics.DB_WRITE_SECONDS.totals()
+    events = {values[0]: child.value for values, child in metrics.ATTENDANCE_EVENTS.children().items()}
+    faces = {values[0]: child.value for values, child in metrics.FACES.children().items()}
+    stages = {}
+    for histogram in (metrics.CAMERA_READ_SECONDS, metrics.FACE_DETECTION_SECONDS, metrics.FACE_ENCODING_SECONDS,
+                      metrics.FACE_MATCHING_SECONDS, metrics.SERIAL_READ_SECONDS, metrics.DB_WRITE_SECONDS,
+                      metrics.JPEG_ENCODE_SECONDS):
+        count, total = histogram.totals()
+        stages[histogram.name.replace('fusionscan_', '').replace('_seconds', '')] = \
+            {'count': count, 'mean_ms': total * 1000.0 / count if count else None}
+
+    with app.app_context():
+        db.engine.dispose()
+    rss = peak_rss_mb(args.processes)  # before git_revision() starts a child process of its own
+    return {
+        'benchmark': 'replay',
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parameters': {key: value for key, value in vars(args).items() if key != 'output'},
+        'gallery': gallery,
+        'seconds': elapsed,
+        'frames': {
+            'captured': stats['capture']['count'],
+            'recognized': stats['recognition']['count'],
+            'recognition_dropped': stats['recognition']['dropped'],
+            'streamed': {name: output['frames'] for name, output in stats['output'].items() if output['frames']},
+            'unchanged': {name: output['unchanged'] for name, output in stats['output'].items() if output['frames']},
+        },
+        'frames_per_second': {
+            'capture': stats['capture']['count'] / span if span else None,
+            'recognition': stats['recognition']['count'] / span if span else None,
+            'stream': sum(output['frames'] for output in stats['output'].values()) / span if span else None,
+        },
+        'latency_ms': {
+            'capture_to_result': percentiles(recorder.recognition),
+            'capture_to_viewer': percentiles(recorder.delivery),
+        },
+        'faces': faces,
+        'attendance': {
+            'events': events,
+            'rows_written': writer['written'],
+            'duplicates': writer['duplicates'],
+            'commits': db_writes,
+            'rows_per_second': writer['written'] / span if span else None,
+            'commits_per_second': db_writes / span if span else None,
+            'mean_commit_ms': db_seconds * 1000.0 / db_writes if db_writes else None,
+            'final_flush_ms': (time.perf_counter() - writer_started) * 1000.0,
+        },
+        'stages': stages,
+        'peak_rss_mb': rss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--gallery-size', type=int, default=1000, help='gallery encodings, synthetic ones included')
+    parser.add_argument('--per-user', type=int, default=5, help='encodings per user')
+    parser.add_argument('--backend', default='exact', choices=('exact', 'ivf'))
+    parser.add_argument('--processes', type=int, default=0, help='recognition worker processes')
+    parser.add_argument('--viewers', type=int, default=1, help='stream subscribers (at least one keeps the camera running)')
+    parser.add_argument('--profile', default=None, help='stream profile the viewers watch (default: the first)')
+    parser.add_argument('--fps', type=float, default=None,
+                        help="playback rate; default the file's own, 0 = as fast as frames decode")
+    parser.add_argument('--loop', action='store_true', help='replay the recording until --seconds')
+    parser.add_argument('--seconds', type=float, default=None, help='stop after this long')
+    parser.add_argument('--anomaly-rate', type=float, default=0.1, help='share of feverish thermal readings')
+    parser.add_argument('--enroll-every', type=int, default=10)
+    parser.add_argument('--enroll-frames', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help='keep the temporary instance directory')
+    parser.add_argument('--output', help='write the JSON here instead of stdout')
+    args = parser.parse_args()
+    if args.loop and args.seconds is None:
+        parser.error('--loop needs --seconds')
+    if args.viewers < 1:
+        parser.error('--viewers must be at least 1')
+
+    workdir = tempfile.mkdtemp(prefix='fusionscan-replay-')
+    try:
+        result = run(args, workdir)
+    finally:
+        if args.keep:
+            print(f"Instance kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as result_file:
+            result_file.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+MJPEG output cost: per-frame full-resolution encoding with per-viewer
+multipart copies (the old generate_frames) versus StreamOutput profiles.
+
+For each path, every frame of the recording is encoded and handed to
+--viewers viewers (for the old path each viewer gets its own concatenated
+part). Reports encode time per frame, bytes per frame, and the bytes per
+second the viewers would receive at --fps.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_stream_output gate.mp4 [--frames 300] [--viewers 12] [--profiles high=80:1,low=50:0.25]
+"""
+import argparse
+import time
+import cv2
+from app.services.stream_output import StreamOutput, parse_profiles
+
+def load_frames(path, count):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    frames = []
+    while len(frames) < count:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+def legacy(frames, viewers):
+    sizes = []
+    start = time.perf_counter()
+    for frame in frames:
+        ret, buffer = cv2.imencode('.jpg', frame)
+        jpeg = buffer.tobytes()
+        for _ in range(viewers):
+            part = (b'--frame\r\n'
+                    b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        sizes.append(len(part))
+    return time.perf_counter() - start, len(frames), sizes
+
+def profile_run(frames, profile, change_threshold):
+    output = StreamOutput([profile], change_threshold)
+    sizes = []
+    start = time.perf_counter()
+    for seq, frame in enumerate(frames):
+        encoded = output.encode(seq, frame, [profile.name])
+        if encoded:
+            sizes.append(len(encoded[profile.name].part))
+    return time.perf_counter() - start, len(frames), sizes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--viewers', type=int, default=12)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--profiles', default='high=80:1,medium=70:0.5,low=50:0.25')
+    parser.add_argument('--change-threshold', type=float, default=4.0, help='-1 encodes every frame')
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, {args.viewers} viewers at {args.fps:g} fps")
+    print(f"{'output':<22} {'ms/frame':>9} {'sent':>6} {'KB/frame':>9} {'KB/s/viewer':>12} {'MB/s total':>11}")
+    rows = [('default q, full res', legacy(frames, args.viewers))]
+    for profile in parse_profiles(args.profiles):
+        rows.append((f'{profile.name} (q{profile.quality}, x{profile.scale:g})',
+                     profile_run(frames, profile, args.change_threshold)))
+    for name, (seconds, count, sizes) in rows:
+        # Bytes a viewer receives per second of video: sent frames' sizes spread over the recording
+        per_viewer = sum(sizes) / (count / args.fps)
+        print(f"{name:<22} {seconds * 1e3 / count:>9.2f} {len(sizes):>6} {sum(sizes) / max(len(sizes), 1) / 1024:>9.1f} "
+              f"{per_viewer / 1024:>12.1f} {per_viewer * args.viewers / 1e6:>11.2f}")
+
+if __name__ == '__main__':
+    main()
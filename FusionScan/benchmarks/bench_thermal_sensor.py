@@ -0,0 +1,69 @@
+"""
+Thermal sensor access cost: per-call port open versus the background sampler.
+
+Runs against FakeArduinoSerial, so no hardware is needed. The legacy path
+opens the port, waits for the Arduino reset and closes it on every call;
+the sampler path reads from the ring buffer.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_thermal_sensor [--reset-delay 2.0] [--calls 100000]
+"""
+import argparse
+import time
+import numpy as np
+from app.services.fake_serial import FakeArduinoSerial, fake_serial_factory
+from app.services.thermal_scanning_service import ThermalSensor
+
+def legacy_read(reset_delay):
+    """What get_temperature_from_arduino used to do on every call."""
+    ser = FakeArduinoSerial('fake')
+    try:
+        time.sleep(reset_delay)
+        ser.write(b'T')
+        return float(ser.readline().decode('utf-8').strip())
+    finally:
+        ser.close()
+
+def _percentiles(samples):
+    samples = np.asarray(samples) * 1e6
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reset-delay', type=float, default=2.0)
+    parser.add_argument('--legacy-calls', type=int, default=2)
+    parser.add_argument('--calls', type=int, default=100000)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--run-seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.legacy_calls):
+        start = time.perf_counter()
+        legacy_read(args.reset_delay)
+        samples.append(time.perf_counter() - start)
+    p50, p99 = _percentiles(samples)
+    print(f"legacy open-per-call : p50 {p50:>12.1f} us  p99 {p99:>12.1f} us")
+
+    sensor = ThermalSensor(port='fake', interval=args.interval, buffer_size=4096,
+                           serial_factory=fake_serial_factory(fail_after=50), reset_delay=0.0, reconnect_delay=0.05)
+    sensor.start()
+    time.sleep(args.run_seconds)
+
+    for name, call in (('latest()', lambda: sensor.latest()),
+                       ('nearest(now - 0.5s)', lambda: sensor.nearest(time.time() - 0.5))):
+        samples = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        p50, p99 = _percentiles(samples)
+        print(f"{name:<21}: p50 {p50:>12.1f} us  p99 {p99:>12.1f} us")
+
+    stats = sensor.stats()
+    sensor.stop()
+    print(f"sampler: {stats['samples']} samples in {args.run_seconds:.1f}s "
+          f"({stats['samples'] / args.run_seconds:.0f}/s), {stats['reconnects']} reconnects")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Replays a recorded video through per-frame recognition and through the
+detection-skip FaceTracker, and compares CPU per frame and recognitions.
+
+The gallery is loaded from the application database, so run this against an
+instance with enrolled users and a recording of them at the scanner.
+
+Usage (from the FusionScan directory):
+    python -m benchmarks.bench_tracker_replay gate.mp4 [--detect-every 5] [--box-tracker iou]
+"""
+import argparse
+import time
+import cv2
+from app import create_app
+from app.services.face_tracker import FaceTracker
+
+def replay(path, process, max_frames=None):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video file {path}")
+    frames = 0
+    recognized_frames = 0
+    users = set()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    while max_frames is None or frames < max_frames:
+        success, frame = capture.read()
+        if not success:
+            break
+        _, results = process(frame)
+        accepted = [result.user.id for result in results if result.user is not None]
+        recognized_frames += bool(accepted)
+        users.update(accepted)
+        frames += 1
+    capture.release()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        'frames': frames,
+        'cpu_ms_per_frame': cpu * 1000.0 / max(frames, 1),
+        'fps': frames / wall if wall else 0.0,
+        'recognized_frames': recognized_frames,
+        'users': len(users),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('--detect-every', type=int, default=5)
+    parser.add_argument('--vote-window', type=int, default=5)
+    parser.add_argument('--min-votes', type=int, default=3)
+    parser.add_argument('--box-tracker', default='iou')
+    parser.add_argument('--max-frames', type=int, default=None)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        from app import face_recognition_service
+
+        baseline = replay(args.video, face_recognition_service.facial_recognition_process, args.max_frames)
+        tracker = FaceTracker(face_recognition_service, detect_every=args.detect_every,
+                              vote_window=args.vote_window, min_votes=args.min_votes,
+                              box_tracker=args.box_tracker)
+        tracked = replay(args.video, tracker.process, args.max_frames)
+        tracked.update(tracker.stats)
+
+    print(f"{'mode':>10} {'frames':>7} {'cpu ms/f':>9} {'fps':>7} {'recog frames':>13} {'users':>6}")
+    for name, stats in (('per-frame', baseline), ('tracker', tracked)):
+        print(f"{name:>10} {stats['frames']:>7} {stats['cpu_ms_per_frame']:>9.2f} {stats['fps']:>7.1f} "
+              f"{stats['recognized_frames']:>13} {stats['users']:>6}")
+    print(f"tracker detections: {tracked['detections']}, encodings: {tracked['encodings']}, "
+          f"CPU reduction: {baseline['cpu_ms_per_frame'] / max(tracked['cpu_ms_per_frame'], 1e-9):.1f}x")
+
+if __name__ == '__main__':
+    main()
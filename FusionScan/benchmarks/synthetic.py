@@ -0,0 +1,55 @@
+"""Synthetic face-encoding galleries for the benchmarks."""
+import numpy as np
+from app.services.face_gallery import GalleryUser
+
+# Spreads chosen so that distances look like dlib's: ~0.9-1.0 between
+# different people, ~0.3 between captures of the same person.
+USER_SPREAD = 0.06
+CAPTURE_NOISE = 0.02
+
+def make_entries(n_encodings, per_user=5, dim=128, seed=0):
+    """
+    Builds (GalleryUser, encodings) entries totalling n_encodings rows.
+
+    Returns:
+        tuple: (entries, centers) where centers[i] is user i's "true" face.
+    """
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_encodings // per_user)
+    centers = rng.normal(0.0, USER_SPREAD, size=(n_users, dim)).astype(np.float32)
+    noise = rng.normal(0.0, CAPTURE_NOISE, size=(n_users, per_user, dim)).astype(np.float32)
+    captures = centers[:, None, :] + noise
+    entries = [
+        (GalleryUser(i + 1, f"student{i + 1}", f"{i + 1:012d}"), captures[i])
+        for i in range(n_users)
+    ]
+    return entries, centers
+
+def make_probes(centers, n_probes, dim=128, seed=1):
+    """
+    Draws probe encodings of enrolled users.
+
+    Returns:
+        tuple: (probes, user_ids) with the true user id of every probe.
+    """
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(centers), size=n_probes)
+    probes = centers[idx] + rng.normal(0.0, CAPTURE_NOISE, size=(n_probes, dim)).astype(np.float32)
+    return probes, idx + 1
+
+def make_user_rows(entries, first_id=1, prefix='student'):
+    """
+    Turns make_entries() output into User rows for a bulk insert, so the
+    application loads the synthetic gallery from its database.
+    """
+    from app.forms import STRANDS
+    from app.services.encoding_format import encode_encodings
+    return [{
+        'id': first_id + i,
+        'username': f'{prefix}{first_id + i}',
+        'email': f'{prefix}{first_id + i}@bench.invalid',
+        'student_lrn': f'{first_id + i:012d}',
+        'strand': STRANDS[i % len(STRANDS)],
+        'is_admin': False,
+        'face_encodings': encode_encodings(encodings),
+    } for i, (_, encodings) in enumerate(entries)]
@@ -12,4 +12,65 @@ class Config:
     ADMINS = ['your-email@example.com']  # Replace with your email
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
+    FACE_MATCH_TOLERANCE = float(os.environ.get('FACE_MATCH_TOLERANCE') or 0.5)
+    FACE_MATCH_AGGREGATE = os.environ.get('FACE_MATCH_AGGREGATE') or 'min'  # 'min' (best-of) or 'mean'
+    FACE_MATCH_BACKEND = os.environ.get('FACE_MATCH_BACKEND') or 'exact'  # 'exact' or 'ivf' (approximate, for large galleries)
+    FACE_IVF_NLIST = int(os.environ.get('FACE_IVF_NLIST') or 0) or None  # None picks ~4*sqrt(encodings)
+    FACE_IVF_NPROBE = int(os.environ.get('FACE_IVF_NPROBE') or 8)  # higher = better recall, slower
+    GALLERY_SNAPSHOT = os.environ.get('GALLERY_SNAPSHOT')  # defaults to instance/gallery.snapshot; 'off' disables
+    GALLERY_SNAPSHOT_CHECK_INTERVAL = float(os.environ.get('GALLERY_SNAPSHOT_CHECK_INTERVAL') or 1.0)  # seconds between checks for a newer snapshot
+    WARMUP_MODE = os.environ.get('WARMUP_MODE') or 'background'  # 'background' (from the first request), 'sync' or 'lazy'
+    DETECTION_SCALE = float(os.environ.get('DETECTION_SCALE') or 0.25)  # frame downscale for face detection (the start value with auto scale)
+    DETECTION_ROI = os.environ.get('DETECTION_ROI')  # 'x0:y0:x1:y1' frame fractions scanned for faces, or per camera 'gate1=0.2:0:0.8:1,...'
+    DETECTION_REFINE = os.environ.get('DETECTION_REFINE', '0') != '0'  # re-detect and encode each face on a full-resolution crop
+    DETECTION_AUTO_SCALE = os.environ.get('DETECTION_AUTO_SCALE', '0') != '0'  # pick each camera's scale from the face sizes it sees
+    DETECTION_MIN_SCALE = float(os.environ.get('DETECTION_MIN_SCALE') or 0.125)  # auto scale bounds
+    DETECTION_MAX_SCALE = float(os.environ.get('DETECTION_MAX_SCALE') or 0.5)
+    TRACKER_DETECT_EVERY = int(os.environ.get('TRACKER_DETECT_EVERY') or 5)  # full detection every N frames
+    TRACKER_VOTE_WINDOW = int(os.environ.get('TRACKER_VOTE_WINDOW') or 5)
+    TRACKER_MIN_VOTES = int(os.environ.get('TRACKER_MIN_VOTES') or 3)
+    TRACKER_VERIFY_EVERY = int(os.environ.get('TRACKER_VERIFY_EVERY') or 1)  # re-match confirmed faces every N full detections
+    TRACKER_BOX_TRACKER = os.environ.get('TRACKER_BOX_TRACKER') or 'iou'  # 'iou', 'kcf', 'mil' or 'csrt'
+    PIPELINE_RECOGNITION_WORKERS = int(os.environ.get('PIPELINE_RECOGNITION_WORKERS') or 1)  # recognition threads shared by all cameras
+    RECOGNITION_PROCESSES = int(os.environ.get('RECOGNITION_PROCESSES') or 0)  # detection/encoding worker processes; 0 = in the pipeline threads
+    OFFLINE_STRIDE = int(os.environ.get('OFFLINE_STRIDE') or 5)  # flask recognize-recording: process every Nth frame
+    OFFLINE_BATCH_SIZE = int(os.environ.get('OFFLINE_BATCH_SIZE') or 200)  # attendance events per commit and checkpoint
+    PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE') or 2)  # frames buffered per stage before dropping
+    CAMERA_SOURCE = int(os.environ.get('CAMERA_SOURCE') or 0)  # device index of the gate camera when CAMERAS is unset
+    CAMERAS = os.environ.get('CAMERAS')  # 'gate1=0,gate2=rtsp://10.0.0.5/stream,test=gate.mp4' (device index, URL or video file)
+    CAMERA_WEIGHTS = os.environ.get('CAMERA_WEIGHTS')  # 'gate1=2,gate2=1': share of recognition when every camera is busy
+    CAMERA_FILE_REALTIME = os.environ.get('CAMERA_FILE_REALTIME', '1') != '0'  # play video file cameras at their frame rate, like a live camera
+    CAMERA_FILE_FPS = float(os.environ.get('CAMERA_FILE_FPS') or 0)  # playback rate of video file cameras; 0 = the file's own
+    CAMERA_FILE_LOOP = os.environ.get('CAMERA_FILE_LOOP', '0') != '0'  # start video file cameras over at the end instead of stopping
+    CAMERA_IDLE_TIMEOUT = float(os.environ.get('CAMERA_IDLE_TIMEOUT') or 10)  # seconds before an unwatched camera is released
+    STREAM_PROFILES = os.environ.get('STREAM_PROFILES') or 'high=80:1,medium=70:0.5,low=50:0.25'  # name=jpeg_quality:scale; the first is the default
+    STREAM_CHANGE_THRESHOLD = float(os.environ.get('STREAM_CHANGE_THRESHOLD') or 4)  # grey levels on a thumbnail below which a frame isn't re-sent; -1 sends all
+    ENROLL_SAMPLES = int(os.environ.get('ENROLL_SAMPLES') or 5)  # face encodings stored per enrolled user
+    ENROLL_JITTERS = int(os.environ.get('ENROLL_JITTERS') or 3)  # num_jitters of the enrollment encode
+    ENROLL_DETECTION_SCALE = float(os.environ.get('ENROLL_DETECTION_SCALE') or 0.5)  # frame downscale for enrollment detection
+    ENROLL_MIN_FACE = int(os.environ.get('ENROLL_MIN_FACE') or 80)  # smallest face height (px) accepted for enrollment
+    ENROLL_MAX_SECONDS = float(os.environ.get('ENROLL_MAX_SECONDS') or 20)  # capture time limit; the best samples so far are kept
+    THERMAL_PORT = os.environ.get('THERMAL_PORT') or 'COM11'  # port name, pyserial URL, 'fake' for a simulated sensor or 'fake:readings.txt' to replay a script
+    THERMAL_BAUDRATE = int(os.environ.get('THERMAL_BAUDRATE') or 9600)
+    THERMAL_SAMPLE_INTERVAL = float(os.environ.get('THERMAL_SAMPLE_INTERVAL') or 0.2)  # seconds between readings
+    THERMAL_BUFFER_SIZE = int(os.environ.get('THERMAL_BUFFER_SIZE') or 600)  # readings kept in the ring buffer
+    THERMAL_MAX_AGE = float(os.environ.get('THERMAL_MAX_AGE') or 2.0)  # seconds before a reading is stale
+    EVENTS_HISTORY = int(os.environ.get('EVENTS_HISTORY') or 1000)  # live-update events kept for reconnecting dashboards
+    EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE') or 15)  # seconds between keep-alive comments on idle streams
+    EVENTS_TEMPERATURE_INTERVAL = float(os.environ.get('EVENTS_TEMPERATURE_INTERVAL') or 1.0)  # seconds between temperature events
+    ANOMALY_THRESHOLD = float(os.environ.get('ANOMALY_THRESHOLD') or 37.5)  # °C at or above which attendance is an "Anomaly"
+    FUSION_WINDOW = float(os.environ.get('FUSION_WINDOW') or 1.0)  # seconds of thermal samples around a pass
+    FUSION_PASS_GAP = float(os.environ.get('FUSION_PASS_GAP') or 3.0)  # unseen this long = pass is over
+    FUSION_MAX_PASS = float(os.environ.get('FUSION_MAX_PASS') or 10.0)  # longest pass before an event is emitted anyway
+    FUSION_TOP_N = int(os.environ.get('FUSION_TOP_N') or 3)  # median of this many highest readings
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') != '0'  # WAL journal so readers don't block the attendance writer
+    ATTENDANCE_JOURNAL = os.environ.get('ATTENDANCE_JOURNAL')  # defaults to instance/attendance.journal; each process appends .<pid>
+    ATTENDANCE_BATCH_SIZE = int(os.environ.get('ATTENDANCE_BATCH_SIZE') or 200)  # rows per transaction
+    ATTENDANCE_FLUSH_INTERVAL = float(os.environ.get('ATTENDANCE_FLUSH_INTERVAL') or 1.0)  # seconds between flushes
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'  # 'DEBUG' also logs every frame without faces and every attendance event
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'  # hot-path timers and counters served by /metrics
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # lets scrapers read /metrics with 'Authorization: Bearer <token>' instead of logging in
+    PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL') or 0.005)  # seconds between samples of the runtime profiler
+    USERS_PER_PAGE = int(os.environ.get('USERS_PER_PAGE') or 50)  # rows per page on the attendance dashboard
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE') or 5000)  # rows fetched per round trip when exporting attendance
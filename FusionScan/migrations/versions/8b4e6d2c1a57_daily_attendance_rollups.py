@@ -0,0 +1,133 @@
+"""daily attendance rollup tables
+
+Revision ID: 8b4e6d2c1a57
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2c1a57'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def _rollup_columns():
+    return [
+        sa.Column('first_seen', sa.DateTime(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=True),
+        sa.Column('count', sa.Integer(), nullable=True),
+        sa.Column('temperature_min', sa.Float(), nullable=True),
+        sa.Column('temperature_max', sa.Float(), nullable=True),
+        sa.Column('temperature_sum', sa.Float(), nullable=True),
+        sa.Column('temperature_count', sa.Integer(), nullable=True),
+        sa.Column('anomaly_count', sa.Integer(), nullable=True),
+    ]
+
+
+def _new_rollup():
+    return {'first_seen': None, 'last_seen': None, 'count': 0, 'temperature_min': None, 'temperature_max': None,
+            'temperature_sum': 0.0, 'temperature_count': 0, 'anomaly_count': 0}
+
+
+def _add(rollup, timestamp, temperature, status):
+    rollup['first_seen'] = min(rollup['first_seen'] or timestamp, timestamp)
+    rollup['last_seen'] = max(rollup['last_seen'] or timestamp, timestamp)
+    rollup['count'] += 1
+    if temperature is not None:
+        rollup['temperature_min'] = min(temperature, rollup['temperature_min'] if rollup['temperature_min'] is not None else temperature)
+        rollup['temperature_max'] = max(temperature, rollup['temperature_max'] if rollup['temperature_max'] is not None else temperature)
+        rollup['temperature_sum'] += temperature
+        rollup['temperature_count'] += 1
+    if status == 'Anomaly':
+        rollup['anomaly_count'] += 1
+
+
+def _backfill(user_daily, strand_daily, attendance_day):
+    """
+    Builds rollups for the existing history in one pass over attendance; past days are marked finalized.
+
+    Days that already have rollups are left alone: on databases where
+    db.create_all() created these tables before the migration ran, the
+    running app may have rolled up a few days by itself.
+    """
+    attendance = sa.table('attendance', sa.column('user_id', sa.Integer), sa.column('timestamp', sa.DateTime),
+                          sa.column('status', sa.String), sa.column('temperature', sa.Float))
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('strand', sa.String))
+    bind = op.get_bind()
+    strands = dict(bind.execute(sa.select(user.c.id, user.c.strand)).fetchall())
+    rolled_up = {row[0] for row in bind.execute(sa.select(user_daily.c.day).distinct())}
+    finalized = {row[0] for row in bind.execute(sa.select(attendance_day.c.day))}
+
+    users, by_strand, strand_users = {}, {}, {}
+    result = bind.execution_options(yield_per=10000).execute(
+        sa.select(attendance.c.user_id, attendance.c.timestamp, attendance.c.status, attendance.c.temperature)
+        .where(attendance.c.user_id.isnot(None), attendance.c.timestamp.isnot(None)))
+    for user_id, timestamp, status, temperature in result:
+        day = timestamp.date()
+        if day in rolled_up:
+            continue
+        strand = strands.get(user_id) or 'Unassigned'
+        _add(users.setdefault((day, user_id), _new_rollup()), timestamp, temperature, status)
+        _add(by_strand.setdefault((day, strand), _new_rollup()), timestamp, temperature, status)
+        strand_users.setdefault((day, strand), set()).add(user_id)
+
+    if users:
+        op.bulk_insert(user_daily, [dict(rollup, day=day, user_id=user_id) for (day, user_id), rollup in users.items()])
+        op.bulk_insert(strand_daily, [dict(rollup, day=day, strand=strand, users=len(strand_users[(day, strand)]))
+                                      for (day, strand), rollup in by_strand.items()])
+        today = datetime.utcnow().date()
+        now = datetime.utcnow()
+        days = [{'day': day, 'finalized_at': now}
+                for day in sorted({day for day, _ in users}) if day < today and day not in finalized]
+        if days:
+            op.bulk_insert(attendance_day, days)
+
+
+def _create_table(inspector, name, *columns):
+    """Creates a table unless db.create_all() already did; returns a table object for inserts either way."""
+    if not inspector.has_table(name):
+        return op.create_table(name, *columns)
+    return sa.table(name, *[sa.column(column.name, column.type) for column in columns if isinstance(column, sa.Column)])
+
+
+def upgrade():
+    # run.py used to call db.create_all() on every start, which may already
+    # have created these tables (empty) from the models
+    inspector = sa.inspect(op.get_bind())
+    user_daily = _create_table(inspector, 'user_daily_attendance',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('day', 'user_id')
+    )
+    with op.batch_alter_table('user_daily_attendance', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_daily_attendance_user_id'), ['user_id'], unique=False, if_not_exists=True)
+
+    strand_daily = _create_table(inspector, 'strand_daily_attendance',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('strand', sa.String(length=64), nullable=False),
+        sa.Column('users', sa.Integer(), nullable=True),
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('day', 'strand')
+    )
+    attendance_day = _create_table(inspector, 'attendance_day',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('finalized_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('day')
+    )
+    _backfill(user_daily, strand_daily, attendance_day)
+
+
+def downgrade():
+    op.drop_table('attendance_day')
+    op.drop_table('strand_daily_attendance')
+    with op.batch_alter_table('user_daily_attendance', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_daily_attendance_user_id'))
+
+    op.drop_table('user_daily_attendance')
@@ -0,0 +1,53 @@
+"""convert pickled face encodings to the binary float32 format
+
+Revision ID: c52f9e0b7d3a
+Revises: 8b4e6d2c1a57
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+import pickle
+import struct
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52f9e0b7d3a'
+down_revision = '8b4e6d2c1a57'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app/services/encoding_format.py version 1, so this migration
+# keeps working if that module changes.
+MAGIC = b'FSEN'
+HEADER = struct.Struct('<4sHHI4x')
+DIM = 128
+
+user = sa.table('user', sa.column('id', sa.Integer), sa.column('face_encodings', sa.LargeBinary))
+
+
+def _rows(bind):
+    return bind.execute(sa.select(user.c.id, user.c.face_encodings).where(user.c.face_encodings.isnot(None))).fetchall()
+
+
+def upgrade():
+    bind = op.get_bind()
+    for user_id, blob in _rows(bind):
+        if bytes(blob[:4]) == MAGIC:
+            continue
+        # Rows were written by this application, so unpickling them once here is trusted
+        matrix = np.asarray(pickle.loads(blob), dtype='<f4').reshape(-1, DIM)
+        converted = HEADER.pack(MAGIC, 1, DIM, len(matrix)) + matrix.tobytes()
+        bind.execute(user.update().where(user.c.id == user_id).values(face_encodings=converted))
+
+
+def downgrade():
+    bind = op.get_bind()
+    for user_id, blob in _rows(bind):
+        if bytes(blob[:4]) != MAGIC:
+            continue
+        _, _, dim, count = HEADER.unpack_from(blob)
+        matrix = np.frombuffer(blob, dtype='<f4', count=count * dim, offset=HEADER.size).reshape(count, dim)
+        legacy = pickle.dumps([row.astype(np.float64) for row in matrix])
+        bind.execute(user.update().where(user.c.id == user_id).values(face_encodings=legacy))
@@ -0,0 +1,35 @@
+"""gallery version counter for snapshot fingerprints
+
+Revision ID: e7a3d91f4c28
+Revises: c52f9e0b7d3a
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3d91f4c28'
+down_revision = 'c52f9e0b7d3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases set up by an older run.py may already have the table from db.create_all()
+    if sa.inspect(op.get_bind()).has_table('gallery_version'):
+        return
+    gallery_version = op.create_table('gallery_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # Any existing snapshot carries an older fingerprint format, so it is rebuilt once
+    op.bulk_insert(gallery_version, [{'id': 1, 'version': 1, 'updated_at': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('gallery_version')
@@ -1,13 +1,30 @@
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
 from app import create_app, db
 from app.models import User, Attendance
 
-app = create_app()
+# Recognition worker processes re-import this module as __mp_main__; they don't need the web app
+if __name__ != '__mp_main__':
+    app = create_app()
 
-@app.shell_context_processor
-def make_shell_context():
-    return {'db': db, 'User': User, 'Attendance': Attendance}
+    @app.shell_context_processor
+    def make_shell_context():
+        return {'db': db, 'User': User, 'Attendance': Attendance}
+
+def prepare_database():
+    """
+    Creates a fresh database from the models and stamps it with the latest
+    migration, or migrates an existing one. Calling db.create_all() on an
+    existing database would create the tables of pending migrations empty,
+    and the migrations would then fail on them instead of running.
+    """
+    if inspect(db.engine).has_table(User.__tablename__):
+        upgrade()
+    else:
+        db.create_all()
+        stamp()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        prepare_database()
     app.run(debug=True)
\ No newline at end of file